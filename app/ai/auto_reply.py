@@ -1,56 +1,321 @@
-import os
-from asyncio import sleep
+import asyncio
+import logging
+from typing import Optional
 
-import google.generativeai as gemini
-from dotenv import load_dotenv
+from sqlalchemy import func, insert, select
 
-from app import models
-from app.ai.config import GEMINI_AUTOREPLY_INSTRUCTION
-from app.database import async_session_maker
+# app.database has to be imported before app.models
+from app.database import (async_session_maker, comment_session_maker,
+                          comment_session_makers)
+from app import comment_stats, metrics, models
+from app.ai.config import (
+    AUTO_REPLY_DEFER_INTERVAL,
+    AUTO_REPLY_MAX_BATCH,
+    AUTO_REPLY_MAX_CONCURRENCY,
+    AUTO_REPLY_MAX_CONCURRENCY_PER_POST,
+    AUTO_REPLY_MAX_QUEUE,
+    AUTO_REPLY_MAX_QUEUE_PER_POST,
+    AUTO_REPLY_OVERFLOW_POLICY,
+)
+from app.ai.providers import get_backend
+from app.metrics import track_ai_call
+from app.post_cache import PostMeta, post_cache
+from app.pubsub import publish_comment_event
+from app.trending import rescore_comments
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-gemini.configure(api_key=os.environ["GEMINI_API_KEY"])
-generation_config = {
-  "max_output_tokens": 500,
-}
+DEFAULT_REPLY = "Thanks for your comment!"
 
-MODEL = gemini.GenerativeModel(
-  model_name="gemini-1.5-flash",
-  generation_config=generation_config,
-  system_instruction=GEMINI_AUTOREPLY_INSTRUCTION,
-)
 
+def post_context(post) -> str:
+    return f"Post title: {post.title}\nPost content: {post.content}"
 
-async def auto_reply_comment(post: models.Post, comment: models.Comment):
-    text = (f"Post title: {post.title}\n"
-            f"Post content: {post.content}\nComment: {comment.content}")
+
+def generate_replies(context: str,
+                     comments: list[models.Comment]) -> list[str]:
+    """
+    Asks the model for replies to all comments at once, falls back to the
+    default message for every comment if the request fails.
+    """
     try:
-        response = MODEL.generate_content(text).text
-    except:
-        # In case of error, use a default message
-        response = "Thanks for your comment!"
-    return response
+        with track_ai_call("auto_reply"):
+            return get_backend().generate_replies(
+                context, [comment.content for comment in comments]
+            )
+    except Exception:
+        return [DEFAULT_REPLY] * len(comments)
+
+
+async def insert_replies(post: PostMeta, comments: list[models.Comment],
+                         replies: list[str]) -> None:
+    async with comment_session_maker(post.id)() as db:
+        result = await db.execute(
+            insert(models.Comment).returning(
+                *models.Comment.__table__.columns),
+            [
+                {
+                    "content": reply,
+                    "author_id": post.owner_id,
+                    "parent_id": comment.id,
+                    "post_id": post.id,
+                }
+                for comment, reply in zip(comments, replies)
+            ],
+        )
+        rows = result.all()
+        # Bulk inserts bypass the rollups' session hook
+        deltas = {}
+        for row in rows:
+            comment_stats.add_delta(deltas, row, 1, int(bool(row.is_blocked)))
+        await comment_stats.record(db, deltas)
+        await db.commit()
+    # Replies count for trending like any comment, so deleting one later
+    # takes out only what it added
+    await rescore_comments((row.post_id, row.created_at, False)
+                           for row in rows if not row.is_blocked)
+
+    for row in rows:
+        await publish_comment_event("comment_created", row)
+
+
+class AutoReplyBatch:
+    """
+    Comments on one post waiting for their replies.
+    """
+    __slots__ = ("post", "comments", "done")
+
+    def __init__(self, post: PostMeta, comment: models.Comment):
+        self.post = post
+        self.comments = [comment]
+        self.done = asyncio.get_running_loop().create_future()
+
+
+class AutoReplyAggregator:
+    """
+    Coalesces auto-replies to comments on the same post.
+
+    The first comment on a post opens a batch and waits out the post's
+    auto_reply_delay. Comments arriving in the meantime join the batch,
+    then all of them are answered with one model request and the replies
+    are written with one INSERT. A full batch is closed early and the next
+    comment opens a new one.
+    """
+
+    def __init__(self, max_batch: int = AUTO_REPLY_MAX_BATCH):
+        self.max_batch = max_batch
+        self._batches: dict[int, AutoReplyBatch] = {}
+
+    async def submit(self, post: PostMeta, comment: models.Comment,
+                     delay: float) -> None:
+        """
+        Returns once the reply to the comment has been written.
+        """
+        batch = self._batches.get(post.id)
+        if batch is not None:
+            batch.comments.append(comment)
+            if len(batch.comments) >= self.max_batch:
+                del self._batches[post.id]
+            # Don't cancel the batch when this waiter is cancelled
+            await asyncio.shield(batch.done)
+            return
+
+        batch = AutoReplyBatch(post, comment)
+        self._batches[post.id] = batch
+        try:
+            await asyncio.sleep(delay)
+            if self._batches.get(post.id) is batch:
+                del self._batches[post.id]
+            await self.flush(batch)
+        finally:
+            if self._batches.get(post.id) is batch:
+                del self._batches[post.id]
+            batch.done.set_result(None)
+
+    async def flush(self, batch: AutoReplyBatch) -> None:
+        # Callers only pass the post's metadata, the text is loaded once
+        # per batch
+        async with async_session_maker() as db:
+            post = (await db.execute(
+                select(models.Post.title, models.Post.content)
+                .where(models.Post.id == batch.post.id)
+            )).first()
+        if post is None:
+            return
+
+        replies = await asyncio.to_thread(generate_replies,
+                                          post_context(post), batch.comments)
+        await insert_replies(batch.post, batch.comments, replies)
+
+
+class AutoReplyScheduler(AutoReplyAggregator):
+    """
+    Coalescing aggregator with admission control.
+
+    At most `max_queue` comments (`max_queue_per_post` per post) wait for
+    a reply at a time, counting those in the delay window, waiting for a
+    slot and being answered. Comments beyond that are handled by the
+    overflow `policy`. At most `max_concurrency` batches
+    (`max_concurrency_per_post` per post) are generated at once.
+    """
+
+    def __init__(
+            self,
+            max_batch: int = AUTO_REPLY_MAX_BATCH,
+            max_concurrency: int = AUTO_REPLY_MAX_CONCURRENCY,
+            max_concurrency_per_post: int = (
+                AUTO_REPLY_MAX_CONCURRENCY_PER_POST),
+            max_queue: int = AUTO_REPLY_MAX_QUEUE,
+            max_queue_per_post: int = AUTO_REPLY_MAX_QUEUE_PER_POST,
+            policy: str = AUTO_REPLY_OVERFLOW_POLICY,
+    ):
+        if policy not in ("drop", "defer", "canned"):
+            raise ValueError(f"Unknown auto-reply overflow policy: {policy}")
+        super().__init__(max_batch)
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_post = max_concurrency_per_post
+        self.max_queue = max_queue
+        self.max_queue_per_post = max_queue_per_post
+        self.policy = policy
+
+        self.queued = 0
+        self._queued_per_post: dict[int, int] = {}
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._post_slots: dict[int, asyncio.Semaphore] = {}
+
+    def full_limit(self, post_id: int) -> Optional[str]:
+        """
+        Name of the queue limit a new comment on the post would exceed.
+        """
+        if self.queued >= self.max_queue:
+            return "global"
+        if self._queued_per_post.get(post_id, 0) >= self.max_queue_per_post:
+            return "post"
+        return None
+
+    async def submit(self, post: PostMeta, comment: models.Comment,
+                     delay: float) -> None:
+        limit = self.full_limit(post.id)
+        if limit is not None:
+            await self.overflow(post, comment, limit)
+            return
+
+        self._admit(post.id)
+        try:
+            await super().submit(post, comment, delay)
+        finally:
+            self._release(post.id)
+
+    async def flush(self, batch: AutoReplyBatch) -> None:
+        post_slots = self._post_slots.setdefault(
+            batch.post.id, asyncio.Semaphore(self.max_concurrency_per_post)
+        )
+        async with post_slots, self._slots:
+            metrics.auto_reply_in_flight.inc()
+            try:
+                await super().flush(batch)
+            finally:
+                metrics.auto_reply_in_flight.inc(amount=-1)
+
+    async def overflow(self, post: PostMeta, comment: models.Comment,
+                       limit: str) -> None:
+        metrics.auto_reply_overflows.inc(self.policy, limit)
+        if self.policy == "canned":
+            await insert_replies(post, [comment], [DEFAULT_REPLY])
+        elif self.policy == "defer":
+            async with comment_session_maker(post.id)() as db:
+                db.add(models.AutoReplyQueue(comment_id=comment.id))
+                await db.commit()
+
+    def _admit(self, post_id: int) -> None:
+        self.queued += 1
+        self._queued_per_post[post_id] = (
+            self._queued_per_post.get(post_id, 0) + 1
+        )
+        metrics.auto_reply_queue_depth.set(self.queued)
+
+    def _release(self, post_id: int) -> None:
+        self.queued -= 1
+        self._queued_per_post[post_id] -= 1
+        if not self._queued_per_post[post_id]:
+            del self._queued_per_post[post_id]
+            self._post_slots.pop(post_id, None)
+        metrics.auto_reply_queue_depth.set(self.queued)
+
+
+scheduler = AutoReplyScheduler()
 
 
 async def auto_reply(
-        post: models.Post,
+        post: PostMeta,
         comment: models.Comment,
         delay
 ) -> None:
     """
     Automatically replies to a comment on a post.
     """
-    reply = await auto_reply_comment(post, comment)
+    await scheduler.submit(post, comment, delay)
+
 
-    await sleep(delay)
+async def reply_deferred() -> int:
+    """
+    Replies to deferred comments while the scheduler has room for them.
+    Returns the number of comments taken from the queue.
+    """
+    room = scheduler.max_queue - scheduler.queued
+    if room <= 0:
+        return 0
+
+    # Each comment shard keeps the queue of its own comments
+    comments = []
+    taken = 0
+    deferred = 0
+    for session_maker in comment_session_makers():
+        async with session_maker() as db:
+            entries = (await db.execute(
+                select(models.AutoReplyQueue)
+                .order_by(models.AutoReplyQueue.id)
+                .limit(room - taken)
+            )).scalars().all()
+
+            for entry in entries:
+                comment = await db.get(models.Comment, entry.comment_id)
+                if comment is not None:
+                    comments.append(comment)
+                await db.delete(entry)
+            await db.commit()
+            taken += len(entries)
+
+            deferred += (await db.execute(
+                select(func.count()).select_from(models.AutoReplyQueue)
+            )).scalar()
+    metrics.auto_reply_deferred.set(deferred)
+
+    pending = []
     async with async_session_maker() as db:
-        new_comment = models.Comment(
-            content=reply,
-            author_id=post.owner_id,
-            parent_id=comment.id,
-            post_id=post.id
-        )
-        db.add(new_comment)
-        await db.commit()
-        await db.refresh(new_comment)
+        for comment in comments:
+            post = await post_cache.load(db, comment.post_id)
+            # Skip comments blocked or posts switched off in the meantime
+            if (post is not None and post.auto_reply
+                    and not post.is_blocked and not comment.is_blocked):
+                pending.append((post, comment))
+
+    # Comments on the same post are coalesced into one batch
+    await asyncio.gather(*(
+        scheduler.submit(post, comment, 0) for post, comment in pending
+    ))
+    return taken
+
+
+async def deferred_reply_worker(
+        interval: float = AUTO_REPLY_DEFER_INTERVAL
+) -> None:
+    """
+    Works off deferred auto-replies every `interval` seconds.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reply_deferred()
+        except Exception:
+            logger.exception("Deferred auto-reply run failed")
@@ -0,0 +1,285 @@
+"""
+Re-moderates the whole post and comment corpus, e.g. after the moderation
+prompt, model or HARM_PROBABILITY changed.
+
+    python -m app.ai.bulk_moderation --chunk-size 500 --concurrency 8
+
+Rows are streamed in id order with keyset pagination. Profanity checks of
+a chunk are spread over a process pool and model calls run concurrently
+up to --concurrency. The verdicts of a chunk are written with one batched
+UPDATE in the same transaction as the job's checkpoint, so a stopped job
+continues after the last committed chunk when started again.
+
+By default only rows whose verdict is from another moderation version
+are checked, and the job is named after the current version. Comment
+shards are worked through one after the other, each with its own
+checkpoint.
+
+The job runs in its own process, so clearing its post cache doesn't reach
+the API workers. They keep serving a post's old blocked flag until their
+cached entry expires, at most POST_CACHE_TTL seconds later.
+"""
+import argparse
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional
+
+from sqlalchemy import or_, select, update
+
+# app.database has to be imported before app.models
+from app.database import async_session_maker, comment_session_makers
+from app import comment_stats, models
+from app.ai.config import IS_PROFANITY_FORBIDDEN
+from app.ai.moderation import (ask_model, content_fingerprint, is_profane,
+                               moderation_version)
+from app.post_cache import post_cache
+from app.trending import rescore_comments
+
+logger = logging.getLogger(__name__)
+
+TARGETS = {
+    "post": models.Post,
+    "comment": models.Comment,
+}
+
+
+def session_makers(target_type: str) -> list:
+    """
+    Databases holding the rows of the table.
+    """
+    if target_type == "comment":
+        return comment_session_makers()
+    return [async_session_maker]
+
+
+def profanity_flags(texts: list[str]) -> list[bool]:
+    """
+    Runs in the process pool, one call per slice of a chunk.
+    """
+    return [is_profane(text) for text in texts]
+
+
+def moderated_text(target_type: str, row) -> str:
+    if target_type == "post":
+        return (row.title or "") + " " + (row.content or "")
+    return row.content or ""
+
+
+async def check_profanity(
+        texts: list[str],
+        pool: Optional[Executor],
+        workers: int
+) -> list[bool]:
+    if not IS_PROFANITY_FORBIDDEN:
+        return [False] * len(texts)
+    if pool is None:
+        return await asyncio.to_thread(profanity_flags, texts)
+
+    loop = asyncio.get_running_loop()
+    size = -(-len(texts) // workers)
+    slices = [texts[start:start + size]
+              for start in range(0, len(texts), size)]
+    results = await asyncio.gather(*(
+        loop.run_in_executor(pool, profanity_flags, part) for part in slices
+    ))
+    return [flag for part in results for flag in part]
+
+
+async def moderate_chunk(
+        texts: list[str],
+        pool: Optional[Executor],
+        workers: int,
+        semaphore: asyncio.Semaphore
+) -> list[bool]:
+    """
+    Returns whether each text is acceptable. Model errors propagate, so
+    a chunk is either fully moderated or not written at all.
+    """
+    profane = await check_profanity(texts, pool, workers)
+
+    async def is_harmful(text: str) -> bool:
+        async with semaphore:
+            return await asyncio.to_thread(ask_model, text)
+
+    harmful = iter(await asyncio.gather(*(
+        is_harmful(text) for text, flag in zip(texts, profane) if not flag
+    )))
+    return [not flag and not next(harmful) for flag in profane]
+
+
+async def get_checkpoint(db, job: str,
+                         target_type: str) -> models.ModerationCheckpoint:
+    checkpoint = (await db.execute(
+        select(models.ModerationCheckpoint).where(
+            models.ModerationCheckpoint.job == job,
+            models.ModerationCheckpoint.target_type == target_type,
+        )
+    )).scalar_one_or_none()
+
+    if checkpoint is None:
+        checkpoint = models.ModerationCheckpoint(
+            job=job, target_type=target_type, last_id=0, processed=0
+        )
+        db.add(checkpoint)
+    return checkpoint
+
+
+async def remoderate_table(
+        target_type: str,
+        job: str,
+        version: str,
+        chunk_size: int,
+        pool: Optional[Executor],
+        workers: int,
+        semaphore: asyncio.Semaphore,
+        force: bool = False,
+        max_chunks: Optional[int] = None,
+        session_maker=async_session_maker,
+) -> int:
+    """
+    Re-moderates one table of a database chunk by chunk, starting after
+    the checkpoint. Returns the number of rows processed by this run.
+    """
+    model = TARGETS[target_type]
+    columns = [model.id, model.content]
+    if target_type == "post":
+        columns.append(model.title)
+    else:
+        columns.extend((model.is_blocked, model.created_at, model.post_id,
+                        model.author_id))
+
+    processed = 0
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        async with session_maker() as db:
+            checkpoint = await get_checkpoint(db, job, target_type)
+
+            query = select(*columns).where(model.id > checkpoint.last_id)
+            if not force:
+                query = query.where(or_(
+                    model.moderation_version.is_(None),
+                    model.moderation_version != version,
+                ))
+            rows = (await db.execute(
+                query.order_by(model.id).limit(chunk_size)
+            )).all()
+            if not rows:
+                await db.commit()
+                break
+
+            texts = [moderated_text(target_type, row) for row in rows]
+            verdicts = await moderate_chunk(texts, pool, workers, semaphore)
+
+            await db.execute(update(model), [
+                {
+                    "id": row.id,
+                    "is_blocked": not acceptable,
+                    "moderation_fingerprint": content_fingerprint(text),
+                    "moderation_version": version,
+                }
+                for row, text, acceptable in zip(rows, texts, verdicts)
+            ])
+            rescored = []
+            if target_type == "comment":
+                # Bulk updates bypass the rollups' session hook
+                deltas = {}
+                for row, acceptable in zip(rows, verdicts):
+                    change = int(not acceptable) - int(bool(row.is_blocked))
+                    if change:
+                        comment_stats.add_delta(deltas, row, 0, change)
+                        rescored.append((row.post_id, row.created_at,
+                                         not acceptable))
+                await comment_stats.record(db, deltas)
+            checkpoint.last_id = rows[-1].id
+            checkpoint.processed += len(rows)
+            await db.commit()
+        await rescore_comments(rescored)
+
+        if target_type == "post":
+            # Bulk updates bypass the cache's session hook. Only this
+            # process' cache, the API workers' entries expire on their own
+            post_cache.clear()
+
+        processed += len(rows)
+        chunks += 1
+        logger.info("Re-moderated %s %ss up to id %s", processed,
+                    target_type, rows[-1].id)
+
+    return processed
+
+
+async def run_job(
+        job: Optional[str] = None,
+        targets: tuple[str, ...] = ("post", "comment"),
+        chunk_size: int = 500,
+        concurrency: int = 8,
+        workers: int = 4,
+        force: bool = False,
+        reset: bool = False,
+        max_chunks: Optional[int] = None,
+) -> dict[str, int]:
+    """
+    Runs (or resumes) a re-moderation job over the given tables.
+    """
+    version = moderation_version()
+    job = job or version
+
+    if reset:
+        for target_type in targets:
+            for session_maker in session_makers(target_type):
+                async with session_maker() as db:
+                    checkpoint = await get_checkpoint(db, job, target_type)
+                    checkpoint.last_id = 0
+                    checkpoint.processed = 0
+                    await db.commit()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    try:
+        processed = {}
+        for target_type in targets:
+            processed[target_type] = 0
+            for session_maker in session_makers(target_type):
+                processed[target_type] += await remoderate_table(
+                    target_type, job, version, chunk_size, pool,
+                    max(workers, 1), semaphore, force, max_chunks,
+                    session_maker
+                )
+        return processed
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--job",
+                        help="Checkpoint name, defaults to the current "
+                             "moderation version")
+    parser.add_argument("--targets", nargs="+", choices=list(TARGETS),
+                        default=list(TARGETS))
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Model calls in flight")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Processes for profanity checks, 0 to check "
+                             "in a thread")
+    parser.add_argument("--force", action="store_true",
+                        help="Also re-check rows already moderated by the "
+                             "current version")
+    parser.add_argument("--reset", action="store_true",
+                        help="Start over instead of resuming")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = asyncio.run(run_job(
+        job=args.job,
+        targets=tuple(args.targets),
+        chunk_size=args.chunk_size,
+        concurrency=args.concurrency,
+        workers=args.workers,
+        force=args.force,
+        reset=args.reset,
+    ))
+    logger.info("Re-moderated %s", result)
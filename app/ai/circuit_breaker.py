@@ -0,0 +1,192 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Callable, Iterable, TypeVar
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the model while the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency until it had time to recover.
+
+    After `failure_threshold` consecutive failures or timeouts the breaker
+    opens and every call fails immediately with CircuitOpenError. Once
+    `reset_timeout` seconds have passed a single trial call is let through
+    (half-open): success closes the breaker, failure opens it again.
+
+    Calls run in a pool of `max_workers` threads and are awaited, so a
+    hung request neither blocks the event loop nor holds the caller for
+    longer than `call_timeout` seconds once it runs. Time spent waiting
+    for a free worker doesn't count towards the timeout.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int = 5,
+            reset_timeout: float = 30.0,
+            call_timeout: float = 10.0,
+            max_workers: int = 4,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.call_timeout = call_timeout
+        self.max_workers = max_workers
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"{name}-breaker"
+        )
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = HALF_OPEN
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def release_trial(self) -> None:
+        """
+        Lets another trial call through after one was cancelled.
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if (self.state == HALF_OPEN
+                    or self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def _submit(self, func: Callable[..., T], *args):
+        """
+        Queues the call for a worker. Returns a future that is set once a
+        worker picks the call up, and the call's future.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+
+        def run():
+            loop.call_soon_threadsafe(
+                lambda: started.done() or started.set_result(None))
+            return func(*args)
+
+        # Run in the caller's context so request metrics are attributed
+        future = self._executor.submit(copy_context().run, run)
+        return started, asyncio.wrap_future(future)
+
+    async def call(self, func: Callable[..., T], *args) -> T:
+        if not self.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        started, future = self._submit(func, *args)
+        try:
+            # Waiting for a free worker isn't the dependency's fault, the
+            # timeout starts once the call runs
+            await started
+            result = await asyncio.wait_for(future, self.call_timeout)
+        except asyncio.CancelledError:
+            # A call still queued for a worker never runs
+            future.cancel()
+            self.release_trial()
+            raise
+        except Exception:
+            # Model errors and TimeoutError alike
+            self.record_failure()
+            raise
+
+        self.record_success()
+        return result
+
+    async def call_any(self, func: Callable[..., bool], items: Iterable,
+                       concurrency: int) -> bool:
+        """
+        Calls `func` for each item, at most `concurrency` (and no more than
+        the pool's workers) at a time, and returns True as soon as one call
+        returns True.
+
+        The remaining calls are cancelled, those already running are
+        abandoned. A failure, or a batch that takes longer than
+        `call_timeout` in total once its first call runs, fails the whole
+        batch and counts as one failure.
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        items = iter(items)
+        starts = []
+        pending = set()
+
+        def submit_next() -> None:
+            for item in items:
+                started, future = self._submit(func, item)
+                starts.append(started)
+                pending.add(future)
+                return
+
+        found = False
+        try:
+            for _ in range(min(concurrency, self.max_workers)):
+                submit_next()
+            if starts:
+                await asyncio.wait(starts,
+                                   return_when=asyncio.FIRST_COMPLETED)
+            async with asyncio.timeout(self.call_timeout):
+                while pending and not found:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        found = future.result() or found
+                    if not found:
+                        for _ in done:
+                            submit_next()
+        except asyncio.CancelledError:
+            self.release_trial()
+            raise
+        except Exception:
+            # Model errors and TimeoutError alike
+            self.record_failure()
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+        self.record_success()
+        return found
+
+    def reset(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
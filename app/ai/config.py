@@ -1,5 +1,82 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
 HARM_PROBABILITY = ["LOW", "MEDIUM", "HIGH"]
 IS_PROFANITY_FORBIDDEN = True
-GEMINI_AUTOREPLY_INSTRUCTION = ("You have to reply to the comment "
-                                "as if the owner of the post did. "
-                                "The person will see your message directly.")
+GEMINI_MODEL_NAME = "gemini-1.5-flash"
+GEMINI_MODERATION_INSTRUCTION = ("You have to moderate the text of posts "
+                                 "for insults or profanity. "
+                                 "Respond with just one word. "
+                                 "If the text contains any of these, "
+                                 "return True. "
+                                 "If it doesn't - False.")
+GEMINI_BATCH_AUTOREPLY_INSTRUCTION = (
+    "You have to reply to each of the numbered comments "
+    "as if the owner of the post did. "
+    "The people will see your messages directly. "
+    "Answer with a JSON array of strings, one reply per comment, "
+    "in the same order as the comments."
+)
+
+# "gemini" or "local". The local backend needs no key or network access.
+AI_BACKEND = os.getenv("AI_BACKEND", "gemini")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Knobs of the local backend, used for offline and capacity testing
+LOCAL_AI_LATENCY = float(os.getenv("LOCAL_AI_LATENCY", "0"))
+LOCAL_AI_LATENCY_JITTER = float(os.getenv("LOCAL_AI_LATENCY_JITTER", "0"))
+# Extra latency per KB of input, models get slower with longer prompts
+LOCAL_AI_LATENCY_PER_KB = float(os.getenv("LOCAL_AI_LATENCY_PER_KB", "0"))
+LOCAL_AI_ERROR_RATE = float(os.getenv("LOCAL_AI_ERROR_RATE", "0"))
+LOCAL_AI_MAX_RPS = float(os.getenv("LOCAL_AI_MAX_RPS", "0"))
+LOCAL_AI_FLAGGED_TERMS = [
+    term.strip().lower()
+    for term in os.getenv("LOCAL_AI_FLAGGED_TERMS", "").split(",")
+    if term.strip()
+]
+LOCAL_AI_SEED = int(os.getenv("LOCAL_AI_SEED", "0"))
+LOCAL_AI_REPLY = "Thank you for your comment, I appreciate your feedback!"
+
+# Moderation circuit breaker: consecutive failures or timeouts before the
+# model is skipped, and seconds before it is tried again
+MODERATION_FAILURE_THRESHOLD = int(
+    os.getenv("MODERATION_FAILURE_THRESHOLD", "5"))
+MODERATION_RESET_TIMEOUT = float(os.getenv("MODERATION_RESET_TIMEOUT", "30"))
+MODERATION_CALL_TIMEOUT = float(os.getenv("MODERATION_CALL_TIMEOUT", "10"))
+# Threads making moderation calls, shared by all post and comment writes
+MODERATION_WORKERS = int(os.getenv("MODERATION_WORKERS", "32"))
+# What to do with text the model could not check: "open" publishes it,
+# "closed" blocks it. Either way it is queued for re-moderation.
+MODERATION_FAILURE_POLICY = os.getenv("MODERATION_FAILURE_POLICY", "open")
+REMODERATION_INTERVAL = float(os.getenv("REMODERATION_INTERVAL", "30"))
+REMODERATION_BATCH_SIZE = int(os.getenv("REMODERATION_BATCH_SIZE", "50"))
+
+# Texts longer than MODERATION_CHUNK_SIZE characters are moderated as
+# overlapping chunks, MODERATION_CHUNK_CONCURRENCY at a time. Phrases
+# shorter than the overlap always appear whole in one of the chunks.
+MODERATION_CHUNK_SIZE = int(os.getenv("MODERATION_CHUNK_SIZE", "4000"))
+MODERATION_CHUNK_OVERLAP = int(os.getenv("MODERATION_CHUNK_OVERLAP", "200"))
+MODERATION_CHUNK_CONCURRENCY = int(
+    os.getenv("MODERATION_CHUNK_CONCURRENCY", "4"))
+
+# Comments on the same post arriving within its auto_reply_delay are
+# answered with one model request, at most AUTO_REPLY_MAX_BATCH at a time
+AUTO_REPLY_MAX_BATCH = int(os.getenv("AUTO_REPLY_MAX_BATCH", "20"))
+
+# Admission control of auto-replies. Comments waiting for a reply beyond
+# the queue limits are handled by AUTO_REPLY_OVERFLOW_POLICY: "drop" (no
+# reply), "canned" (reply with the default message without the model) or
+# "defer" (stored and replied to later, every AUTO_REPLY_DEFER_INTERVAL
+# seconds as capacity allows)
+AUTO_REPLY_MAX_CONCURRENCY = int(os.getenv("AUTO_REPLY_MAX_CONCURRENCY", "8"))
+AUTO_REPLY_MAX_CONCURRENCY_PER_POST = int(
+    os.getenv("AUTO_REPLY_MAX_CONCURRENCY_PER_POST", "1"))
+AUTO_REPLY_MAX_QUEUE = int(os.getenv("AUTO_REPLY_MAX_QUEUE", "1000"))
+AUTO_REPLY_MAX_QUEUE_PER_POST = int(
+    os.getenv("AUTO_REPLY_MAX_QUEUE_PER_POST", "100"))
+AUTO_REPLY_OVERFLOW_POLICY = os.getenv("AUTO_REPLY_OVERFLOW_POLICY", "canned")
+AUTO_REPLY_DEFER_INTERVAL = float(
+    os.getenv("AUTO_REPLY_DEFER_INTERVAL", "30"))
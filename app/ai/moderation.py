@@ -1,55 +1,124 @@
-import os
+import hashlib
 
-import google.generativeai as gemini
 from better_profanity import profanity
-from dotenv import load_dotenv
 
+from app import metrics
+from app.ai.circuit_breaker import CLOSED, CircuitBreaker, CircuitOpenError
+from app.ai.config import (
+    IS_PROFANITY_FORBIDDEN,
+    MODERATION_CALL_TIMEOUT,
+    MODERATION_CHUNK_CONCURRENCY,
+    MODERATION_CHUNK_OVERLAP,
+    MODERATION_CHUNK_SIZE,
+    MODERATION_FAILURE_POLICY,
+    MODERATION_FAILURE_THRESHOLD,
+    MODERATION_RESET_TIMEOUT,
+    MODERATION_WORKERS,
+)
+from app.ai.providers import get_backend
+from app.metrics import track_ai_call
+
+moderation_breaker = CircuitBreaker(
+    "moderation",
+    failure_threshold=MODERATION_FAILURE_THRESHOLD,
+    reset_timeout=MODERATION_RESET_TIMEOUT,
+    call_timeout=MODERATION_CALL_TIMEOUT,
+    max_workers=MODERATION_WORKERS,
+)
 
-from app.ai.config import HARM_PROBABILITY, IS_PROFANITY_FORBIDDEN
 
-load_dotenv()
+class ModerationVerdict:
+    """
+    Outcome of moderating a text.
 
-gemini.configure(api_key=os.environ["GEMINI_API_KEY"])
-generation_config = {
-  "max_output_tokens": 500,
-  "response_mime_type": "application/json",
-}
+    `needs_review` is set when the model could not be asked and the verdict
+    comes from the local profanity check and the failure policy alone.
+    """
+    __slots__ = ("acceptable", "needs_review")
 
-MODEL = gemini.GenerativeModel(
-  model_name="gemini-1.5-flash",
-  generation_config=generation_config,
-  system_instruction="You have to moderate the text of posts "
-                     "for insults or profanity. "
-                     "Respond with just one word. "
-                     "If the text contains any of these, return True. "
-                     "If it doesn't - False.",
-)
+    def __init__(self, acceptable: bool, needs_review: bool = False):
+        self.acceptable = acceptable
+        self.needs_review = needs_review
 
 
-def is_profane(text: str) -> bool:
-    return profanity.contains_profanity(text)
+def content_fingerprint(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
 
 
-def is_harmful(text: str) -> bool:
-    try:
-        gemini_response = MODEL.generate_content(text)
+def moderation_version() -> str:
+    """
+    Version of the current moderation setup, stored next to each verdict.
+    """
+    profanity_check = "profanity" if IS_PROFANITY_FORBIDDEN else "no-profanity"
+    return f"{get_backend().moderation_version}+{profanity_check}"
 
-        if "true" in gemini_response.text.lower():
-            return True
 
-        response = str(gemini_response)
-
-        harmful = any(
-            category in response for category in HARM_PROBABILITY
-        )
-        return harmful
-
-    except:
-        return False
+def is_profane(text: str) -> bool:
+    return profanity.contains_profanity(text)
 
 
-def is_acceptable_text(text: str) -> bool:
+def ask_model(text: str) -> bool:
+    with track_ai_call("moderation"):
+        return get_backend().is_harmful(text)
+
+
+def split_text(text: str, size: int = MODERATION_CHUNK_SIZE,
+               overlap: int = MODERATION_CHUNK_OVERLAP) -> list[str]:
+    """
+    Splits the text into chunks of at most `size` characters, each one
+    starting `overlap` characters before the previous one ended.
+    """
+    if len(text) <= size:
+        return [text]
+    step = max(size - overlap, 1)
+    return [text[start:start + size]
+            for start in range(0, len(text) - overlap, step)]
+
+
+async def ask_model_chunked(
+        text: str,
+        size: int = MODERATION_CHUNK_SIZE,
+        overlap: int = MODERATION_CHUNK_OVERLAP,
+        concurrency: int = MODERATION_CHUNK_CONCURRENCY,
+) -> bool:
+    """
+    Asks the model about a long text chunk by chunk, through the breaker.
+    Chunks are checked concurrently and the rest are cancelled as soon as
+    one of them is harmful.
+    """
+    chunks = split_text(text, size, overlap)
+    if len(chunks) == 1:
+        return await moderation_breaker.call(ask_model, text)
+    return await moderation_breaker.call_any(ask_model, chunks, concurrency)
+
+
+async def moderate(text: str) -> ModerationVerdict:
+    """
+    Checks the text for profanity locally and for insults with the model.
+
+    Model failures, timeouts and an open circuit breaker don't block the
+    caller: the text is accepted or blocked according to
+    MODERATION_FAILURE_POLICY and marked for re-moderation.
+    """
     if IS_PROFANITY_FORBIDDEN and is_profane(text):
-        return False
+        return ModerationVerdict(acceptable=False)
 
-    return not is_harmful(text)
+    try:
+        harmful = await ask_model_chunked(text)
+    except CircuitOpenError:
+        reason = "circuit_open"
+    except TimeoutError:
+        reason = "timeout"
+    except Exception:
+        reason = "error"
+    else:
+        return ModerationVerdict(acceptable=not harmful)
+    finally:
+        metrics.moderation_circuit_open.set(
+            int(moderation_breaker.state != CLOSED))
+
+    metrics.moderation_fallbacks.inc(reason)
+    return ModerationVerdict(
+        acceptable=MODERATION_FAILURE_POLICY != "closed",
+        needs_review=True,
+    )
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from app.ai.config import (
+    AI_BACKEND,
+    GEMINI_API_KEY,
+    GEMINI_BATCH_AUTOREPLY_INSTRUCTION,
+    GEMINI_MODEL_NAME,
+    GEMINI_MODERATION_INSTRUCTION,
+    HARM_PROBABILITY,
+    LOCAL_AI_ERROR_RATE,
+    LOCAL_AI_FLAGGED_TERMS,
+    LOCAL_AI_LATENCY,
+    LOCAL_AI_LATENCY_JITTER,
+    LOCAL_AI_LATENCY_PER_KB,
+    LOCAL_AI_MAX_RPS,
+    LOCAL_AI_REPLY,
+    LOCAL_AI_SEED,
+)
+
+
+class AIBackendError(Exception):
+    """Raised when a model call fails."""
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:12]
+
+
+class AIBackend(ABC):
+    """
+    Model calls used by moderation and auto-reply.
+
+    The calls are synchronous and may raise any exception, callers decide
+    what a failure means.
+    """
+    name: str
+
+    @property
+    @abstractmethod
+    def moderation_version(self) -> str:
+        """
+        Identifies the model and prompt behind moderation verdicts,
+        changes whenever a stored verdict may no longer hold.
+        """
+
+    @abstractmethod
+    def is_harmful(self, text: str) -> bool:
+        """Asks the model whether the text contains insults or profanity."""
+
+    @abstractmethod
+    def generate_replies(self, post: str, comments: list[str]) -> list[str]:
+        """
+        Generates replies to several comments on the same post with one
+        request, one reply per comment in the same order.
+        """
+
+
+class GeminiBackend(AIBackend):
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str]):
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY is not set, "
+                               "use AI_BACKEND=local to run without Gemini")
+
+        # The SDK pulls in grpc and protobuf and takes about a second to
+        # import, so it is only loaded once the backend is actually built
+        import google.generativeai as gemini
+
+        gemini.configure(api_key=api_key)
+        self.moderation_model = gemini.GenerativeModel(
+            model_name=GEMINI_MODEL_NAME,
+            generation_config={
+                "max_output_tokens": 500,
+                "response_mime_type": "application/json",
+            },
+            system_instruction=GEMINI_MODERATION_INSTRUCTION,
+        )
+        self.batch_reply_model = gemini.GenerativeModel(
+            model_name=GEMINI_MODEL_NAME,
+            generation_config={
+                "response_mime_type": "application/json",
+            },
+            system_instruction=GEMINI_BATCH_AUTOREPLY_INSTRUCTION,
+        )
+
+    @property
+    def moderation_version(self) -> str:
+        return "gemini-" + _digest(GEMINI_MODEL_NAME,
+                                   GEMINI_MODERATION_INSTRUCTION,
+                                   *HARM_PROBABILITY)
+
+    def is_harmful(self, text: str) -> bool:
+        gemini_response = self.moderation_model.generate_content(text)
+
+        if "true" in gemini_response.text.lower():
+            return True
+
+        response = str(gemini_response)
+
+        return any(category in response for category in HARM_PROBABILITY)
+
+    def generate_replies(self, post: str, comments: list[str]) -> list[str]:
+        numbered = "\n".join(
+            f"{number}. {comment}"
+            for number, comment in enumerate(comments, start=1)
+        )
+        response = self.batch_reply_model.generate_content(
+            f"{post}\nComments:\n{numbered}"
+        )
+
+        try:
+            replies = json.loads(response.text)
+        except ValueError as error:
+            raise AIBackendError("Replies are not valid JSON") from error
+        if (not isinstance(replies, list) or len(replies) != len(comments)
+                or not all(isinstance(reply, str) for reply in replies)):
+            raise AIBackendError("Expected one reply per comment")
+        return replies
+
+
+class LocalBackend(AIBackend):
+    """
+    Deterministic in-process stand-in for Gemini.
+
+    Flags text containing any of `flagged_terms` and always answers with
+    the same reply. Each call blocks for `latency` (plus up to `jitter`,
+    plus `latency_per_kb` for each KB of input) seconds like the
+    synchronous Gemini SDK does, fails with probability
+    `error_rate` and is rejected when more than `max_rps` calls per second
+    are made, the way a quota would. The random choices come from a seeded
+    generator, so a run can be reproduced.
+    """
+    name = "local"
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            latency_per_kb: float = 0.0,
+            error_rate: float = 0.0,
+            max_rps: float = 0.0,
+            flagged_terms: Optional[list[str]] = None,
+            reply: str = LOCAL_AI_REPLY,
+            seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.latency_per_kb = latency_per_kb
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.flagged_terms = [term.lower() for term in flagged_terms or []]
+        self.reply = reply
+        self.calls = 0
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._capacity = max(max_rps, 1.0)
+        self._tokens = self._capacity
+        self._refilled_at = time.monotonic()
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(
+            self._capacity,
+            self._tokens + (now - self._refilled_at) * self.max_rps
+        )
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _call(self, text: str) -> None:
+        with self._lock:
+            self.calls += 1
+            if self.max_rps and not self._take_token():
+                raise AIBackendError("Rate limit exceeded")
+            failed = self._rng.random() < self.error_rate
+            delay = (self.latency + self._rng.uniform(0, self.jitter)
+                     + self.latency_per_kb * len(text) / 1024)
+
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise AIBackendError("Injected model failure")
+
+    @property
+    def moderation_version(self) -> str:
+        return "local-" + _digest(*sorted(self.flagged_terms))
+
+    def is_harmful(self, text: str) -> bool:
+        self._call(text)
+        lowered = text.lower()
+        return any(term in lowered for term in self.flagged_terms)
+
+    def generate_replies(self, post: str, comments: list[str]) -> list[str]:
+        self._call(post + "".join(comments))
+        return [self.reply] * len(comments)
+
+
+def create_backend(name: str = AI_BACKEND) -> AIBackend:
+    """
+    Builds the backend selected by the AI_BACKEND setting.
+    """
+    if name == "gemini":
+        return GeminiBackend(api_key=GEMINI_API_KEY)
+    if name == "local":
+        return LocalBackend(
+            latency=LOCAL_AI_LATENCY,
+            jitter=LOCAL_AI_LATENCY_JITTER,
+            latency_per_kb=LOCAL_AI_LATENCY_PER_KB,
+            error_rate=LOCAL_AI_ERROR_RATE,
+            max_rps=LOCAL_AI_MAX_RPS,
+            flagged_terms=LOCAL_AI_FLAGGED_TERMS,
+            seed=LOCAL_AI_SEED,
+        )
+    raise ValueError(f"Unknown AI backend: {name}")
+
+
+_backend: Optional[AIBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> AIBackend:
+    """
+    Returns the configured backend, building it on first use.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend: AIBackend) -> None:
+    """
+    Replaces the backend used by moderation and auto-reply.
+    """
+    global _backend
+    _backend = backend
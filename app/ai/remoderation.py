@@ -0,0 +1,88 @@
+import asyncio
+import logging
+
+from sqlalchemy import select
+
+# app.database has to be imported before app.models
+from app.database import async_session_maker, comment_session_makers
+from app import models
+from app.ai.config import REMODERATION_BATCH_SIZE, REMODERATION_INTERVAL
+from app.ai.moderation import (moderate, content_fingerprint,
+                               moderation_version)
+from app.trending import rescore_comments
+
+logger = logging.getLogger(__name__)
+
+
+def queue_session_makers() -> list:
+    """
+    Databases with a re-moderation queue: comment shards queue their own
+    comments, posts are queued in the main database.
+    """
+    return list(dict.fromkeys([async_session_maker,
+                               *comment_session_makers()]))
+
+
+async def remoderate_pending(batch_size: int = REMODERATION_BATCH_SIZE,
+                             session_maker=async_session_maker) -> int:
+    """
+    Re-moderates the oldest queued posts and comments with the model.
+
+    Stops at the first text the model still can't check, the rest stays
+    queued for the next run. Returns the number of processed entries.
+    """
+    processed = 0
+    rescored = []
+    async with session_maker() as db:
+        entries = (await db.execute(
+            select(models.ModerationQueue)
+            .order_by(models.ModerationQueue.id)
+            .limit(batch_size)
+        )).scalars().all()
+
+        for entry in entries:
+            if entry.target_type == "post":
+                target = await db.get(models.Post, entry.target_id)
+                text = target and target.title + " " + target.content
+            else:
+                target = await db.get(models.Comment, entry.target_id)
+                text = target and target.content
+
+            # Deleted targets are just dropped from the queue
+            if target is not None:
+                verdict = await moderate(text)
+                if verdict.needs_review:
+                    break
+                if (entry.target_type == "comment"
+                        and bool(target.is_blocked) == verdict.acceptable):
+                    rescored.append((target.post_id, target.created_at,
+                                     not verdict.acceptable))
+                target.is_blocked = not verdict.acceptable
+                target.moderation_fingerprint = content_fingerprint(text)
+                target.moderation_version = moderation_version()
+
+            await db.delete(entry)
+            processed += 1
+
+        await db.commit()
+    await rescore_comments(rescored)
+
+    return processed
+
+
+async def remoderation_worker(
+        interval: float = REMODERATION_INTERVAL,
+        batch_size: int = REMODERATION_BATCH_SIZE
+) -> None:
+    """
+    Drains the re-moderation queue every `interval` seconds.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            for session_maker in queue_session_makers():
+                while await remoderate_pending(
+                        batch_size, session_maker) == batch_size:
+                    pass
+        except Exception:
+            logger.exception("Re-moderation run failed")
@@ -0,0 +1,103 @@
+"""
+In-process cache of the daily comment analytics of closed days.
+
+A day that has ended only changes through late edits, blocks and deletes
+of its comments, so its result is kept until such a write invalidates it.
+The rollup session hook collects the days a transaction touched and
+invalidates them once it commits. That only reaches this worker's cache,
+entries also expire after ANALYTICS_CACHE_TTL seconds so other workers'
+edits show up. Today is never cached.
+
+As in the post metadata cache, every invalidation bumps a version, and
+days loaded while the version changed are not stored.
+"""
+import time
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+from app import metrics
+from app.config import ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL
+
+# The filters of a breakdown: (post_id, author_id)
+FilterKey = tuple[Optional[int], Optional[int]]
+
+
+def utc_today() -> date:
+    # Comment timestamps and buckets are in UTC
+    return datetime.utcnow().date()
+
+
+class AnalyticsCache:
+    def __init__(self, max_size: int = ANALYTICS_CACHE_SIZE,
+                 ttl: float = ANALYTICS_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = 0
+        # filters -> day -> (row or None for a day without comments,
+        # time it was stored)
+        self._entries: dict[FilterKey, dict[date, tuple]] = {}
+
+    def lookup(self, filters: FilterKey, date_from: date,
+               date_to: date) -> tuple[dict[date, dict], list[date]]:
+        """
+        Returns the cached rows of the closed days between the two dates
+        and the days that have to be loaded.
+        """
+        days = self._entries.get(filters, {})
+        now = time.monotonic()
+        rows, missing = {}, []
+        day = date_from
+        while day <= date_to:
+            entry = days.get(day)
+            if entry is None or (self.ttl and now - entry[1] > self.ttl):
+                missing.append(day)
+            elif entry[0] is not None:
+                rows[day] = entry[0]
+            day += timedelta(days=1)
+        metrics.analytics_cache_lookups.inc("miss", amount=len(missing))
+        metrics.analytics_cache_lookups.inc(
+            "hit", amount=(date_to - date_from).days + 1 - len(missing))
+        return rows, missing
+
+    def store(self, filters: FilterKey, days: Iterable[date],
+              rows: dict[date, dict], version: int) -> None:
+        """
+        Stores the rows loaded for the days, if nothing was invalidated
+        since `version` was read.
+        """
+        if self.version != version:
+            return
+        entry = self._entries.pop(filters, None)
+        if entry is None:
+            entry = {}
+            if len(self._entries) >= self.max_size:
+                # Dicts keep insertion order, drop the least recently
+                # stored filters
+                del self._entries[next(iter(self._entries))]
+        # Re-inserted to mark the filters as recently used
+        self._entries[filters] = entry
+        stored_at = time.monotonic()
+        today = utc_today()
+        for day in days:
+            if day < today:
+                entry[day] = (rows.get(day), stored_at)
+
+    def invalidate(self, days: Iterable[date]) -> None:
+        """
+        Called once changes to the counts of the days are committed.
+        """
+        today = utc_today()
+        closed = {day for day in days if day < today}
+        if not closed:
+            return
+        self.version += 1
+        for entry in self._entries.values():
+            for day in closed:
+                entry.pop(day, None)
+
+    def clear(self) -> None:
+        self.version += 1
+        self._entries.clear()
+
+
+analytics_cache = AnalyticsCache()
@@ -0,0 +1,195 @@
+"""
+Moves the comments of inactive posts out of the comments table.
+
+    python -m app.archive --chunk-size 1000
+
+A post is inactive once it had no new comment for
+COMMENT_ARCHIVE_AFTER_DAYS days, all its comments are older than that and
+are moved to comments_archive together, newest first so replies leave
+before the comments they answer. Each chunk is copied and deleted in its
+own transaction, a stopped run is continued by the next one.
+
+Inactive posts are flagged with comments_archived first. get_comments
+reads flagged posts from both tables and get_comment falls through to the
+archive, so the job waits out the post metadata cache TTL after flagging
+for every worker to see the flags before comments move. Archived comments
+are read-only and keep their ids, analytics rollups are not affected.
+Each comment shard has its own archive table.
+
+While a chunk moves, the rows of its posts are locked. create_comment
+takes the same lock before replying to a comment of a flagged post, so a
+reply either commits first and keeps its parent's post active, or waits
+and finds the parent archived.
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, delete, exists, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+# app.database has to be imported before app.models
+from app.database import async_session_maker, comment_session_makers
+from app import models
+from app.config import COMMENT_ARCHIVE_AFTER_DAYS, POST_CACHE_TTL
+from app.post_cache import post_cache
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_COLUMNS = tuple(
+    column.name for column in models.ArchivedComment.__table__.columns
+    if column.name != "archived_at"
+)
+
+
+def archivable(cutoff: datetime):
+    """
+    Comments older than `cutoff` on posts without a newer comment, that
+    no comment on another post replies to.
+    """
+    recent = aliased(models.Comment)
+    reply = aliased(models.Comment)
+    return and_(
+        models.Comment.created_at < cutoff,
+        ~exists().where(recent.post_id == models.Comment.post_id,
+                        recent.created_at >= cutoff),
+        ~exists().where(reply.parent_id == models.Comment.id,
+                        reply.post_id != models.Comment.post_id),
+    )
+
+
+async def lock_posts(db: AsyncSession, post_ids: Iterable[int]) -> None:
+    """
+    Locks the rows of the posts until the transaction of `db` ends, in id
+    order so concurrent lockers can't deadlock.
+    """
+    # FOR NO KEY UPDATE, inserts referencing the posts aren't blocked
+    await db.execute(
+        select(models.Post.id)
+        .where(models.Post.id.in_(sorted(post_ids)))
+        .order_by(models.Post.id)
+        .with_for_update(key_share=True)
+    )
+
+
+async def flag_posts(cutoff: datetime) -> int:
+    """
+    Flags the posts about to have comments archived, returns how many were
+    newly flagged.
+    """
+    post_ids = set()
+    for session_maker in comment_session_makers():
+        async with session_maker() as db:
+            post_ids.update((await db.execute(
+                select(models.Comment.post_id.distinct())
+                .where(archivable(cutoff))
+            )).scalars())
+    if not post_ids:
+        return 0
+
+    async with async_session_maker() as db:
+        result = await db.execute(
+            update(models.Post)
+            .where(models.Post.comments_archived == False,
+                   models.Post.id.in_(post_ids))
+            .values(comments_archived=True)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    # Bulk updates bypass the cache's session hook
+    post_cache.clear()
+    return result.rowcount
+
+
+async def archive_chunk(cutoff: datetime, chunk_size: int,
+                        session_maker=async_session_maker) -> int:
+    """
+    Moves up to `chunk_size` comments of one database, returns how many.
+    Their posts were flagged by flag_posts with the same cutoff.
+    """
+    async with session_maker() as db, async_session_maker() as posts_db:
+        ids = (await db.execute(
+            select(models.Comment.id)
+            .where(archivable(cutoff))
+            .order_by(models.Comment.id.desc())
+            .limit(chunk_size)
+        )).scalars().all()
+        if not ids:
+            return 0
+
+        # No replies to the chunk until it is committed
+        await lock_posts(posts_db, (await db.execute(
+            select(models.Comment.post_id.distinct())
+            .where(models.Comment.id.in_(ids))
+        )).scalars())
+        # A reply committed before the lock made its post active again
+        ids = (await db.execute(
+            select(models.Comment.id)
+            .where(models.Comment.id.in_(ids), archivable(cutoff))
+        )).scalars().all()
+        if not ids:
+            return 0
+
+        await db.execute(
+            insert(models.ArchivedComment).from_select(
+                ARCHIVED_COLUMNS + ("archived_at",),
+                select(*(getattr(models.Comment, name)
+                         for name in ARCHIVED_COLUMNS),
+                       literal(datetime.utcnow()))
+                .where(models.Comment.id.in_(ids))
+            )
+        )
+        await db.execute(delete(models.AutoReplyQueue)
+                         .where(models.AutoReplyQueue.comment_id.in_(ids)))
+        # Core deletes bypass the analytics hooks, archived comments still
+        # count there
+        await db.execute(delete(models.Comment)
+                         .where(models.Comment.id.in_(ids)))
+        await db.commit()
+    return len(ids)
+
+
+async def run(
+        after_days: int = COMMENT_ARCHIVE_AFTER_DAYS,
+        chunk_size: int = 1000,
+        max_chunks: Optional[int] = None,
+        flag_delay: float = POST_CACHE_TTL,
+) -> int:
+    """
+    Archives the comments of posts inactive for `after_days` days,
+    returns the number of comments moved.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=after_days)
+    if await flag_posts(cutoff):
+        await asyncio.sleep(flag_delay)
+
+    moved = 0
+    chunks = 0
+    for session_maker in comment_session_makers():
+        while max_chunks is None or chunks < max_chunks:
+            count = await archive_chunk(cutoff, chunk_size, session_maker)
+            if not count:
+                break
+            moved += count
+            chunks += 1
+            logger.info("Archived %s comments", moved)
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--after-days", type=int,
+                        default=COMMENT_ARCHIVE_AFTER_DAYS,
+                        help="Days without a new comment after which a "
+                             "post's comments are archived")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="Comments moved per transaction")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Archived %s comments in total",
+                asyncio.run(run(after_days=args.after_days,
+                                chunk_size=args.chunk_size)))
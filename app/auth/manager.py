@@ -1,13 +1,17 @@
 import os
 import contextlib
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from dotenv import load_dotenv
 from fastapi import Depends, Request
+from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_users import BaseUserManager, IntegerIDMixin, FastAPIUsers
+from fastapi_users import exceptions
 from fastapi_users.exceptions import UserAlreadyExists
 
 from app.auth.auth import auth_backend
+from app.auth.passwords import hash_password, password_helper, \
+    verify_and_update
 from app.auth.schemas import UserCreate
 from app.database import get_user_db, get_async_session
 from app.models import User
@@ -17,9 +21,76 @@ SECRET = os.getenv("JWT_SECRET")
 
 
 class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
+    """
+    Hashes and verifies passwords in the hasher pool of app.auth.passwords
+    instead of on the event loop.
+    """
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
 
+    def __init__(self, user_db):
+        super().__init__(user_db, password_helper)
+
+    async def create(
+            self,
+            user_create: UserCreate,
+            safe: bool = False,
+            request: Optional[Request] = None
+    ) -> User:
+        await self.validate_password(user_create.password, user_create)
+
+        existing_user = await self.user_db.get_by_email(user_create.email)
+        if existing_user is not None:
+            raise exceptions.UserAlreadyExists()
+
+        user_dict = (
+            user_create.create_update_dict()
+            if safe
+            else user_create.create_update_dict_superuser()
+        )
+        password = user_dict.pop("password")
+        user_dict["hashed_password"] = await hash_password(password)
+
+        created_user = await self.user_db.create(user_dict)
+
+        await self.on_after_register(created_user, request)
+
+        return created_user
+
+    async def authenticate(
+            self,
+            credentials: OAuth2PasswordRequestForm
+    ) -> Optional[User]:
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Run the hasher anyway to mitigate timing attacks
+            await hash_password(credentials.password)
+            return None
+
+        verified, updated_password_hash = await verify_and_update(
+            credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        # Upgrade the hash if the cost parameters changed
+        if updated_password_hash is not None:
+            await self.user_db.update(
+                user, {"hashed_password": updated_password_hash})
+
+        return user
+
+    async def _update(self, user: User, update_dict: Dict[str, Any]) -> User:
+        password = update_dict.get("password")
+        if password is not None:
+            await self.validate_password(password, user)
+            update_dict = {
+                **{field: value for field, value in update_dict.items()
+                   if field != "password"},
+                "hashed_password": await hash_password(password),
+            }
+        return await super()._update(user, update_dict)
+
     async def on_after_register(
             self,
             user: User,
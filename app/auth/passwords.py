@@ -0,0 +1,89 @@
+"""
+Password hashing off the event loop.
+
+Argon2 and bcrypt take tens of milliseconds of CPU per hash, so they run in
+a thread or process pool (PASSWORD_HASHER_POOL) instead of blocking every
+other request while a user logs in or registers.
+"""
+import asyncio
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from typing import Optional, Union
+
+from fastapi_users.password import PasswordHelper
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+from pwdlib.hashers.bcrypt import BcryptHasher
+
+from app.config import (
+    ARGON2_MEMORY_COST,
+    ARGON2_PARALLELISM,
+    ARGON2_TIME_COST,
+    BCRYPT_ROUNDS,
+    PASSWORD_HASHER_POOL,
+    PASSWORD_HASHER_WORKERS,
+)
+
+# The first hasher makes new hashes, bcrypt hashes are still verified
+password_helper = PasswordHelper(PasswordHash((
+    Argon2Hasher(
+        time_cost=ARGON2_TIME_COST,
+        memory_cost=ARGON2_MEMORY_COST,
+        parallelism=ARGON2_PARALLELISM,
+    ),
+    BcryptHasher(rounds=BCRYPT_ROUNDS),
+)))
+
+_executor: Optional[Executor] = None
+
+
+def hash_sync(password: str) -> str:
+    return password_helper.hash(password)
+
+
+def verify_and_update_sync(
+        password: str, hashed_password: str
+) -> tuple[bool, Union[str, None]]:
+    return password_helper.verify_and_update(password, hashed_password)
+
+
+def get_executor() -> Optional[Executor]:
+    global _executor
+    if _executor is None and PASSWORD_HASHER_POOL != "none":
+        if PASSWORD_HASHER_POOL == "process":
+            _executor = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASHER_WORKERS)
+        elif PASSWORD_HASHER_POOL == "thread":
+            _executor = ThreadPoolExecutor(
+                max_workers=PASSWORD_HASHER_WORKERS,
+                thread_name_prefix="password-hasher",
+            )
+        else:
+            raise ValueError(
+                f"Unknown password hasher pool: {PASSWORD_HASHER_POOL}")
+    return _executor
+
+
+async def run_hasher(func, *args):
+    executor = get_executor()
+    if executor is None:
+        return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, func, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await run_hasher(hash_sync, password)
+
+
+async def verify_and_update(
+        password: str, hashed_password: str
+) -> tuple[bool, Union[str, None]]:
+    return await run_hasher(verify_and_update_sync, password, hashed_password)
+
+
+def shutdown_hasher() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
@@ -0,0 +1,200 @@
+"""
+Comment analytics rollups, kept up to date incrementally.
+
+Every comment write adds its change to the (hour, post, author) bucket of
+comment_stats_hourly and the (day, post, author) bucket of
+comment_stats_daily, in the transaction of the write. The analytics
+endpoints then sum buckets instead of scanning comments.
+
+ORM writes are picked up by a session hook. Paths writing comments with
+bulk statements (auto-replies, bulk re-moderation, deleting a post) update
+the rollups themselves. Hourly buckets are pruned after
+ANALYTICS_HOURLY_RETENTION_DAYS, the daily ones are kept.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+from sqlalchemy import Table, delete, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+# app.database has to be imported before app.models
+from app.database import UPSERTS, comment_session_makers
+from app import commenter_sketches, models
+from app.analytics_cache import analytics_cache
+from app.config import ANALYTICS_HOURLY_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+PRUNE_INTERVAL = 3600
+
+# (hour, post_id, author_id) -> [total change, blocked change]
+Deltas = dict[tuple[datetime, int, int], list[int]]
+
+
+def hour_bucket(at: datetime) -> datetime:
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def add_delta(deltas: Deltas, comment, total: int, blocked: int) -> None:
+    """
+    Records a change of the comment's bucket. `comment` is a Comment or a
+    row with its created_at, post_id and author_id.
+    """
+    key = (hour_bucket(comment.created_at), comment.post_id,
+           comment.author_id)
+    change = deltas.setdefault(key, [0, 0])
+    change[0] += total
+    change[1] += blocked
+
+
+@lru_cache(maxsize=None)
+def counts_upsert(dialect: str, table: Table):
+    """
+    Adds the given counts to a bucket, creating it if needed.
+    """
+    statement = UPSERTS[dialect](table)
+    return statement.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key],
+        set_={
+            "total_comments": table.c.total_comments
+            + statement.excluded.total_comments,
+            "blocked_comments": table.c.blocked_comments
+            + statement.excluded.blocked_comments,
+        },
+    )
+
+
+def rollup_statements(dialect: str, deltas: Deltas) -> list[tuple]:
+    """
+    The upserts applying the deltas to the hourly and daily buckets and
+    the commenter sketches, with their parameters.
+    """
+    hourly = models.CommentStatsHourly.__table__
+    daily_table = models.CommentStatsDaily.__table__
+
+    daily: dict[tuple[date, int, int], list[int]] = {}
+    for (bucket, post_id, author_id), (total, blocked) in deltas.items():
+        change = daily.setdefault((bucket.date(), post_id, author_id), [0, 0])
+        change[0] += total
+        change[1] += blocked
+
+    def params(buckets: dict, column: str) -> list[dict]:
+        return [
+            {column: key, "post_id": post_id, "author_id": author_id,
+             "total_comments": total, "blocked_comments": blocked}
+            for (key, post_id, author_id), (total, blocked)
+            in buckets.items()
+            if total or blocked
+        ]
+
+    statements = []
+    for table, buckets, column in ((hourly, deltas, "bucket"),
+                                   (daily_table, daily, "day")):
+        rows = params(buckets, column)
+        if rows:
+            statements.append((counts_upsert(dialect, table), rows))
+
+    # New comments also add their authors to the commenter sketches
+    statements.extend(commenter_sketches.sketch_statements(dialect, (
+        (day, post_id, author_id)
+        for (day, post_id, author_id), (total, _) in daily.items()
+        if total > 0
+    )))
+    return statements
+
+
+def note_changed_days(info: dict, deltas: Deltas) -> None:
+    """
+    Remembers the days whose cached analytics the transaction outdates.
+    """
+    info.setdefault("changed_stat_days", set()).update(
+        bucket.date() for bucket, _, _ in deltas
+    )
+
+
+async def record(db: AsyncSession, deltas: Deltas) -> None:
+    """
+    Applies the deltas in the session's transaction, for bulk writes the
+    session hook doesn't see.
+    """
+    dialect = db.get_bind().dialect.name
+    for statement, rows in rollup_statements(dialect, deltas):
+        await db.execute(statement, rows)
+    note_changed_days(db.info, deltas)
+
+
+async def forget_post(db: AsyncSession, post_id: int) -> None:
+    """
+    Drops the buckets of a post whose comments are deleted in bulk.
+    """
+    for model in (models.CommentStatsHourly, models.CommentStatsDaily):
+        await db.execute(delete(model).where(model.post_id == post_id))
+
+
+@event.listens_for(Session, "after_flush")
+def record_comment_changes(session: Session, flush_context) -> None:
+    deltas: Deltas = {}
+    for target in session.new:
+        if isinstance(target, models.Comment):
+            add_delta(deltas, target, 1, int(bool(target.is_blocked)))
+
+    for target in session.dirty:
+        if not isinstance(target, models.Comment):
+            continue
+        history = inspect(target).attrs.is_blocked.history
+        if history.added and history.deleted:
+            blocked = int(bool(history.added[0]))
+            was_blocked = int(bool(history.deleted[0]))
+            if blocked != was_blocked:
+                add_delta(deltas, target, 0, blocked - was_blocked)
+
+    for target in session.deleted:
+        if isinstance(target, models.Comment):
+            add_delta(deltas, target, -1, -int(bool(target.is_blocked)))
+
+    if deltas:
+        connection = session.connection()
+        for statement, rows in rollup_statements(connection.dialect.name,
+                                                 deltas):
+            connection.execute(statement, rows)
+        note_changed_days(session.info, deltas)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_changed_days(session: Session) -> None:
+    days = session.info.pop("changed_stat_days", None)
+    if days:
+        analytics_cache.invalidate(days)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_changed_days(session: Session) -> None:
+    session.info.pop("changed_stat_days", None)
+
+
+async def prune_hourly(
+        retention_days: int = ANALYTICS_HOURLY_RETENTION_DAYS
+) -> None:
+    cutoff = hour_bucket(datetime.utcnow()) - timedelta(days=retention_days)
+    for session_maker in comment_session_makers():
+        async with session_maker() as db:
+            await db.execute(
+                delete(models.CommentStatsHourly)
+                .where(models.CommentStatsHourly.bucket < cutoff)
+            )
+            await db.commit()
+
+
+async def prune_worker(interval: float = PRUNE_INTERVAL) -> None:
+    """
+    Prunes expired hourly buckets every `interval` seconds.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await prune_hourly()
+        except Exception:
+            logger.exception("Pruning hourly comment stats failed")
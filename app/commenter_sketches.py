@@ -0,0 +1,226 @@
+"""
+Approximate distinct commenters, from HyperLogLog sketches.
+
+An author id is hashed to one of REGISTERS registers, and the register
+keeps the highest rank (position of the first set bit in the rest of the
+hash) any author gave it. Sketches of the authors commenting on a day are
+stored for all posts and per post, as one row per register that was hit.
+Comment writes update them with an upsert that keeps the maximum, so
+concurrent writers can't lose each other's updates. Sketches are merged by
+taking the maximum of each register, so the commenters of any range of
+days are estimated from at most REGISTERS rows per day, and sketches of
+comment shards combine the same way.
+
+With PRECISION = 12 the relative standard error is 1.04 / sqrt(4096),
+about 1.6%: 95% of estimates are within 3.3% of the true count, and small
+counts are close to exact. Sketches can't forget: authors whose comments
+were deleted still count, only a deleted post's own sketches are dropped.
+
+The sketches are rebuilt from the daily comment rollups with
+
+    python -m app.commenter_sketches
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import math
+from datetime import date
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from sqlalchemy import Table, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# app.database has to be imported before app.models
+from app.database import (UPSERTS, comment_session_makers, gather_shards,
+                          shards_for)
+from app import models
+
+logger = logging.getLogger(__name__)
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+RELATIVE_ERROR = 1.04 / math.sqrt(REGISTERS)
+HASH_BITS = 64
+
+REBUILD_CHUNK_SIZE = 5000
+
+
+def register_rank(author_id: int) -> tuple[int, int]:
+    digest = hashlib.blake2b(str(author_id).encode(), digest_size=8).digest()
+    value = int.from_bytes(digest, "big")
+    rest_bits = HASH_BITS - PRECISION
+    rest = value & ((1 << rest_bits) - 1)
+    return value >> rest_bits, rest_bits - rest.bit_length() + 1
+
+
+def estimate(ranks: Iterable[int]) -> int:
+    """
+    Number of distinct authors from the ranks of the registers that were
+    hit, the others are zero.
+    """
+    ranks = list(ranks)
+    zeros = REGISTERS - len(ranks)
+    alpha = 0.7213 / (1 + 1.079 / REGISTERS)
+    raw = alpha * REGISTERS ** 2 / (
+        zeros + sum(2.0 ** -rank for rank in ranks)
+    )
+    if raw <= 2.5 * REGISTERS and zeros:
+        # Linear counting is more accurate for small cardinalities
+        return round(REGISTERS * math.log(REGISTERS / zeros))
+    return round(raw)
+
+
+@lru_cache(maxsize=None)
+def max_upsert(dialect: str, table: Table):
+    """
+    Raises a register to the given rank, creating it if needed.
+    """
+    statement = UPSERTS[dialect](table)
+    return statement.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key],
+        set_={"rank": statement.excluded.rank},
+        where=table.c.rank < statement.excluded.rank,
+    )
+
+
+def sketch_statements(
+        dialect: str,
+        commenters: Iterable[tuple[date, int, int]]
+) -> list[tuple]:
+    """
+    The upserts adding (day, post_id, author_id) commenters to the
+    sketches, with their parameters.
+    """
+    daily: dict[tuple, int] = {}
+    per_post: dict[tuple, int] = {}
+    for day, post_id, author_id in commenters:
+        register, rank = register_rank(author_id)
+        key = (day, register)
+        daily[key] = max(daily.get(key, 0), rank)
+        key = (post_id, day, register)
+        per_post[key] = max(per_post.get(key, 0), rank)
+    if not daily:
+        return []
+
+    return [
+        (max_upsert(dialect, models.CommenterSketch.__table__), [
+            {"day": day, "register": register, "rank": rank}
+            for (day, register), rank in daily.items()
+        ]),
+        (max_upsert(dialect, models.PostCommenterSketch.__table__), [
+            {"post_id": post_id, "day": day, "register": register,
+             "rank": rank}
+            for (post_id, day, register), rank in per_post.items()
+        ]),
+    ]
+
+
+def merge(sketches: Iterable[Iterable[tuple[int, int]]]) -> dict[int, int]:
+    """
+    Highest rank of each register over (register, rank) pairs.
+    """
+    registers: dict[int, int] = {}
+    for sketch in sketches:
+        for register, rank in sketch:
+            if rank > registers.get(register, 0):
+                registers[register] = rank
+    return registers
+
+
+def sketch_model(post_id: Optional[int]):
+    if post_id is None:
+        return models.CommenterSketch
+    return models.PostCommenterSketch
+
+
+async def unique_commenters(db: AsyncSession, date_from: date,
+                            date_to: date,
+                            post_id: Optional[int] = None) -> int:
+    """
+    Estimated commenters between the two days, inclusive, optionally on
+    one post.
+    """
+    model = sketch_model(post_id)
+    query = (
+        select(model.register, func.max(model.rank))
+        .where(model.day.between(date_from, date_to))
+        .group_by(model.register)
+    )
+    if post_id is not None:
+        query = query.where(model.post_id == post_id)
+
+    async def load(session: AsyncSession, shard: int) -> list:
+        return (await session.execute(query)).all()
+
+    sketches = await gather_shards(db, load, shards_for(post_id))
+    return estimate(merge(sketches).values())
+
+
+async def unique_commenters_per_day(
+        db: AsyncSession,
+        days: list[date],
+        post_id: Optional[int] = None
+) -> dict[date, int]:
+    """
+    Estimated commenters of each of the days, optionally on one post.
+    """
+    model = sketch_model(post_id)
+    query = select(model.day, model.register, model.rank).where(
+        model.day.in_(days))
+    if post_id is not None:
+        query = query.where(model.post_id == post_id)
+
+    async def load(session: AsyncSession, shard: int) -> list:
+        return (await session.execute(query)).all()
+
+    sketches: dict[date, list] = {day: [] for day in days}
+    for rows in await gather_shards(db, load, shards_for(post_id)):
+        for day, register, rank in rows:
+            sketches[day].append((register, rank))
+    return {day: estimate(merge([sketch]).values())
+            for day, sketch in sketches.items()}
+
+
+async def forget_post(db: AsyncSession, post_id: int) -> None:
+    """
+    Drops the sketches of a deleted post. Its commenters still count in
+    the sketches of all posts.
+    """
+    await db.execute(delete(models.PostCommenterSketch)
+                     .where(models.PostCommenterSketch.post_id == post_id))
+
+
+async def rebuild() -> int:
+    """
+    Recomputes all sketches from the daily comment rollups, returns the
+    number of (day, post, author) buckets read.
+    """
+    stats = models.CommentStatsDaily
+    read = 0
+    for session_maker in comment_session_makers():
+        async with session_maker() as db:
+            dialect = db.get_bind().dialect.name
+            await db.execute(delete(models.CommenterSketch))
+            await db.execute(delete(models.PostCommenterSketch))
+            result = await db.stream(
+                select(stats.day, stats.post_id, stats.author_id)
+                .where(stats.total_comments > 0)
+                .execution_options(yield_per=REBUILD_CHUNK_SIZE)
+            )
+            async for rows in result.partitions():
+                for statement, params in sketch_statements(dialect, rows):
+                    await db.execute(statement, params)
+                read += len(rows)
+            await db.commit()
+    return read
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Rebuilt the sketches from %s daily buckets",
+                asyncio.run(rebuild()))
@@ -3,3 +3,81 @@ from dotenv import load_dotenv
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_ECHO = os.getenv("DATABASE_ECHO", "true").lower() == "true"
+# Compiled SQL kept by SQLAlchemy, and statements asyncpg keeps prepared
+# on each Postgres connection
+DATABASE_QUERY_CACHE_SIZE = int(os.getenv("DATABASE_QUERY_CACHE_SIZE", "500"))
+DATABASE_PREPARED_STATEMENT_CACHE_SIZE = int(
+    os.getenv("DATABASE_PREPARED_STATEMENT_CACHE_SIZE", "500"))
+# Comma separated databases the comments are spread over by post id, along
+# with their rollups, sketches, archive and queues. Empty keeps them in
+# DATABASE_URL.
+COMMENT_SHARD_URLS = [
+    url.strip() for url in os.getenv("COMMENT_SHARD_URLS", "").split(",")
+    if url.strip()
+]
+
+# Password hashing runs in a "thread" or "process" pool of
+# PASSWORD_HASHER_WORKERS workers (defaults to the CPU count), "none" hashes
+# on the event loop. Hashes made with other cost parameters are upgraded on
+# the next login.
+PASSWORD_HASHER_POOL = os.getenv("PASSWORD_HASHER_POOL", "thread")
+PASSWORD_HASHER_WORKERS = int(os.getenv("PASSWORD_HASHER_WORKERS", "0")) \
+    or os.cpu_count()
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Post metadata (owner, is_blocked, auto-reply settings) cached per worker.
+# Writes in this worker invalidate entries at once, the TTL bounds how long
+# another worker's writes may go unnoticed.
+POST_CACHE_SIZE = int(os.getenv("POST_CACHE_SIZE", "10000"))
+POST_CACHE_TTL = float(os.getenv("POST_CACHE_TTL", "30"))
+
+# Comment events for the subscription endpoint go through this broker.
+# "local" only reaches subscribers connected to the same worker.
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "local")
+# Events buffered per subscriber, the oldest are dropped when it lags
+PUBSUB_QUEUE_SIZE = int(os.getenv("PUBSUB_QUEUE_SIZE", "100"))
+# Seconds between keep-alive comments on idle event streams
+SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", "15"))
+
+# Most ids a batch request (ids=) may ask for, and most comments embedded
+# per post with include=comments
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "100"))
+EMBEDDED_COMMENTS_MAX = int(os.getenv("EMBEDDED_COMMENTS_MAX", "50"))
+
+# Comments count towards the trending score of a post with a weight that
+# halves every TRENDING_HALF_LIFE hours. Stored scores are rescaled every
+# TRENDING_RENORMALIZE_INTERVAL seconds so they stay small.
+TRENDING_HALF_LIFE = float(os.getenv("TRENDING_HALF_LIFE", "24"))
+TRENDING_RENORMALIZE_INTERVAL = float(
+    os.getenv("TRENDING_RENORMALIZE_INTERVAL", "3600"))
+
+# Post views are counted in memory and added to posts.view_count every
+# VIEW_FLUSH_INTERVAL seconds, a crashed worker loses at most that much
+VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", "5"))
+
+# Hourly comment analytics buckets older than this many days are pruned,
+# the daily rollups are kept
+ANALYTICS_HOURLY_RETENTION_DAYS = int(
+    os.getenv("ANALYTICS_HOURLY_RETENTION_DAYS", "30"))
+
+# Daily analytics of closed days are cached per worker for up to
+# ANALYTICS_CACHE_SIZE filter combinations. Edits through this worker
+# invalidate their day, ANALYTICS_CACHE_TTL (seconds, 0 keeps days forever)
+# bounds how long other workers' late edits can go unnoticed.
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "1000"))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "300"))
+
+# Comments of posts without a new comment for this many days are moved to
+# the archive table by python -m app.archive
+COMMENT_ARCHIVE_AFTER_DAYS = int(
+    os.getenv("COMMENT_ARCHIVE_AFTER_DAYS", "180"))
+
+# The event loop is checked every LOOP_LAG_INTERVAL seconds (0 turns the
+# monitor off), the stack of code blocking it for longer than
+# LOOP_LAG_THRESHOLD seconds is logged
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.2"))
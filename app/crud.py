@@ -1,13 +1,274 @@
-from datetime import date
-from typing import Optional, Literal
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Optional, Literal, Union
 
 from fastapi import HTTPException, BackgroundTasks
-from sqlalchemy import asc, desc, select, func, Integer, delete
+from sqlalchemy import (asc, desc, select, func, delete, bindparam, Select,
+                        union_all)
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app import models, schemas
+from app import commenter_sketches, comment_stats, models, schemas
 from app.ai.auto_reply import auto_reply
-from app.ai.moderation import is_acceptable_text
+from app.analytics_cache import analytics_cache, utc_today
+from app.archive import lock_posts
+from app.database import (comment_id_session, comment_id_shard,
+                          comment_session, comment_shard, gather_shards,
+                          shards_for)
+from app.ai.moderation import (moderate, content_fingerprint,
+                               moderation_version)
+from app.post_cache import post_cache
+from app.pubsub import publish_comment_event
+from app.trending import forget_comment, record_comment
+
+# Columns returned by the list endpoints when no fields= are given
+POST_FIELDS = tuple(schemas.PostFields.model_fields)
+COMMENT_FIELDS = tuple(schemas.CommentFields.model_fields)
+
+POST_SORT_COLUMNS = {
+    "title": models.Post.title,
+    "date": models.Post.created_at,
+}
+COMMENT_SORT_COLUMNS = {
+    "created_at": models.Comment.created_at,
+    "author_id": models.Comment.author_id,
+}
+
+# The hot read queries are built once per variant and executed with bound
+# parameters, so a request only pays for a cache lookup instead of
+# rebuilding the select() chain and its SQL cache key.
+STATEMENT_CACHE_SIZE = 256
+
+
+def order_by_column(column, sort_order: str):
+    return asc(column) if sort_order == "asc" else desc(column)
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def posts_statement(
+        fields: tuple[str, ...],
+        sort_by: Optional[str],
+        sort_order: str,
+        superuser: bool,
+        by_ids: bool = False
+) -> Select:
+    """
+    get_posts query, bound with `offset` and `limit`, or with the list of
+    `ids` for a batch fetch.
+    """
+    query = select(*(getattr(models.Post, field) for field in fields))
+    if not superuser:
+        query = query.where(models.Post.is_blocked == False)
+    if sort_by:
+        query = query.order_by(
+            order_by_column(POST_SORT_COLUMNS[sort_by], sort_order))
+    if by_ids:
+        return query.where(
+            models.Post.id.in_(bindparam("ids", expanding=True)))
+    return query.offset(bindparam("offset")).limit(bindparam("limit"))
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def comments_statement(
+        fields: tuple[str, ...],
+        sort_by: Optional[str],
+        sort_order: str,
+        superuser: bool,
+        archived: bool = False
+) -> Select:
+    """
+    get_comments query, bound with `post_id`, `offset` and `limit`. For
+    posts with `archived` comments it reads the archive table as well.
+    """
+    def post_comments(model, columns: tuple[str, ...]) -> Select:
+        query = select(
+            *(getattr(model, field) for field in columns)
+        ).where(model.post_id == bindparam("post_id"))
+        if not superuser:
+            query = query.where(model.is_blocked == False)
+        return query
+
+    if not archived:
+        query = post_comments(models.Comment, fields)
+        sort_column = sort_by and COMMENT_SORT_COLUMNS[sort_by]
+    else:
+        # The sort column has to be selected to order the union by it
+        columns = fields + ((sort_by,) if sort_by and sort_by not in fields
+                            else ())
+        comments = union_all(
+            post_comments(models.Comment, columns),
+            post_comments(models.ArchivedComment, columns),
+        ).subquery()
+        query = select(*(comments.c[field] for field in fields))
+        sort_column = sort_by and comments.c[sort_by]
+    if sort_by:
+        query = query.order_by(order_by_column(sort_column, sort_order))
+    return query.offset(bindparam("offset")).limit(bindparam("limit"))
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def comments_by_ids_statement(
+        fields: tuple[str, ...],
+        superuser: bool
+) -> Select:
+    """
+    get_comments_by_ids query, bound with the list of `ids`.
+    """
+    query = select(
+        *(getattr(models.Comment, field) for field in fields)
+    ).where(models.Comment.id.in_(bindparam("ids", expanding=True)))
+    if not superuser:
+        query = query.where(models.Comment.is_blocked == False)
+    return query.order_by(models.Comment.id)
+
+
+@lru_cache(maxsize=2)
+def embedded_comments_statement(superuser: bool) -> Select:
+    """
+    The first `comments_limit` comments of each of the `post_ids` posts,
+    numbered per post with ROW_NUMBER so all posts take one query.
+    """
+    position = func.row_number().over(
+        partition_by=models.Comment.post_id,
+        order_by=(models.Comment.created_at, models.Comment.id),
+    ).label("position")
+    ranked = select(
+        *(getattr(models.Comment, field) for field in COMMENT_FIELDS),
+        position,
+    ).where(models.Comment.post_id.in_(bindparam("post_ids", expanding=True)))
+    if not superuser:
+        ranked = ranked.where(models.Comment.is_blocked == False)
+    ranked = ranked.subquery()
+
+    return select(
+        *(ranked.c[field] for field in COMMENT_FIELDS)
+    ).where(
+        ranked.c.position <= bindparam("comments_limit")
+    ).order_by(ranked.c.post_id, ranked.c.position)
+
+
+ANALYTICS_BUCKETS = {
+    "day": (models.CommentStatsDaily, models.CommentStatsDaily.day),
+    "hour": (models.CommentStatsHourly, models.CommentStatsHourly.bucket),
+}
+
+FIRST_COMMENT_DATE = select(func.min(models.CommentStatsDaily.day))
+
+
+async def first_comment_date(db: AsyncSession) -> Optional[date]:
+    days = await gather_shards(
+        db, lambda session, shard: session.scalar(FIRST_COMMENT_DATE))
+    return min((day for day in days if day is not None), default=None)
+
+
+async def analytics_rows(
+        db: AsyncSession,
+        query: Select,
+        params: dict,
+        label: str,
+        post_id: Optional[int]
+) -> dict:
+    """
+    Runs an analytics query on the comment shards, only the post's one
+    when filtering by post, and sums up the rows by bucket.
+    """
+    async def load(session: AsyncSession, shard: int) -> list:
+        return (await session.execute(query, params)).mappings().all()
+
+    rows = {}
+    for result in await gather_shards(db, load, shards_for(post_id)):
+        for row in result:
+            merged = rows.get(row[label])
+            if merged is None:
+                rows[row[label]] = {
+                    **row, "blocked_comments": row["blocked_comments"] or 0
+                }
+            else:
+                merged["total_comments"] += row["total_comments"]
+                merged["blocked_comments"] += row["blocked_comments"] or 0
+    return rows
+
+
+@lru_cache(maxsize=None)
+def analytics_statement(
+        sort_order: str,
+        granularity: str = "day",
+        by_post: bool = False,
+        by_author: bool = False
+) -> Select:
+    """
+    get_comment_analytics query over the rollup buckets, bound with
+    `date_from`, `date_to`, `offset` and `limit`, plus `post_id` and
+    `author_id` when filtering by them.
+    """
+    model, bucket = ANALYTICS_BUCKETS[granularity]
+    label = "date" if granularity == "day" else "hour"
+    query = (
+        select(
+            bucket.label(label),
+            func.sum(model.total_comments).label("total_comments"),
+            func.sum(model.blocked_comments).label("blocked_comments"),
+        )
+        .where(bucket >= bindparam("date_from"),
+               bucket < bindparam("date_to"))
+        .group_by(bucket)
+        .having(func.sum(model.total_comments) > 0)
+    )
+    if by_post:
+        query = query.where(model.post_id == bindparam("post_id"))
+    if by_author:
+        query = query.where(model.author_id == bindparam("author_id"))
+    return (
+        query.order_by(order_by_column(bucket, sort_order))
+        .offset(bindparam("offset")).limit(bindparam("limit"))
+    )
+
+
+def queue_for_review(
+        db: AsyncSession,
+        target_type: Literal["post", "comment"],
+        target_id: int
+) -> None:
+    """
+    Adds a post or comment the model could not check to the
+    re-moderation queue, as part of the caller's transaction.
+    """
+    db.add(models.ModerationQueue(
+        target_type=target_type,
+        target_id=target_id
+    ))
+
+
+async def apply_moderation(
+        target: Union[models.Post, models.Comment],
+        text: str
+) -> bool:
+    """
+    Moderates the text and stores the verdict on the post or comment.
+
+    The model is skipped when the target already holds a verdict for the
+    same text from the current moderation version. Returns True if the
+    verdict was made without the model and has to be queued for review.
+    """
+    fingerprint = content_fingerprint(text)
+    try:
+        version = moderation_version()
+    except Exception:
+        # The backend can't be built (e.g. no GEMINI_API_KEY), moderate()
+        # falls back the same way
+        version = None
+    if (version is not None
+            and target.moderation_fingerprint == fingerprint
+            and target.moderation_version == version):
+        return False
+
+    verdict = await moderate(text)
+    target.is_blocked = not verdict.acceptable
+    target.moderation_fingerprint = fingerprint
+    if version is None or verdict.needs_review:
+        target.moderation_version = None
+        return True
+    target.moderation_version = version
+    return False
 
 
 async def get_posts(
@@ -17,40 +278,80 @@ async def get_posts(
         limit: int = 10,
         sort_by: Literal["title", "date", None] = None,
         sort_order: Literal["asc", "desc"] = "asc",
-) -> list[models.Post]:
+        fields: Optional[list[str]] = None,
+        ids: Optional[list[int]] = None,
+        comments_limit: Optional[int] = None,
+) -> list[dict]:
     """
     Fetch posts from the database, with optional sorting and pagination.
     Superusers can see all posts, while users can only see unblocked posts.
+
+    Returns plain dicts of the `fields` columns (all by default), read
+    straight from the result rows without building Post objects.
+    Given `ids`, fetches those posts instead of a page. Given
+    `comments_limit`, each post gets its first comments under "comments".
     """
-    # Start the query, filter if the user is not a superuser
-    query = select(models.Post)
+    if sort_by and sort_by not in POST_SORT_COLUMNS:
+        raise HTTPException(status_code=400,
+                            detail="Invalid sort_by field")
+
+    columns = tuple(fields or POST_FIELDS)
+    # Embedding comments needs the post ids even if they weren't asked for
+    hide_id = comments_limit is not None and "id" not in columns
+    if hide_id:
+        columns += ("id",)
+
+    # Superusers see blocked posts too, hence a separate statement
+    query = posts_statement(columns, sort_by, sort_order, user.is_superuser,
+                            ids is not None)
+
+    # Execute the query with pagination (offset and limit)
+    if ids is not None:
+        params = {"ids": ids}
+    else:
+        params = {"offset": offset, "limit": limit}
+    result = await db.execute(query, params)
+    posts = [dict(row) for row in result.mappings()]
+
+    if comments_limit is not None:
+        await embed_comments(db, user, posts, comments_limit)
+        if hide_id:
+            for post in posts:
+                del post["id"]
+    return posts
 
-    if not user.is_superuser:
-        query = query.where(models.Post.is_blocked == False)
 
-    # Apply sorting based on the sort_by and sort_order parameters
-    if sort_by:
-        if sort_by == "title":
-            order = asc(models.Post.title) if sort_order == "asc" else desc(
-                models.Post.title)
-        elif sort_by == "date":
-            order = asc(
-                models.Post.created_at) if sort_order == "asc" else desc(
-                models.Post.created_at)
-        else:
-            raise HTTPException(status_code=400,
-                                detail="Invalid sort_by field")
-
-        query = query.order_by(order)
-
-    # Apply pagination (offset and limit)
-    query = query.offset(offset).limit(limit)
-
-    # Execute the query and fetch results asynchronously
-    result = await db.execute(query)
-    posts = result.scalars().all()
+async def embed_comments(
+        db: AsyncSession,
+        user: models.User,
+        posts: list[dict],
+        limit: int
+) -> None:
+    """
+    Adds the first `limit` comments of each post under "comments", loaded
+    with one query for all posts.
+    """
+    by_post = {post["id"]: [] for post in posts}
+    for post in posts:
+        post["comments"] = by_post[post["id"]]
+    if not by_post:
+        return
+
+    # One query per shard holding some of the posts
+    shard_posts = {}
+    for post_id in by_post:
+        shard_posts.setdefault(comment_shard(post_id), []).append(post_id)
+
+    async def load(session: AsyncSession, shard: int) -> list:
+        result = await session.execute(
+            embedded_comments_statement(user.is_superuser),
+            {"post_ids": shard_posts[shard], "comments_limit": limit},
+        )
+        return result.mappings().all()
 
-    return posts
+    for comments in await gather_shards(db, load, shard_posts):
+        for comment in comments:
+            by_post[comment["post_id"]].append(dict(comment))
 
 
 async def get_post(
@@ -89,9 +390,12 @@ async def create_post(
 
     # Post moderation logic
     post_text = new_post.title + " " + new_post.content
-    new_post.is_blocked = not is_acceptable_text(post_text)
+    needs_review = await apply_moderation(new_post, post_text)
 
     db.add(new_post)
+    if needs_review:
+        await db.flush()
+        queue_for_review(db, "post", new_post.id)
     await db.commit()
     await db.refresh(new_post)
     return new_post
@@ -106,11 +410,8 @@ async def update_post(
     """
     Updates an existing post with the provided data.
     """
-    # Fetch the post by its ID
-    result = await db.execute(
-        select(models.Post).where(models.Post.id == post_id)
-    )
-    post = result.scalar_one_or_none()
+    # Fetch the post by its ID, the whole row is updated anyway
+    post = await db.get(models.Post, post_id)
 
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
@@ -122,10 +423,12 @@ async def update_post(
     # Update the post fields
     for key, value in updated_data.dict(exclude_unset=True).items():
         setattr(post, key, value)
+    post.content_preview = models.make_preview(post.content)
 
-    # Post moderation logic
+    # Post moderation logic, skipped if the text didn't change
     post_text = post.title + " " + post.content
-    post.is_blocked = not is_acceptable_text(post_text)
+    if await apply_moderation(post, post_text):
+        queue_for_review(db, "post", post.id)
 
     # Commit the changes
     await db.commit()
@@ -142,26 +445,40 @@ async def delete_post(
     """
     Deletes a post by its ID.
     """
-    # Fetch the post by its ID
-    result = await db.execute(
-        select(models.Post).where(models.Post.id == post_id)
-    )
-    post = result.scalar_one_or_none()
+    # Check the post exists and belongs to the user
+    meta = await post_cache.load(db, post_id)
 
-    if not post:
+    if not meta:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    if post.owner_id != user.id:
+    if meta.owner_id != user.id:
         raise HTTPException(status_code=403,
                             detail="Not authorized to delete this post")
 
-    await db.execute(
-        delete(models.Comment).where(models.Comment.post_id == post_id)
-    )
+    async with comment_session(db, post_id) as comments_db:
+        await comments_db.execute(
+            delete(models.Comment).where(models.Comment.post_id == post_id)
+        )
+        await comments_db.execute(
+            delete(models.ArchivedComment)
+            .where(models.ArchivedComment.post_id == post_id)
+        )
+        await comment_stats.forget_post(comments_db, post_id)
+        await commenter_sketches.forget_post(comments_db, post_id)
 
-    # Delete the post
-    await db.delete(post)
-    await db.commit()
+        await db.execute(
+            delete(models.PostScore)
+            .where(models.PostScore.post_id == post_id)
+        )
+        # Delete the post, bulk deletes bypass the cache's session hook
+        await db.execute(
+            delete(models.Post).where(models.Post.id == post_id))
+        # The comments go first, a failure leaves the post without them
+        await comments_db.commit()
+        await db.commit()
+    post_cache.invalidate(post_id)
+    # The post's buckets are gone from every day
+    analytics_cache.clear()
 
 
 async def create_comment(
@@ -175,42 +492,56 @@ async def create_comment(
     """
     Creates a new comment for the given post.
     """
-    # Fetch the post by its ID
-    result = await db.execute(
-        select(models.Post).where(models.Post.id == post_id)
-    )
-    post = result.scalar_one_or_none()
-
-    if parent_id:
-        parent = await db.execute(
-            select(models.Post).where(models.Comment.id == parent_id)
+    # Owner, is_blocked and auto-reply settings, usually from the cache
+    post = await post_cache.load(db, post_id)
+
+    async with comment_session(db, post_id) as comments_db:
+        if parent_id:
+            parent_comment = await comments_db.get(models.Comment, parent_id)
+
+            if parent_comment:
+                parent_post = (post if parent_comment.post_id == post_id
+                               else await post_cache.load(
+                                   db, parent_comment.post_id))
+                if parent_post and parent_post.comments_archived:
+                    # The archive job may be moving the parent, it can't
+                    # while the post is locked
+                    await lock_posts(db, [parent_comment.post_id])
+                    parent_comment = await comments_db.get(
+                        models.Comment, parent_id, populate_existing=True)
+
+            if not parent_comment:
+                raise HTTPException(status_code=404,
+                                    detail="Parent comment not found")
+
+        if not post:
+            raise HTTPException(status_code=404, detail="Post not found")
+
+        if post.is_blocked:
+            raise HTTPException(status_code=403, detail="Post is blocked")
+
+        # Create the comment
+        new_comment = models.Comment(
+            **comment.dict(),
+            post_id=post_id,
+            author_id=user.id,
+            parent_id=parent_id
         )
-        parent_comment = parent.scalar_one_or_none()
-
-        if not parent_comment:
-            raise HTTPException(status_code=404,
-                                detail="Parent comment not found")
-
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    if post.is_blocked:
-        raise HTTPException(status_code=403, detail="Post is blocked")
-
-    # Create the comment
-    new_comment = models.Comment(
-        **comment.dict(),
-        post_id=post_id,
-        author_id=user.id,
-        parent_id=parent_id
-    )
-    new_comment_text = new_comment.content
-
-    new_comment.is_blocked = not is_acceptable_text(new_comment_text)
-
-    db.add(new_comment)
-    await db.commit()
-    await db.refresh(new_comment)
+        new_comment_text = new_comment.content
+
+        needs_review = await apply_moderation(new_comment, new_comment_text)
+
+        comments_db.add(new_comment)
+        if needs_review:
+            await comments_db.flush()
+            queue_for_review(comments_db, "comment", new_comment.id)
+        if not new_comment.is_blocked:
+            await record_comment(db, post_id)
+        # Trending scores are kept in the main database
+        await comments_db.commit()
+        await db.commit()
+        await comments_db.refresh(new_comment)
+    await publish_comment_event("comment_created", new_comment)
 
     # If auto_reply is enabled for the post, schedule an automatic reply
     if post.auto_reply and not new_comment.is_blocked:
@@ -229,30 +560,42 @@ async def update_comment(
     """
     Updates an existing comment with the provided data.
     """
-    # Fetch the comment by its ID
-    result = await db.execute(
-        select(models.Comment).where(models.Comment.id == comment_id)
-    )
-    comment = result.scalar_one_or_none()
-
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-
-    if comment.author_id != user.id:
-        raise HTTPException(status_code=403,
-                            detail="Not authorized to update this comment")
-
-    # Update the comment fields
-    for key, value in updated_data.dict(exclude_unset=True).items():
-        setattr(comment, key, value)
-
-    # Comment moderation logic
-    comment_text = comment.content
-    comment.is_blocked = not is_acceptable_text(comment_text)
+    async with comment_id_session(db, comment_id) as comments_db:
+        # Fetch the comment by its ID
+        result = await comments_db.execute(
+            select(models.Comment).where(models.Comment.id == comment_id)
+        )
+        comment = result.scalar_one_or_none()
 
-    # Commit the changes
-    await db.commit()
-    await db.refresh(comment)
+        if not comment:
+            raise HTTPException(status_code=404,
+                                detail="Comment not found")
+
+        if comment.author_id != user.id:
+            raise HTTPException(
+                status_code=403,
+                detail="Not authorized to update this comment")
+
+        # Update the comment fields
+        for key, value in updated_data.dict(exclude_unset=True).items():
+            setattr(comment, key, value)
+        comment.content_preview = models.make_preview(comment.content)
+
+        # Comment moderation logic, skipped if the text didn't change
+        comment_text = comment.content
+        was_blocked = comment.is_blocked
+        if await apply_moderation(comment, comment_text):
+            queue_for_review(comments_db, "comment", comment.id)
+        if comment.is_blocked and not was_blocked:
+            await forget_comment(db, comment.post_id, comment.created_at)
+        elif was_blocked and not comment.is_blocked:
+            await record_comment(db, comment.post_id, comment.created_at)
+
+        # Commit the changes, trending scores are in the main database
+        await comments_db.commit()
+        await db.commit()
+        await comments_db.refresh(comment)
+    await publish_comment_event("comment_updated", comment)
     return comment
 
 
@@ -264,22 +607,29 @@ async def delete_comment(
     """
     Deletes a post by its ID.
     """
-    # Fetch the post by its ID
-    result = await db.execute(
-        select(models.Comment).where(models.Comment.id == comment_id)
-    )
-    comment = result.scalar_one_or_none()
+    async with comment_id_session(db, comment_id) as comments_db:
+        # Fetch the post by its ID
+        result = await comments_db.execute(
+            select(models.Comment).where(models.Comment.id == comment_id)
+        )
+        comment = result.scalar_one_or_none()
 
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
+        if not comment:
+            raise HTTPException(status_code=404,
+                                detail="Comment not found")
 
-    if comment.author_id != user.id:
-        raise HTTPException(status_code=403,
-                            detail="Not authorized to delete this comment")
+        if comment.author_id != user.id:
+            raise HTTPException(
+                status_code=403,
+                detail="Not authorized to delete this comment")
 
-    # Delete the post
-    await db.delete(comment)
-    await db.commit()
+        # Delete the post
+        await comments_db.delete(comment)
+        if not comment.is_blocked:
+            await forget_comment(db, comment.post_id, comment.created_at)
+        await comments_db.commit()
+        await db.commit()
+    await publish_comment_event("comment_deleted", comment)
 
 
 async def get_comments(
@@ -289,16 +639,15 @@ async def get_comments(
     offset: int = 0,
     limit: int = 10,
     sort_by: Literal["created_at", "author_id"] = None,
-    sort_order: Literal["asc", "desc"] = "asc"
-) -> list[models.Comment]:
+    sort_order: Literal["asc", "desc"] = "asc",
+    fields: Optional[list[str]] = None,
+) -> list[dict]:
     """
-    Fetches comments for a given post.
+    Fetches comments for a given post as plain dicts of the `fields`
+    columns (all by default).
     """
-    # Fetch the post by its ID
-    result = await db.execute(
-        select(models.Post).where(models.Post.id == post_id)
-    )
-    post = result.scalar_one_or_none()
+    # Fetch the post metadata, usually from the cache
+    post = await post_cache.load(db, post_id)
 
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
@@ -306,34 +655,49 @@ async def get_comments(
     if post.is_blocked:
         raise HTTPException(status_code=403, detail="Post is blocked")
 
-    # Fetch the comments for the post
-    query = select(models.Comment).where(models.Comment.post_id == post_id)
-
-    if not user.is_superuser:
-        query = query.where(models.Comment.is_blocked == False)
+    if sort_by and sort_by not in COMMENT_SORT_COLUMNS:
+        raise HTTPException(status_code=400,
+                            detail="Invalid sort_by field")
 
-    if sort_by:
-        if sort_by == "author_id":
-            order = asc(models.Comment.author_id) if sort_order == "asc" else (
-                desc(models.Comment.author_id))
-        elif sort_by == "created_at":
-            order = asc(
-                models.Comment.created_at) if sort_order == "asc" else desc(
-                models.Comment.created_at)
-        else:
-            raise HTTPException(status_code=400,
-                                detail="Invalid sort_by field")
+    # Fetch the comments for the post
+    query = comments_statement(tuple(fields or COMMENT_FIELDS), sort_by,
+                               sort_order, user.is_superuser,
+                               post.comments_archived)
+
+    # Execute the query with pagination (offset and limit)
+    async with comment_session(db, post_id) as comments_db:
+        result = await comments_db.execute(
+            query, {"post_id": post_id, "offset": offset, "limit": limit}
+        )
+        return [dict(row) for row in result.mappings()]
 
-        query = query.order_by(order)
 
-    # Apply pagination (offset and limit)
-    query = query.offset(offset).limit(limit)
+async def get_comments_by_ids(
+    ids: list[int],
+    db: AsyncSession,
+    user: models.User,
+    fields: Optional[list[str]] = None,
+) -> list[dict]:
+    """
+    Fetches the given comments in one query, as plain dicts of the
+    `fields` columns. Missing ids, and blocked comments for users who
+    can't see them, are left out.
+    """
+    query = comments_by_ids_statement(tuple(fields or COMMENT_FIELDS),
+                                      user.is_superuser)
+    shard_ids = {}
+    for comment_id in ids:
+        shard_ids.setdefault(comment_id_shard(comment_id), []).append(
+            comment_id)
 
-    # Execute the query and fetch results asynchronously
-    result = await db.execute(query)
-    comments = result.scalars().all()
+    async def load(session: AsyncSession, shard: int) -> list:
+        result = await session.execute(query, {"ids": shard_ids[shard]})
+        return result.mappings().all()
 
-    return comments
+    # Shards hand out ascending id ranges, so this keeps the id order
+    return [dict(row)
+            for rows in await gather_shards(db, load, sorted(shard_ids))
+            for row in rows]
 
 
 async def get_comment(
@@ -344,10 +708,15 @@ async def get_comment(
     """
     Fetches a comment by its ID.
     """
-    result = await db.execute(
-        select(models.Comment).where(models.Comment.id == comment_id)
-    )
-    comment = result.scalar_one_or_none()
+    async with comment_id_session(db, comment_id) as comments_db:
+        result = await comments_db.execute(
+            select(models.Comment).where(models.Comment.id == comment_id)
+        )
+        # Comments of inactive posts may have moved to the archive
+        comment = (
+            result.scalar_one_or_none()
+            or await comments_db.get(models.ArchivedComment, comment_id)
+        )
 
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
@@ -365,18 +734,25 @@ async def get_comment_analytics(
         date_to: Optional[date] = None,
         offset: Optional[int] = 0,
         limit: Optional[int] = 10,
-        sort_order: Literal["asc", "desc"] = "desc"
+        sort_order: Literal["asc", "desc"] = "desc",
+        granularity: Literal["day", "hour"] = "day",
+        post_id: Optional[int] = None,
+        author_id: Optional[int] = None,
 ) -> list[dict]:
+    """
+    Comment counts per day or hour, optionally of one post or author,
+    summed from the rollup buckets.
+    """
     if not user.is_superuser:
         raise HTTPException(status_code=403,
                             detail="Not authorized to view analytics")
 
     if date_from is None:
-        date_from = (await db.execute(
-            select(func.date(func.min(models.Comment.created_at)))
-        )).scalar()
+        date_from = await first_comment_date(db)
+        if date_from is None:
+            return []
     if date_to is None:
-        date_to = str(date.today())
+        date_to = date.today()
 
     if date_from > date_to:
         raise HTTPException(status_code=400, detail="Invalid date range")
@@ -384,32 +760,132 @@ async def get_comment_analytics(
     if sort_order not in ["asc", "desc"]:
         raise HTTPException(status_code=400, detail="Invalid sort_order field")
 
-    order = asc("date") if sort_order == "asc" else desc("date")
+    if granularity == "day":
+        return await get_daily_analytics(db, date_from, date_to, offset,
+                                         limit, sort_order, post_id,
+                                         author_id)
+
+    # Each shard's first offset + limit hours include the page's hours
+    params = {
+        "date_from": datetime.combine(date_from, time()),
+        "date_to": datetime.combine(date_to + timedelta(days=1), time()),
+        "offset": 0,
+        "limit": offset + limit,
+    }
+    if post_id is not None:
+        params["post_id"] = post_id
+    if author_id is not None:
+        params["author_id"] = author_id
+
+    query = analytics_statement(sort_order, granularity,
+                                post_id is not None, author_id is not None)
+    rows = await analytics_rows(db, query, params, "hour", post_id)
+    hours = sorted(rows, reverse=sort_order == "desc")
+    return [rows[hour] for hour in hours[offset:offset + limit]]
+
+
+async def load_daily_analytics(
+        db: AsyncSession,
+        date_from: date,
+        date_to: date,
+        post_id: Optional[int],
+        author_id: Optional[int]
+) -> dict[date, dict]:
+    """
+    The daily analytics rows of the days with comments between the two
+    dates, by day.
+    """
+    params = {
+        "date_from": date_from,
+        "date_to": date_to + timedelta(days=1),
+        "offset": 0,
+        "limit": (date_to - date_from).days + 1,
+    }
+    if post_id is not None:
+        params["post_id"] = post_id
+    if author_id is not None:
+        params["author_id"] = author_id
+
+    query = analytics_statement("asc", "day", post_id is not None,
+                                author_id is not None)
+    rows = await analytics_rows(db, query, params, "date", post_id)
+
+    # Days are only listed if someone commented, filtered by author that
+    # is the one author
+    if author_id is not None:
+        unique = {day: 1 for day in rows}
+    else:
+        unique = await commenter_sketches.unique_commenters_per_day(
+            db, list(rows), post_id)
+    for day, row in rows.items():
+        row["unique_commenters"] = unique[day]
+    return rows
+
+
+async def get_daily_analytics(
+        db: AsyncSession,
+        date_from: date,
+        date_to: date,
+        offset: int,
+        limit: int,
+        sort_order: str,
+        post_id: Optional[int],
+        author_id: Optional[int]
+) -> list[dict]:
+    """
+    Daily analytics with the closed days served from the analytics cache,
+    only today and days missing from the cache are queried.
+    """
+    filters = (post_id, author_id)
+    today = utc_today()
+    rows = {}
 
-    query = (
-        select(
-            func.date(models.Comment.created_at).label("date"),
-            func.count(models.Comment.id).label("total_comments"),
-            func.sum(func.cast(models.Comment.is_blocked, Integer)).label(
-                "blocked_comments")
-        )
-        .where(
-            func.date(models.Comment.created_at).between(date_from, date_to)
-        ).group_by("date")
-        .order_by(order)
-    )
+    closed_to = min(date_to, today - timedelta(days=1))
+    if date_from <= closed_to:
+        rows, missing = analytics_cache.lookup(filters, date_from, closed_to)
+        if missing:
+            version = analytics_cache.version
+            loaded = await load_daily_analytics(db, missing[0], missing[-1],
+                                                post_id, author_id)
+            analytics_cache.store(filters, missing, loaded, version)
+            rows.update(loaded)
+
+    if date_to >= today:
+        rows.update(await load_daily_analytics(
+            db, max(date_from, today), date_to, post_id, author_id))
 
-    query = query.offset(offset).limit(limit)
+    days = sorted(rows, reverse=sort_order == "desc")
+    return [rows[day] for day in days[offset:offset + limit]]
+
+
+async def get_unique_commenters(
+        user: models.User,
+        db: AsyncSession,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        post_id: Optional[int] = None,
+) -> dict:
+    """
+    Estimated number of distinct commenters over a range of days,
+    optionally on one post.
+    """
+    if not user.is_superuser:
+        raise HTTPException(status_code=403,
+                            detail="Not authorized to view analytics")
 
-    result = await db.execute(query)
+    if date_from is None:
+        date_from = await first_comment_date(db) or date.today()
+    if date_to is None:
+        date_to = date.today()
 
-    stats = [
-        {
-            "date": row.date,
-            "total_comments": row.total_comments,
-            "blocked_comments": row.blocked_comments or 0
-        }
-        for row in result.fetchall()
-    ]
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="Invalid date range")
 
-    return stats
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "post_id": post_id,
+        "unique_commenters": await commenter_sketches.unique_commenters(
+            db, date_from, date_to, post_id),
+        "relative_error": commenter_sketches.RELATIVE_ERROR,
+    }
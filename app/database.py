@@ -1,22 +1,210 @@
-from typing import AsyncGenerator
+import asyncio
+import zlib
+from contextlib import asynccontextmanager
+from typing import (AsyncGenerator, AsyncIterator, Awaitable, Callable,
+                    Iterable, Optional, TypeVar)
 
 from dotenv import load_dotenv
 from fastapi import Depends
 from fastapi_users.db import SQLAlchemyUserDatabase
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, \
     async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from app.config import DATABASE_URL
+from sqlalchemy.schema import CreateIndex, CreateTable
+from app.config import DATABASE_URL, DATABASE_ECHO, \
+    DATABASE_QUERY_CACHE_SIZE, DATABASE_PREPARED_STATEMENT_CACHE_SIZE, \
+    COMMENT_SHARD_URLS
 
 load_dotenv()
 
 Base = declarative_base()
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+
+def engine_options(url: str) -> dict:
+    options = {
+        "echo": DATABASE_ECHO,
+        "query_cache_size": DATABASE_QUERY_CACHE_SIZE,
+    }
+    if (url.startswith("postgresql+asyncpg")
+            and "prepared_statement_cache_size" not in url):
+        options["connect_args"] = {
+            "prepared_statement_cache_size":
+                DATABASE_PREPARED_STATEMENT_CACHE_SIZE,
+        }
+    return options
+
+
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 async_session_maker = async_sessionmaker(
     bind=engine, class_=AsyncSession, expire_on_commit=False
 )
 
+T = TypeVar("T")
+
+# Tables kept on each comment shard, the rest stay in the main database
+COMMENT_SHARD_TABLES = (
+    "comments", "comments_archive", "auto_reply_queue", "moderation_queue",
+    "moderation_checkpoints", "comment_stats_hourly", "comment_stats_daily",
+    "commenter_sketches", "post_commenter_sketches",
+)
+# Comment ids are split into one range per shard, so an id tells which
+# shard holds the comment
+COMMENT_ID_SPACE = 2 ** 31 - 1
+
+# Start a shard's comment ids at the beginning of its range
+COMMENT_ID_STARTS = {
+    "postgresql": "SELECT setval('comments_id_seq', GREATEST(:start, "
+                  "(SELECT COALESCE(MAX(id), 0) + 1 FROM comments)), false)",
+    "sqlite": "INSERT INTO sqlite_sequence (name, seq) "
+              "SELECT 'comments', :start - 1 WHERE NOT EXISTS "
+              "(SELECT 1 FROM sqlite_sequence WHERE name = 'comments')",
+}
+
+shard_engines = [create_async_engine(url, **engine_options(url))
+                 for url in COMMENT_SHARD_URLS]
+comment_shards = [
+    async_sessionmaker(bind=shard_engine, class_=AsyncSession,
+                       expire_on_commit=False)
+    for shard_engine in shard_engines
+]
+
+
+def comment_shard(post_id: int) -> int:
+    """
+    Index of the shard holding the comments of the post.
+    """
+    if not comment_shards:
+        return 0
+    return zlib.crc32(str(post_id).encode()) % len(comment_shards)
+
+
+def shards_for(post_id: Optional[int]) -> Optional[list[int]]:
+    """
+    Shards to gather the comments of the post from, all when not given.
+    """
+    return None if post_id is None else [comment_shard(post_id)]
+
+
+def comment_id_range(shard: int) -> tuple[int, int]:
+    span = COMMENT_ID_SPACE // max(len(comment_shards), 1)
+    return shard * span + 1, (shard + 1) * span
+
+
+def comment_id_shard(comment_id: int) -> int:
+    """
+    Index of the shard that handed out the comment id.
+    """
+    if not comment_shards:
+        return 0
+    span = COMMENT_ID_SPACE // len(comment_shards)
+    return min(max((comment_id - 1) // span, 0), len(comment_shards) - 1)
+
+
+def comment_session_maker(post_id: int) -> async_sessionmaker:
+    """
+    Session maker of the database holding the comments of the post.
+    """
+    return comment_session_makers()[comment_shard(post_id)]
+
+
+def comment_session_makers() -> list[async_sessionmaker]:
+    """
+    Session makers of all databases holding comments, for background jobs.
+    """
+    return comment_shards or [async_session_maker]
+
+
+@asynccontextmanager
+async def shard_session(db: AsyncSession,
+                        shard: int) -> AsyncIterator[AsyncSession]:
+    """
+    A session on the comment shard, `db` itself when comments aren't
+    sharded.
+    """
+    if not comment_shards:
+        yield db
+        return
+    async with comment_shards[shard]() as session:
+        yield session
+
+
+def comment_session(db: AsyncSession, post_id: int):
+    """
+    A session for the comments of the post, see shard_session.
+    """
+    return shard_session(db, comment_shard(post_id))
+
+
+def comment_id_session(db: AsyncSession, comment_id: int):
+    """
+    A session for the comment with the id, see shard_session.
+    """
+    return shard_session(db, comment_id_shard(comment_id))
+
+
+async def gather_shards(
+        db: AsyncSession,
+        query: Callable[[AsyncSession, int], Awaitable[T]],
+        shards: Optional[Iterable[int]] = None
+) -> list[T]:
+    """
+    Runs `query(session, shard)` on the comment `shards` (all of them by
+    default) concurrently, returns the results in shard order.
+    """
+    if shards is None:
+        shards = range(len(comment_session_makers()))
+
+    async def run(shard: int) -> T:
+        async with shard_session(db, shard) as session:
+            return await query(session, shard)
+
+    return list(await asyncio.gather(*(run(shard) for shard in shards)))
+
+
+def create_shard_tables(connection) -> None:
+    for name in COMMENT_SHARD_TABLES:
+        table = Base.metadata.tables[name]
+        # Foreign keys to the main database's tables can't be enforced
+        connection.execute(CreateTable(
+            table, if_not_exists=True,
+            include_foreign_key_constraints=[
+                constraint for constraint in table.foreign_key_constraints
+                if constraint.referred_table.name in COMMENT_SHARD_TABLES
+            ],
+        ))
+        for index in table.indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+async def create_comment_shards() -> None:
+    """
+    Creates the missing comment tables on every shard and starts the
+    shard's comment ids at its range.
+    """
+    for shard, shard_engine in enumerate(shard_engines):
+        async with shard_engine.begin() as connection:
+            await connection.run_sync(create_shard_tables)
+            await connection.execute(
+                text(COMMENT_ID_STARTS[connection.dialect.name]),
+                {"start": comment_id_range(shard)[0]},
+            )
+
+
+# INSERTs with ON CONFLICT clauses for the supported databases
+UPSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def upsert(db, table):
+    """
+    INSERT ... ON CONFLICT for the database of a (sync or async) session.
+    """
+    return UPSERTS[db.get_bind().dialect.name](table)
+
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
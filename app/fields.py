@@ -0,0 +1,66 @@
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Query
+from pydantic import BaseModel
+
+from app.config import BATCH_MAX_IDS
+
+
+def sparse_fields(
+        schema: type[BaseModel]
+) -> Callable[[Optional[str]], Optional[list[str]]]:
+    """
+    Builds a dependency parsing the `fields=` query parameter, a comma
+    separated list of the schema's fields to return.
+    """
+    allowed = tuple(schema.model_fields)
+
+    def parse_fields(
+            fields: Optional[str] = Query(
+                None,
+                description="Comma separated fields to return, "
+                            f"any of: {', '.join(allowed)}",
+            )
+    ) -> Optional[list[str]]:
+        if fields is None:
+            return None
+
+        requested = list(dict.fromkeys(
+            field.strip() for field in fields.split(",") if field.strip()
+        ))
+        unknown = [field for field in requested if field not in allowed]
+        if unknown or not requested:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid fields: {', '.join(unknown) or fields!r}"
+            )
+        return requested
+
+    return parse_fields
+
+
+def batch_ids(
+        ids: Optional[str] = Query(
+            None,
+            description="Comma separated ids to fetch in one request, "
+                        f"at most {BATCH_MAX_IDS}",
+        )
+) -> Optional[list[int]]:
+    """
+    Parses the `ids=` query parameter of the batch endpoints.
+    """
+    if ids is None:
+        return None
+
+    try:
+        requested = list(dict.fromkeys(
+            int(item) for item in ids.split(",") if item.strip()
+        ))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid ids: {ids!r}")
+    if not requested or len(requested) > BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Expected 1 to {BATCH_MAX_IDS} ids, got {len(requested)}"
+        )
+    return requested
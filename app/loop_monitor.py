@@ -0,0 +1,89 @@
+"""
+Event loop lag monitor.
+
+A task sleeps LOOP_LAG_INTERVAL seconds at a time and records how much
+later than that it woke up in event_loop_lag_seconds. That delay is time
+the loop spent running something else, usually blocking code in a
+coroutine such as a synchronous model or database call.
+
+Once the loop wakes up the blocking call is over, so a watchdog thread
+checks the task's heartbeat instead. When the loop has been stuck for more
+than LOOP_LAG_THRESHOLD seconds it logs the stack the loop's thread is
+executing, which is the blocking call while it still runs.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from app import metrics
+from app.config import LOOP_LAG_INTERVAL, LOOP_LAG_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL,
+                 threshold: float = LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        # Stack of the latest stall, for inspection
+        self.last_stack: Optional[str] = None
+
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = threading.Event()
+
+    async def measure(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            metrics.event_loop_lag.observe(
+                max(loop.time() - started - self.interval, 0.0))
+
+    def watch(self, stopped: threading.Event) -> None:
+        """
+        Runs in the watchdog thread, reports each stall once.
+        """
+        reported = None
+        while not stopped.wait(self.interval):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.threshold or heartbeat == reported:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            reported = heartbeat
+            self.last_stack = "".join(traceback.format_stack(frame))
+            metrics.event_loop_stalls.inc()
+            logger.warning("Event loop blocked for %.3fs so far in:\n%s",
+                           blocked, self.last_stack)
+
+    def start(self) -> None:
+        """
+        Starts monitoring the running loop, unless the interval is 0.
+        """
+        if self.interval <= 0:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped = threading.Event()
+        self._task = asyncio.create_task(self.measure())
+        threading.Thread(target=self.watch, args=(self._stopped,),
+                         name="loop-lag-watchdog", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+loop_monitor = LoopLagMonitor()
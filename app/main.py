@@ -1,10 +1,68 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from app.ai.auto_reply import deferred_reply_worker
+from app.ai.providers import get_backend
+from app.ai.remoderation import remoderation_worker
 from app.auth.auth import auth_backend
 from app.auth.manager import fastapi_users
+from app.auth.passwords import shutdown_hasher
 from app.auth.schemas import UserRead, UserCreate
-from app.routers import post, comment, analytics
+from app.comment_stats import prune_worker
+from app.database import engine, shard_engines
+from app.loop_monitor import loop_monitor
+from app.middleware import MetricsMiddleware, instrument_engine
+from app.routers import post, comment, analytics, metrics
+from app.trending import renormalization_worker
+from app.view_counter import view_counter, view_flush_worker
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up_ai_backend() -> None:
+    """
+    Builds the AI backend in a worker thread, so neither startup nor the
+    first request waits for the SDK import.
+    """
+    try:
+        await asyncio.to_thread(get_backend)
+    except Exception:
+        logger.exception("Failed to initialize the AI backend")
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_monitor.start()
+    tasks = [
+        asyncio.create_task(warm_up_ai_backend()),
+        asyncio.create_task(remoderation_worker()),
+        asyncio.create_task(deferred_reply_worker()),
+        asyncio.create_task(renormalization_worker()),
+        asyncio.create_task(view_flush_worker()),
+        asyncio.create_task(prune_worker()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+    # Wait for the workers to unwind, so none still uses the database or
+    # the pools during the final flush and the shutdown
+    await asyncio.gather(*tasks, return_exceptions=True)
+    loop_monitor.stop()
+    try:
+        await view_counter.flush()
+    except Exception:
+        logger.exception("Flushing post views on shutdown failed")
+    shutdown_hasher()
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+for shard_engine in shard_engines:
+    instrument_engine(shard_engine)
 
 
 app.include_router(
@@ -24,3 +82,5 @@ app.include_router(post.router, tags=["posts"])
 app.include_router(comment.router, tags=["comments"])
 
 app.include_router(analytics.router, tags=["analytics"])
+
+app.include_router(metrics.router, tags=["metrics"])
@@ -0,0 +1,284 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{str(value)}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str,
+                 labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = (
+                self._values.get(label_values, 0) + amount
+            )
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, *label_values) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str,
+                 labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: dict[tuple, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = [0] * (len(self.buckets) + 2)
+                self._values[label_values] = series
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *label_values) -> int:
+        series = self._values.get(label_values)
+        return int(sum(series[:-1])) if series else 0
+
+    def sum(self, *label_values) -> float:
+        series = self._values.get(label_values)
+        return series[-1] if series else 0.0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._values.items()):
+                cumulative = 0
+                bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+                for bound, bucket_count in zip(bounds, series[:-1]):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labels + ("le",),
+                                            label_values + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {series[-1]}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.register(Counter(
+    "http_requests_total",
+    "Handled requests by route and status code.",
+    ("method", "route", "status"),
+))
+http_request_duration = REGISTRY.register(Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request.",
+    ("method", "route"),
+))
+db_statements = REGISTRY.register(Counter(
+    "db_statements_total",
+    "SQL statements executed by route.",
+    ("route",),
+))
+db_statement_duration = REGISTRY.register(Histogram(
+    "db_statement_duration_seconds",
+    "Time spent executing a single SQL statement.",
+    ("route",),
+))
+db_statements_per_request = REGISTRY.register(Histogram(
+    "db_statements_per_request",
+    "Number of SQL statements a request executed.",
+    ("route",),
+    buckets=COUNT_BUCKETS,
+))
+ai_calls = REGISTRY.register(Counter(
+    "ai_calls_total",
+    "Model calls by kind (moderation or auto_reply).",
+    ("kind",),
+))
+ai_call_errors = REGISTRY.register(Counter(
+    "ai_call_errors_total",
+    "Model calls that raised an error, by kind.",
+    ("kind",),
+))
+ai_call_duration = REGISTRY.register(Histogram(
+    "ai_call_duration_seconds",
+    "Time spent waiting for the model, by kind.",
+    ("kind",),
+))
+moderation_circuit_open = REGISTRY.register(Gauge(
+    "moderation_circuit_open",
+    "1 while the moderation circuit breaker is open or half-open.",
+))
+moderation_fallbacks = REGISTRY.register(Counter(
+    "moderation_fallbacks_total",
+    "Texts decided without the model and queued for re-moderation, "
+    "by reason.",
+    ("reason",),
+))
+auto_reply_queue_depth = REGISTRY.register(Gauge(
+    "auto_reply_queue_depth",
+    "Comments admitted by the auto-reply scheduler and not replied to yet.",
+))
+auto_reply_in_flight = REGISTRY.register(Gauge(
+    "auto_reply_in_flight",
+    "Auto-reply batches being generated and written.",
+))
+auto_reply_deferred = REGISTRY.register(Gauge(
+    "auto_reply_deferred",
+    "Deferred auto-replies stored in the database, as of the last run "
+    "of the deferred reply worker.",
+))
+auto_reply_overflows = REGISTRY.register(Counter(
+    "auto_reply_overflows_total",
+    "Comments turned away by the auto-reply scheduler, by overflow policy "
+    "and the limit that was hit.",
+    ("policy", "limit"),
+))
+post_cache_lookups = REGISTRY.register(Counter(
+    "post_cache_lookups_total",
+    "Post metadata cache lookups by result (hit or miss).",
+    ("result",),
+))
+pubsub_subscribers = REGISTRY.register(Gauge(
+    "pubsub_subscribers",
+    "Open comment event subscriptions in this worker.",
+))
+pubsub_published = REGISTRY.register(Counter(
+    "pubsub_published_total",
+    "Comment events published, by event.",
+    ("event",),
+))
+pubsub_dropped = REGISTRY.register(Counter(
+    "pubsub_dropped_total",
+    "Events dropped because a subscriber fell behind.",
+))
+post_views_pending = REGISTRY.register(Gauge(
+    "post_views_pending",
+    "Post views counted in memory and not written to the database yet.",
+))
+post_view_flushes = REGISTRY.register(Counter(
+    "post_view_flushes_total",
+    "Batches of post views written to the database.",
+))
+analytics_cache_lookups = REGISTRY.register(Counter(
+    "analytics_cache_lookups_total",
+    "Days of the daily analytics looked up in the cache, by result.",
+    ("result",),
+))
+event_loop_lag = REGISTRY.register(Histogram(
+    "event_loop_lag_seconds",
+    "How much later than scheduled the event loop ran the lag monitor.",
+))
+event_loop_stalls = REGISTRY.register(Counter(
+    "event_loop_stalls_total",
+    "Times code blocked the event loop for longer than "
+    "LOOP_LAG_THRESHOLD, each one logged with its stack.",
+))
+
+
+class RequestStats:
+    """
+    Work done while handling one request, reported in Server-Timing.
+    """
+    __slots__ = ("scope", "db_count", "db_time", "ai_count", "ai_time")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.db_count = 0
+        self.db_time = 0.0
+        self.ai_count = 0
+        self.ai_time = 0.0
+
+    @property
+    def route(self) -> str:
+        """
+        Path template of the matched route, the router fills it in.
+        """
+        route = self.scope.get("route")
+        return getattr(route, "path", "unmatched")
+
+
+# Set by the metrics middleware for the request being handled
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+
+
+@contextmanager
+def track_ai_call(kind: str) -> Iterator[None]:
+    """
+    Times a model call and counts it as failed if it raises.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        ai_call_errors.inc(kind)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        ai_calls.inc(kind)
+        ai_call_duration.observe(elapsed, kind)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.ai_count += 1
+            stats.ai_time += elapsed
@@ -0,0 +1,105 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import metrics
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Counts and times every SQL statement the engine executes, attributing
+    it to the request being handled.
+    """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context,
+                             executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        stats = metrics.request_stats.get()
+        route = stats.route if stats is not None else "background"
+
+        metrics.db_statements.inc(route)
+        metrics.db_statement_duration.observe(elapsed, route)
+        if stats is not None:
+            stats.db_count += 1
+            stats.db_time += elapsed
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        # Failed statements never reach after_cursor_execute
+        connection = context.connection
+        if connection is not None and connection.info.get("query_started"):
+            connection.info["query_started"].pop()
+
+
+def server_timing(stats: metrics.RequestStats, total: float) -> str:
+    return (f"total;dur={total * 1000:.1f}, "
+            f"db;dur={stats.db_time * 1000:.1f};desc=\"{stats.db_count} "
+            f"queries\", "
+            f"ai;dur={stats.ai_time * 1000:.1f};desc=\"{stats.ai_count} "
+            f"calls\"")
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL and model call metrics per route and reports
+    them to the client in a Server-Timing header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = metrics.RequestStats(scope)
+        token = metrics.request_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+        recorded = False
+
+        def record() -> None:
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            elapsed = time.perf_counter() - started
+            route = stats.route
+            method = scope["method"]
+            metrics.http_requests.inc(method, route, status)
+            metrics.http_request_duration.observe(elapsed, method, route)
+            metrics.db_statements_per_request.observe(stats.db_count, route)
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                elapsed = time.perf_counter() - started
+                headers.append((b"server-timing",
+                                server_timing(stats, elapsed).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+            if (message["type"] == "http.response.body"
+                    and not message.get("more_body", False)):
+                # The response is sent, background tasks run after it and
+                # their statements are attributed to "background"
+                record()
+                metrics.request_stats.set(None)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            record()
+            metrics.request_stats.reset(token)
@@ -1,12 +1,29 @@
-from datetime import datetime
+from datetime import date, datetime
+from typing import Optional
 
 from fastapi_users_db_sqlalchemy import SQLAlchemyBaseUserTable
 from sqlalchemy import (Column, String, Text, DateTime, Integer, ForeignKey,
-                        Boolean)
+                        Boolean, UniqueConstraint, Float, Date, Index)
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import false
 
 from app.database import Base
 
+CONTENT_PREVIEW_LENGTH = 200
+
+
+def make_preview(content: Optional[str]) -> Optional[str]:
+    """
+    Excerpt of the content shown in list views instead of the full body.
+    """
+    if content is None or len(content) <= CONTENT_PREVIEW_LENGTH:
+        return content
+    return content[:CONTENT_PREVIEW_LENGTH - 1] + "…"
+
+
+def preview_default(context) -> Optional[str]:
+    return make_preview(context.get_current_parameters().get("content"))
+
 
 class User(SQLAlchemyBaseUserTable[int], Base):
     __tablename__ = "users"
@@ -26,6 +43,9 @@ class Post(Base):
     id: int = Column(Integer, primary_key=True, index=True)
     title: str = Column(String, index=True)
     content: str = Column(Text)
+    # Filled in on insert, kept in sync with content by the crud updates
+    content_preview: str = Column(String(CONTENT_PREVIEW_LENGTH),
+                                  default=preview_default)
     created_at: datetime = Column(DateTime, default=datetime.utcnow)
     is_blocked: bool = Column(Boolean, default=False)
     owner_id: int = Column(ForeignKey("users.id"), index=True)
@@ -33,19 +53,173 @@ class Post(Base):
     auto_reply: bool = Column(Boolean, default=False)
     auto_reply_delay: int = Column(Integer, default=0)
 
+    # Written in batches by app.view_counter, lags the actual views by up
+    # to VIEW_FLUSH_INTERVAL
+    view_count: int = Column(Integer, default=0, server_default="0",
+                             nullable=False)
+    # Set by app.archive once comments of the post may be in the archive
+    comments_archived: bool = Column(Boolean, default=False,
+                                     server_default=false(), nullable=False)
+
+    # SHA-256 of the moderated text and the moderation version that gave
+    # is_blocked, a NULL version means the verdict still has to be checked
+    moderation_fingerprint: str = Column(String(64), nullable=True)
+    moderation_version: str = Column(String, nullable=True)
+
     owner = relationship("User", back_populates="posts")
     comments = relationship("Comment", back_populates="post")
 
 
 class Comment(Base):
     __tablename__ = "comments"
+    # Lets comment shards on SQLite start their ids at their own range
+    __table_args__ = {"sqlite_autoincrement": True}
     id: int = Column(Integer, primary_key=True, index=True)
     content: str = Column(Text)
+    content_preview: str = Column(String(CONTENT_PREVIEW_LENGTH),
+                                  default=preview_default)
     created_at: datetime = Column(DateTime, default=datetime.utcnow)
     is_blocked: bool = Column(Boolean, default=False)
     post_id: int = Column(ForeignKey("posts.id"), index=True)
     author_id: int = Column(ForeignKey("users.id"), index=True)
     parent_id = Column(Integer, ForeignKey("comments.id"), nullable=True)
 
+    moderation_fingerprint: str = Column(String(64), nullable=True)
+    moderation_version: str = Column(String, nullable=True)
+
     post = relationship("Post", back_populates="comments")
     author = relationship("User", back_populates="comments")
+
+
+class ArchivedComment(Base):
+    """
+    Comment moved out of the comments table by app.archive, read-only.
+    """
+    __tablename__ = "comments_archive"
+    id: int = Column(Integer, primary_key=True)
+    content: str = Column(Text)
+    content_preview: str = Column(String(CONTENT_PREVIEW_LENGTH))
+    created_at: datetime = Column(DateTime)
+    is_blocked: bool = Column(Boolean, default=False)
+    post_id: int = Column(Integer, index=True)
+    author_id: int = Column(Integer)
+    parent_id = Column(Integer, nullable=True)
+    moderation_fingerprint: str = Column(String(64), nullable=True)
+    moderation_version: str = Column(String, nullable=True)
+    archived_at: datetime = Column(DateTime, default=datetime.utcnow)
+
+
+class ModerationQueue(Base):
+    """
+    Posts and comments whose verdict was made without the model and
+    still have to be re-moderated.
+    """
+    __tablename__ = "moderation_queue"
+    id: int = Column(Integer, primary_key=True)
+    target_type: str = Column(String, nullable=False)  # "post" or "comment"
+    target_id: int = Column(Integer, nullable=False)
+    enqueued_at: datetime = Column(DateTime, default=datetime.utcnow,
+                                   index=True)
+
+
+class ModerationCheckpoint(Base):
+    """
+    Progress of a bulk re-moderation job over one table.
+    """
+    __tablename__ = "moderation_checkpoints"
+    __table_args__ = (UniqueConstraint("job", "target_type"),)
+    id: int = Column(Integer, primary_key=True)
+    job: str = Column(String, nullable=False)
+    target_type: str = Column(String, nullable=False)  # "post" or "comment"
+    last_id: int = Column(Integer, default=0, nullable=False)
+    processed: int = Column(Integer, default=0, nullable=False)
+    updated_at: datetime = Column(DateTime, default=datetime.utcnow,
+                                  onupdate=datetime.utcnow)
+
+
+class AutoReplyQueue(Base):
+    """
+    Comments whose auto-reply was deferred because the scheduler was full.
+    """
+    __tablename__ = "auto_reply_queue"
+    id: int = Column(Integer, primary_key=True)
+    comment_id: int = Column(ForeignKey("comments.id", ondelete="CASCADE"),
+                             nullable=False)
+    enqueued_at: datetime = Column(DateTime, default=datetime.utcnow)
+
+
+class PostScore(Base):
+    """
+    Trending score of a post: its comments, each weighted by
+    exp(rate * (commented_at - epoch)) with the epoch of ScoreEpoch. All
+    scores share the epoch, so they rank like the decayed scores.
+    """
+    __tablename__ = "post_scores"
+    post_id: int = Column(ForeignKey("posts.id", ondelete="CASCADE"),
+                          primary_key=True)
+    score: float = Column(Float, nullable=False, default=0.0, index=True)
+
+
+class ScoreEpoch(Base):
+    """
+    Reference time of a score table, moved forward by renormalization.
+    """
+    __tablename__ = "score_epochs"
+    name: str = Column(String, primary_key=True)
+    epoch: datetime = Column(DateTime, nullable=False)
+
+
+class CommentStatsHourly(Base):
+    """
+    Comment counts per hour, post and author, kept up to date by
+    app.comment_stats on every comment write.
+    """
+    __tablename__ = "comment_stats_hourly"
+    __table_args__ = (
+        Index("ix_comment_stats_hourly_post", "post_id", "bucket"),
+        Index("ix_comment_stats_hourly_author", "author_id", "bucket"),
+    )
+    bucket: datetime = Column(DateTime, primary_key=True)
+    post_id: int = Column(Integer, primary_key=True)
+    author_id: int = Column(Integer, primary_key=True)
+    total_comments: int = Column(Integer, nullable=False, default=0)
+    blocked_comments: int = Column(Integer, nullable=False, default=0)
+
+
+class CommentStatsDaily(Base):
+    """
+    CommentStatsHourly rolled up to days, kept after the hourly buckets
+    are pruned.
+    """
+    __tablename__ = "comment_stats_daily"
+    __table_args__ = (
+        Index("ix_comment_stats_daily_post", "post_id", "day"),
+        Index("ix_comment_stats_daily_author", "author_id", "day"),
+    )
+    day: date = Column(Date, primary_key=True)
+    post_id: int = Column(Integer, primary_key=True)
+    author_id: int = Column(Integer, primary_key=True)
+    total_comments: int = Column(Integer, nullable=False, default=0)
+    blocked_comments: int = Column(Integer, nullable=False, default=0)
+
+
+class CommenterSketch(Base):
+    """
+    HyperLogLog registers of the authors who commented on a day, one row
+    per register that was hit, see app.commenter_sketches.
+    """
+    __tablename__ = "commenter_sketches"
+    day: date = Column(Date, primary_key=True)
+    register: int = Column(Integer, primary_key=True)
+    rank: int = Column(Integer, nullable=False)
+
+
+class PostCommenterSketch(Base):
+    """
+    CommenterSketch of the comments on one post.
+    """
+    __tablename__ = "post_commenter_sketches"
+    post_id: int = Column(Integer, primary_key=True)
+    day: date = Column(Date, primary_key=True)
+    register: int = Column(Integer, primary_key=True)
+    rank: int = Column(Integer, nullable=False)
@@ -0,0 +1,126 @@
+"""
+In-process cache of the post metadata the comment endpoints check on every
+request, so they don't have to select the post first.
+
+Entries are invalidated after a commit that changed or deleted the post,
+by a session hook for ORM writes and explicitly by the paths that write
+posts with bulk statements. Each invalidation bumps the cache version,
+and a loaded record is only stored if the version didn't change while it
+was being read, so a read racing a write can't put stale metadata back.
+"""
+import time
+from itertools import chain
+from typing import Optional
+
+from sqlalchemy import bindparam, event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import metrics, models
+from app.config import POST_CACHE_SIZE, POST_CACHE_TTL
+
+
+class PostMeta:
+    """
+    The columns of a post needed to accept, list and auto-reply to
+    comments.
+    """
+    __slots__ = ("id", "owner_id", "is_blocked", "auto_reply",
+                 "auto_reply_delay", "comments_archived", "version",
+                 "loaded_at")
+
+    def __init__(self, id: int, owner_id: int, is_blocked: bool,
+                 auto_reply: bool, auto_reply_delay: int,
+                 comments_archived: bool = False,
+                 version: int = 0, loaded_at: float = 0.0):
+        self.id = id
+        self.owner_id = owner_id
+        self.is_blocked = is_blocked
+        self.auto_reply = auto_reply
+        self.auto_reply_delay = auto_reply_delay
+        self.comments_archived = comments_archived
+        self.version = version
+        self.loaded_at = loaded_at
+
+
+POST_META = select(
+    models.Post.id,
+    models.Post.owner_id,
+    models.Post.is_blocked,
+    models.Post.auto_reply,
+    models.Post.auto_reply_delay,
+    models.Post.comments_archived,
+).where(models.Post.id == bindparam("post_id"))
+
+
+class PostMetaCache:
+    def __init__(self, max_size: int = POST_CACHE_SIZE,
+                 ttl: float = POST_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = 0
+        self._entries: dict[int, PostMeta] = {}
+
+    def get(self, post_id: int) -> Optional[PostMeta]:
+        meta = self._entries.get(post_id)
+        if meta is not None and time.monotonic() - meta.loaded_at > self.ttl:
+            del self._entries[post_id]
+            meta = None
+        metrics.post_cache_lookups.inc("hit" if meta else "miss")
+        return meta
+
+    async def load(self, db: AsyncSession, post_id: int) -> Optional[PostMeta]:
+        """
+        Returns the post's metadata from the cache or the database, None if
+        the post doesn't exist.
+        """
+        meta = self.get(post_id)
+        if meta is not None:
+            return meta
+
+        version = self.version
+        row = (await db.execute(POST_META, {"post_id": post_id})).first()
+        if row is None:
+            return None
+
+        meta = PostMeta(*row, version=version, loaded_at=time.monotonic())
+        if self.version == version:
+            if len(self._entries) >= self.max_size:
+                # Dicts keep insertion order, drop the oldest entry
+                del self._entries[next(iter(self._entries))]
+            self._entries[post_id] = meta
+        return meta
+
+    def invalidate(self, post_id: int) -> None:
+        """
+        Called by the post write paths once their change is committed.
+        """
+        self.version += 1
+        self._entries.pop(post_id, None)
+
+    def clear(self) -> None:
+        self.version += 1
+        self._entries.clear()
+
+
+post_cache = PostMetaCache()
+
+
+@event.listens_for(Session, "after_flush")
+def collect_changed_posts(session: Session, flush_context) -> None:
+    changed = session.info.setdefault("changed_posts", set())
+    changed.update(
+        target.id for target in chain(session.dirty, session.deleted)
+        if isinstance(target, models.Post)
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_changed_posts(session: Session) -> None:
+    for post_id in session.info.pop("changed_posts", ()):
+        post_cache.invalidate(post_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_changed_posts(session: Session) -> None:
+    session.info.pop("changed_posts", None)
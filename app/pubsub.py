@@ -0,0 +1,131 @@
+"""
+Publish/subscribe hub for comment events.
+
+The crud write paths and auto-replies publish to a channel per post and
+the subscription endpoint streams them to clients. The broker is
+pluggable: LocalBroker delivers to subscribers of the same worker, a
+multi-worker deployment plugs in a broker backed by a shared message bus
+with set_broker() and keeps the same interface.
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from app import metrics, schemas
+from app.config import PUBSUB_BACKEND, PUBSUB_QUEUE_SIZE
+
+
+def post_channel(post_id: int) -> str:
+    return f"post:{post_id}"
+
+
+class Subscription:
+    """
+    Messages published to a channel since subscribing, in order.
+    """
+    __slots__ = ("broker", "channel", "queue")
+
+    def __init__(self, broker: "Broker", channel: str, queue_size: int):
+        self.broker = broker
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def deliver(self, message: dict) -> None:
+        """
+        Queues a message without blocking the publisher. A subscriber that
+        fell behind loses its oldest messages.
+        """
+        if self.queue.full():
+            self.queue.get_nowait()
+            metrics.pubsub_dropped.inc()
+        self.queue.put_nowait(message)
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class Broker(ABC):
+    @abstractmethod
+    async def publish(self, channel: str, message: dict) -> None:
+        """Sends the message to every subscriber of the channel."""
+
+    @abstractmethod
+    def subscribe(self, channel: str) -> Subscription:
+        """Starts receiving the channel's messages."""
+
+    @abstractmethod
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Stops a subscription, closing it twice is harmless."""
+
+
+class LocalBroker(Broker):
+    """
+    In-process broker, subscribers only see messages published by the
+    same worker.
+    """
+
+    def __init__(self, queue_size: int = PUBSUB_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscriptions: dict[str, set[Subscription]] = {}
+
+    async def publish(self, channel: str, message: dict) -> None:
+        for subscription in self._subscriptions.get(channel, ()):
+            subscription.deliver(message)
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(self, channel, self.queue_size)
+        self._subscriptions.setdefault(channel, set()).add(subscription)
+        metrics.pubsub_subscribers.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.channel)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.channel]
+        metrics.pubsub_subscribers.inc(amount=-1)
+
+
+def create_broker(name: str = PUBSUB_BACKEND) -> Broker:
+    if name == "local":
+        return LocalBroker()
+    raise ValueError(f"Unknown pub/sub backend: {name}")
+
+
+_broker: Optional[Broker] = None
+
+
+def get_broker() -> Broker:
+    global _broker
+    if _broker is None:
+        _broker = create_broker()
+    return _broker
+
+
+def set_broker(broker: Broker) -> None:
+    """
+    Replaces the broker, e.g. with one shared by several workers.
+    """
+    global _broker
+    _broker = broker
+
+
+async def publish_comment_event(event: str, comment) -> None:
+    """
+    Publishes a comment_created, comment_updated or comment_deleted event
+    to the comment's post channel. `comment` is a Comment or a row with
+    the same columns, it is sent as CommentRead.
+    """
+    data = schemas.CommentRead.model_validate(
+        comment, from_attributes=True
+    ).model_dump(mode="json")
+    metrics.pubsub_published.inc(event)
+    await get_broker().publish(
+        post_channel(data["post_id"]),
+        {"event": event, "comment": data},
+    )
@@ -2,11 +2,12 @@ from datetime import date
 from typing import Optional, Literal
 
 from fastapi import APIRouter, Depends
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import schemas, models
 from app.auth.manager import current_user
-from app.crud import get_comment_analytics
+from app.crud import get_comment_analytics, get_unique_commenters
 from app.database import get_db
 
 router = APIRouter()
@@ -20,14 +21,69 @@ async def get_comment_analytics_endpoint(
         offset: Optional[int] = 0,
         limit: Optional[int] = 10,
         sort_order: Literal["asc", "desc"] = "desc",
+        post_id: Optional[int] = None,
+        author_id: Optional[int] = None,
         db: AsyncSession = Depends(get_db),
         user: models.User = Depends(current_user),
-) -> list[dict]:
-    return await get_comment_analytics(
+) -> ORJSONResponse:
+    return ORJSONResponse(await get_comment_analytics(
         date_from=date_from,
         date_to=date_to,
         db=db, user=user,
         sort_order=sort_order,
         limit=limit,
-        offset=offset
-    )
+        offset=offset,
+        post_id=post_id,
+        author_id=author_id
+    ))
+
+
+@router.get("/comments-hourly-breakdown/",
+            response_model=list[schemas.CommentHourlyAnalytics])
+async def get_comment_hourly_analytics_endpoint(
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        offset: Optional[int] = 0,
+        limit: Optional[int] = 24,
+        sort_order: Literal["asc", "desc"] = "desc",
+        post_id: Optional[int] = None,
+        author_id: Optional[int] = None,
+        db: AsyncSession = Depends(get_db),
+        user: models.User = Depends(current_user),
+) -> ORJSONResponse:
+    """
+    Comment counts per hour. Hours older than the retention of the hourly
+    buckets are not available.
+    """
+    return ORJSONResponse(await get_comment_analytics(
+        date_from=date_from,
+        date_to=date_to,
+        db=db, user=user,
+        sort_order=sort_order,
+        limit=limit,
+        offset=offset,
+        granularity="hour",
+        post_id=post_id,
+        author_id=author_id
+    ))
+
+
+@router.get("/comments-unique-commenters/",
+            response_model=schemas.UniqueCommenters)
+async def get_unique_commenters_endpoint(
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        post_id: Optional[int] = None,
+        db: AsyncSession = Depends(get_db),
+        user: models.User = Depends(current_user),
+) -> ORJSONResponse:
+    """
+    Estimated distinct commenters over the date range, within about 3% in
+    95% of cases.
+    """
+    return ORJSONResponse(await get_unique_commenters(
+        date_from=date_from,
+        date_to=date_to,
+        post_id=post_id,
+        db=db, user=user
+    ))
@@ -1,19 +1,27 @@
-from typing import Optional, Literal
+import asyncio
+from typing import AsyncIterator, Optional, Literal
 
-from fastapi import APIRouter, Depends, BackgroundTasks
+import orjson
+from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import models, schemas
 from app.auth.manager import current_user
+from app.config import SSE_KEEPALIVE_INTERVAL
 from app.crud import create_comment, update_comment, delete_comment, \
-    get_comments, get_comment
+    get_comments, get_comment, get_comments_by_ids
 from app.database import get_db
+from app.fields import batch_ids, sparse_fields
+from app.post_cache import post_cache
+from app.pubsub import Subscription, get_broker, post_channel
 
 router = APIRouter()
 
 
 @router.get("/posts/{post_id}/comments/",
-            response_model=list[schemas.CommentRead])
+            response_model=list[schemas.CommentFields],
+            response_model_exclude_unset=True)
 async def get_comments_endpoint(
     post_id: int,
     db: AsyncSession = Depends(get_db),
@@ -21,19 +29,106 @@ async def get_comments_endpoint(
     offset: int = 0,
     limit: int = 10,
     sort_by: Literal["created_at", "author_id"] = None,
-    sort_order: Literal["asc", "desc"] = "asc"
-) -> list[models.Comment]:
-    return await get_comments(
+    sort_order: Literal["asc", "desc"] = "asc",
+    fields: Optional[list[str]] = Depends(
+        sparse_fields(schemas.CommentFields)),
+) -> ORJSONResponse:
+    comments = await get_comments(
         post_id=post_id,
         db=db,
         offset=offset,
         limit=limit,
         sort_by=sort_by,
         sort_order=sort_order,
-        user=user
+        user=user,
+        fields=fields
+    )
+    # Rows are already shaped like the response model, skip re-validating
+    return ORJSONResponse(comments)
+
+
+async def comment_event_stream(
+        subscription: Subscription,
+        show_blocked: bool,
+        keepalive: float = SSE_KEEPALIVE_INTERVAL
+) -> AsyncIterator[str]:
+    """
+    Formats the subscription's comment events as server-sent events.
+
+    Readers who can't see blocked comments don't get them, and a comment
+    blocked by an edit is sent to them as deleted.
+    """
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(),
+                                                 keepalive)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+
+            event, comment = message["event"], message["comment"]
+            if comment["is_blocked"] and not show_blocked:
+                if event == "comment_created":
+                    continue
+                event = "comment_deleted"
+            if event == "comment_deleted":
+                comment = {"id": comment["id"], "post_id": comment["post_id"]}
+            data = orjson.dumps(comment).decode()
+            yield f"event: {event}\ndata: {data}\n\n"
+    finally:
+        subscription.close()
+
+
+@router.get("/posts/{post_id}/comments/stream")
+async def stream_comments_endpoint(
+    post_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: models.User = Depends(current_user)
+) -> StreamingResponse:
+    """
+    Streams the post's new, edited and deleted comments as server-sent
+    events (comment_created, comment_updated, comment_deleted).
+    """
+    post = await post_cache.load(db, post_id)
+
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    if post.is_blocked:
+        raise HTTPException(status_code=403, detail="Post is blocked")
+
+    # Subscribe before responding so no event is missed in between
+    subscription = get_broker().subscribe(post_channel(post_id))
+    return StreamingResponse(
+        comment_event_stream(subscription, user.is_superuser),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+@router.get("/comments/", response_model=list[schemas.CommentFields],
+            response_model_exclude_unset=True)
+async def get_comments_by_ids_endpoint(
+    ids: list[int] = Depends(batch_ids),
+    db: AsyncSession = Depends(get_db),
+    user: models.User = Depends(current_user),
+    fields: Optional[list[str]] = Depends(
+        sparse_fields(schemas.CommentFields)),
+) -> ORJSONResponse:
+    """
+    Fetches the comments given by `ids=`, e.g. the parents of a page of
+    replies, in one request.
+    """
+    if ids is None:
+        raise HTTPException(status_code=400, detail="ids are required")
+
+    comments = await get_comments_by_ids(ids=ids, db=db, user=user,
+                                         fields=fields)
+    return ORJSONResponse(comments)
+
+
 @router.get("/comments/{comment_id}/", response_model=schemas.CommentRead)
 async def get_comment_endpoint(
     comment_id: int,
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.metrics import REGISTRY
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse,
+            include_in_schema=False)
+async def metrics_endpoint() -> str:
+    """
+    Exposes the collected metrics in the Prometheus text format.
+    """
+    return REGISTRY.render()
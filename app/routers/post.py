@@ -1,17 +1,23 @@
-from typing import Literal
+from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import models, schemas
 from app.auth.manager import current_user
+from app.config import EMBEDDED_COMMENTS_MAX
 from app.crud import create_post, get_posts, update_post, delete_post, get_post
 from app.database import get_db
+from app.fields import batch_ids, sparse_fields
+from app.trending import get_trending
+from app.view_counter import view_counter
 
 router = APIRouter()
 
 
-@router.get("/posts/", response_model=list[schemas.PostRead])
+@router.get("/posts/", response_model=list[schemas.PostWithComments],
+            response_model_exclude_unset=True)
 async def read_posts_endpoint(
     db: AsyncSession = Depends(get_db),
     user: models.User = Depends(current_user),
@@ -19,15 +25,42 @@ async def read_posts_endpoint(
     limit: int = 10,
     sort_by: Literal["title", "date"] = None,
     sort_order: Literal["asc", "desc"] = "asc",
-) -> list[models.Post]:
-    return await get_posts(
+    fields: Optional[list[str]] = Depends(sparse_fields(schemas.PostFields)),
+    ids: Optional[list[int]] = Depends(batch_ids),
+    include: Optional[Literal["comments"]] = None,
+    comments_limit: int = Query(3, ge=1, le=EMBEDDED_COMMENTS_MAX),
+) -> ORJSONResponse:
+    """
+    Lists a page of posts, or the posts given by `ids=` (offset and limit
+    are ignored then). `include=comments` embeds the first
+    `comments_limit` comments of each post.
+    """
+    posts = await get_posts(
         db=db,
         user=user,
         offset=offset,
         limit=limit,
         sort_by=sort_by,
-        sort_order=sort_order
+        sort_order=sort_order,
+        fields=fields,
+        ids=ids,
+        comments_limit=comments_limit if include == "comments" else None
     )
+    # Rows are already shaped like the response model, skip re-validating
+    return ORJSONResponse(posts)
+
+
+@router.get("/posts/trending", response_model=list[schemas.TrendingPost])
+async def read_trending_posts_endpoint(
+    db: AsyncSession = Depends(get_db),
+    user: models.User = Depends(current_user),
+    limit: int = Query(10, ge=1, le=100),
+) -> ORJSONResponse:
+    """
+    Posts with the most recent comment activity, hottest first.
+    """
+    posts = await get_trending(db=db, user=user, limit=limit)
+    return ORJSONResponse(posts)
 
 
 @router.get("/posts/{post_id}", response_model=schemas.PostRead)
@@ -36,7 +69,9 @@ async def read_post_endpoint(
     db: AsyncSession = Depends(get_db),
     user: models.User = Depends(current_user)
 ) -> models.Post:
-    return await get_post(db=db, user=user, post_id=post_id)
+    post = await get_post(db=db, user=user, post_id=post_id)
+    view_counter.add(post_id)
+    return post
 
 
 @router.post("/posts/", response_model=schemas.PostRead, status_code=201)
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
 from pydantic import BaseModel
@@ -22,9 +22,34 @@ class PostUpdate(PostCreate):
 
 class PostRead(PostBase):
     id: int
+    content_preview: Optional[str] = None
     created_at: datetime
     is_blocked: bool
     owner_id: int
+    view_count: int = 0
+
+    class Config:
+        orm_mode = True
+
+
+class TrendingPost(PostRead):
+    score: float
+
+
+class PostFields(BaseModel):
+    """
+    PostRead restricted to the fields requested with `fields=`.
+    """
+    id: Optional[int] = None
+    title: Optional[str] = None
+    content: Optional[str] = None
+    content_preview: Optional[str] = None
+    auto_reply: Optional[bool] = None
+    auto_reply_delay: Optional[int] = None
+    created_at: Optional[datetime] = None
+    is_blocked: Optional[bool] = None
+    owner_id: Optional[int] = None
+    view_count: Optional[int] = None
 
     class Config:
         orm_mode = True
@@ -44,6 +69,7 @@ class CommentUpdate(CommentBase):
 
 class CommentRead(CommentBase):
     id: int
+    content_preview: Optional[str] = None
     created_at: datetime
     is_blocked: bool
     post_id: int
@@ -54,7 +80,48 @@ class CommentRead(CommentBase):
         orm_mode = True
 
 
+class CommentFields(BaseModel):
+    """
+    CommentRead restricted to the fields requested with `fields=`.
+    """
+    id: Optional[int] = None
+    content: Optional[str] = None
+    content_preview: Optional[str] = None
+    created_at: Optional[datetime] = None
+    is_blocked: Optional[bool] = None
+    post_id: Optional[int] = None
+    author_id: Optional[int] = None
+    parent_id: Optional[int] = None
+
+    class Config:
+        orm_mode = True
+
+
+class PostWithComments(PostFields):
+    """
+    PostFields with the first comments embedded by include=comments.
+    """
+    comments: Optional[list[CommentRead]] = None
+
+
 class CommentAnalytics(BaseModel):
     date: str
     total_comments: int
     blocked_comments: int
+    # Estimated, see UniqueCommenters.relative_error
+    unique_commenters: int
+
+
+class CommentHourlyAnalytics(BaseModel):
+    hour: datetime
+    total_comments: int
+    blocked_comments: int
+
+
+class UniqueCommenters(BaseModel):
+    date_from: date
+    date_to: date
+    post_id: Optional[int] = None
+    unique_commenters: int
+    # Relative standard error of the estimate
+    relative_error: float
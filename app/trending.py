@@ -0,0 +1,193 @@
+"""
+Trending posts, ranked by comment activity that decays exponentially.
+
+The decayed score of a post at time t is the sum of
+exp(-rate * (t - commented_at)) over its comments. Instead of decaying
+every score as time passes, each comment adds
+exp(rate * (commented_at - epoch)) to the stored score. Stored scores are
+then all the decayed ones times the same factor exp(rate * (t - epoch)),
+so they rank the same and the index on the score column returns the top
+posts without looking at the others.
+
+A comment that is deleted or blocked subtracts the same weight again,
+and one that moderation unblocks adds it.
+
+Stored scores grow with time. The renormalization job moves the epoch to
+the present and rescales all scores in one transaction, which also drops
+the posts whose score decayed to nothing.
+"""
+import asyncio
+import logging
+import math
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# app.database has to be imported before app.models
+from app.database import async_session_maker, upsert
+from app import models, schemas
+from app.config import TRENDING_HALF_LIFE, TRENDING_RENORMALIZE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+EPOCH_NAME = "trending"
+# Scores below this after renormalization are removed, that is about 20
+# half-lives after the last comment
+MIN_SCORE = 1e-6
+
+TRENDING_FIELDS = tuple(schemas.PostRead.model_fields)
+
+EPOCH = select(models.ScoreEpoch.epoch).where(
+    models.ScoreEpoch.name == EPOCH_NAME
+)
+
+
+def decay_rate(half_life: float = TRENDING_HALF_LIFE) -> float:
+    """
+    Decay per second for a half-life in hours.
+    """
+    return math.log(2) / (half_life * 3600)
+
+
+async def get_epoch(db: AsyncSession) -> datetime:
+    epoch = (await db.execute(EPOCH)).scalar()
+    if epoch is None:
+        # The first worker to get here sets it, the others read theirs
+        await db.execute(
+            upsert(db, models.ScoreEpoch)
+            .values(name=EPOCH_NAME, epoch=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        epoch = (await db.execute(EPOCH)).scalar()
+    return epoch
+
+
+async def comment_weight(db: AsyncSession, commented_at: datetime) -> float:
+    """
+    What a comment adds to the stored score against the current epoch.
+    """
+    epoch = await get_epoch(db)
+    return math.exp(decay_rate() * (commented_at - epoch).total_seconds())
+
+
+async def record_comment(db: AsyncSession, post_id: int,
+                         commented_at: Optional[datetime] = None) -> None:
+    """
+    Adds a comment to the post's score, in the caller's transaction.
+
+    A comment committed while a renormalization runs may be weighted
+    against the previous epoch, overcounting it by at most the decay of
+    one renormalization interval.
+    """
+    weight = await comment_weight(db, commented_at or datetime.utcnow())
+
+    statement = upsert(db, models.PostScore).values(post_id=post_id,
+                                                    score=weight)
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=["post_id"],
+        set_={"score": models.PostScore.score + statement.excluded.score},
+    ))
+
+
+async def forget_comment(db: AsyncSession, post_id: int,
+                         commented_at: datetime) -> None:
+    """
+    Takes a deleted or blocked comment out of the post's score, in the
+    caller's transaction.
+
+    Renormalization rescales a comment's weight along with the score, so
+    it is subtracted exactly. Rounding can leave a score just below zero,
+    the next renormalization removes it.
+    """
+    weight = await comment_weight(db, commented_at)
+    await db.execute(
+        update(models.PostScore)
+        .where(models.PostScore.post_id == post_id)
+        .values(score=models.PostScore.score - weight)
+    )
+
+
+async def rescore_comments(
+        changes: Iterable[tuple[int, datetime, bool]]
+) -> None:
+    """
+    Adds comments to the scores or takes them out, as
+    (post_id, commented_at, is_blocked) of each comment, in a transaction
+    of its own since the comments may live on a shard. Used by bulk writes
+    and moderation verdicts that changed.
+    """
+    changes = list(changes)
+    if not changes:
+        return
+    async with async_session_maker() as db:
+        for post_id, commented_at, is_blocked in changes:
+            if is_blocked:
+                await forget_comment(db, post_id, commented_at)
+            else:
+                await record_comment(db, post_id, commented_at)
+        await db.commit()
+
+
+async def get_trending(db: AsyncSession, user: models.User,
+                       limit: int = 10) -> list[dict]:
+    """
+    The `limit` posts with the highest decayed score, as plain dicts with
+    the current `score`.
+    """
+    query = (
+        select(*(getattr(models.Post, field) for field in TRENDING_FIELDS),
+               models.PostScore.score)
+        .join(models.Post, models.Post.id == models.PostScore.post_id)
+        .order_by(models.PostScore.score.desc())
+        .limit(limit)
+    )
+    if not user.is_superuser:
+        query = query.where(models.Post.is_blocked == False)
+
+    epoch = await get_epoch(db)
+    decay = math.exp(
+        -decay_rate() * (datetime.utcnow() - epoch).total_seconds()
+    )
+    posts = [dict(row) for row in (await db.execute(query)).mappings()]
+    for post in posts:
+        post["score"] *= decay
+    return posts
+
+
+async def renormalize(now: Optional[datetime] = None) -> None:
+    """
+    Moves the epoch to `now` and rescales the stored scores to match.
+    """
+    now = now or datetime.utcnow()
+    async with async_session_maker() as db:
+        epoch = await get_epoch(db)
+        factor = math.exp(-decay_rate() * (now - epoch).total_seconds())
+        await db.execute(
+            update(models.PostScore)
+            .values(score=models.PostScore.score * factor)
+        )
+        await db.execute(
+            delete(models.PostScore).where(models.PostScore.score < MIN_SCORE)
+        )
+        await db.execute(
+            update(models.ScoreEpoch)
+            .where(models.ScoreEpoch.name == EPOCH_NAME)
+            .values(epoch=now)
+        )
+        await db.commit()
+
+
+async def renormalization_worker(
+        interval: float = TRENDING_RENORMALIZE_INTERVAL
+) -> None:
+    """
+    Renormalizes the trending scores every `interval` seconds.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await renormalize()
+        except Exception:
+            logger.exception("Trending score renormalization failed")
@@ -0,0 +1,89 @@
+"""
+Post view counts, buffered in memory and written in batches.
+
+Reads only add to the worker's buffer. A background task swaps the
+buffer out every VIEW_FLUSH_INTERVAL seconds and adds the counts to
+posts.view_count with one UPDATE per FLUSH_CHUNK_SIZE posts. Workers
+only ever add to the column, so their flushes don't conflict.
+
+Views buffered since the last flush are lost if the worker crashes: at
+most VIEW_FLUSH_INTERVAL seconds' worth, plus the counts of a flush that
+fails and is retried with the next one. A clean shutdown flushes what is
+left.
+"""
+import asyncio
+import logging
+
+from sqlalchemy import case, update
+
+# app.database has to be imported before app.models
+from app.database import async_session_maker
+from app import metrics, models
+from app.config import VIEW_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+FLUSH_CHUNK_SIZE = 500
+
+
+class ViewCounter:
+    def __init__(self):
+        self._pending: dict[int, int] = {}
+
+    def add(self, post_id: int, count: int = 1) -> None:
+        self._pending[post_id] = self._pending.get(post_id, 0) + count
+        metrics.post_views_pending.inc(amount=count)
+
+    def pending(self, post_id: int) -> int:
+        return self._pending.get(post_id, 0)
+
+    async def flush(self) -> int:
+        """
+        Writes the buffered counts, returns the number of posts updated.
+        On failure the counts go back to the buffer for the next flush.
+        """
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        post_ids = list(pending)
+        try:
+            async with async_session_maker() as db:
+                for start in range(0, len(post_ids), FLUSH_CHUNK_SIZE):
+                    chunk = {post_id: pending[post_id]
+                             for post_id in post_ids[start:start +
+                                                     FLUSH_CHUNK_SIZE]}
+                    await db.execute(
+                        update(models.Post)
+                        .where(models.Post.id.in_(list(chunk)))
+                        .values(view_count=models.Post.view_count + case(
+                            chunk, value=models.Post.id, else_=0
+                        ))
+                        .execution_options(synchronize_session=False)
+                    )
+                await db.commit()
+        except BaseException:
+            for post_id, count in pending.items():
+                self._pending[post_id] = (
+                    self._pending.get(post_id, 0) + count
+                )
+            raise
+
+        metrics.post_views_pending.inc(amount=-sum(pending.values()))
+        metrics.post_view_flushes.inc()
+        return len(pending)
+
+
+view_counter = ViewCounter()
+
+
+async def view_flush_worker(interval: float = VIEW_FLUSH_INTERVAL) -> None:
+    """
+    Flushes the buffered views every `interval` seconds.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await view_counter.flush()
+        except Exception:
+            logger.exception("Flushing post views failed")
@@ -0,0 +1,334 @@
+"""
+Latency and throughput benchmark for every router endpoint.
+
+Seeds a deterministic dataset, runs the AI calls on the local backend with
+configurable latency and error rate and fires requests at the app
+in-process (or at a running server with --base-url). Results are written
+as JSON, one entry per endpoint, so two runs can be diffed with
+benchmarks/compare.py.
+
+    python -m benchmarks.api --posts 1000 --ai-latency 0.2 -o run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from itertools import count
+from typing import Callable, Optional
+
+DEFAULT_DATABASE_URL = "sqlite+aiosqlite:///./bench_db"
+
+
+class Scenario:
+    def __init__(
+            self,
+            name: str,
+            method: str,
+            path: Callable[[int], str],
+            body: Optional[Callable[[int], dict]] = None,
+            role: str = "user",
+            expected_status: int = 200,
+    ):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.role = role
+        self.expected_status = expected_status
+
+
+def build_scenarios(data: dict, disposable: dict) -> list[Scenario]:
+    rng = random.Random(0)
+    visible_posts = data["visible_post_ids"]
+    own_posts = data["own_post_ids"]
+    own_comments = data["own_comment_ids"]
+    comments = data["comment_ids"]
+    disposable_posts = iter(disposable["post_ids"])
+    disposable_comments = iter(disposable["comment_ids"])
+
+    return [
+        Scenario("GET /posts/", "GET",
+                 lambda i: f"/posts/?offset={rng.randint(0, 50)}"
+                           f"&sort_by=date&sort_order=desc"),
+        Scenario("GET /posts/{post_id}", "GET",
+                 lambda i: f"/posts/{rng.choice(visible_posts)}"),
+        Scenario("POST /posts/", "POST", lambda i: "/posts/",
+                 lambda i: {"title": f"Bench title {i}",
+                            "content": f"Bench content {i}"},
+                 expected_status=201),
+        Scenario("PUT /posts/{post_id}", "PUT",
+                 lambda i: f"/posts/{rng.choice(own_posts)}",
+                 lambda i: {"title": f"Updated title {i}",
+                            "content": f"Updated content {i}"}),
+        Scenario("DELETE /posts/{post_id}", "DELETE",
+                 lambda i: f"/posts/{next(disposable_posts)}",
+                 expected_status=204),
+        Scenario("GET /posts/{post_id}/comments/", "GET",
+                 lambda i: f"/posts/{rng.choice(visible_posts)}/comments/"
+                           f"?sort_by=created_at"),
+        Scenario("GET /comments/{comment_id}/", "GET",
+                 lambda i: f"/comments/{rng.choice(comments)}/"),
+        Scenario("POST /posts/{post_id}/comments/", "POST",
+                 lambda i: f"/posts/{rng.choice(visible_posts)}/comments/",
+                 lambda i: {"content": f"Bench comment {i}"},
+                 expected_status=201),
+        Scenario("PUT /comments/{comment_id}/", "PUT",
+                 lambda i: f"/comments/{rng.choice(own_comments)}/",
+                 lambda i: {"content": f"Updated comment {i}"}),
+        Scenario("DELETE /comments/{comment_id}/", "DELETE",
+                 lambda i: f"/comments/{next(disposable_comments)}/",
+                 expected_status=204),
+        Scenario("GET /comments-daily-breakdown/", "GET",
+                 lambda i: "/comments-daily-breakdown/?limit=31",
+                 role="admin"),
+    ]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1,
+                      round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    total = len(values) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3)
+        if values else 0.0,
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+        "rps": round(total / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+async def login(client, email: str, password: str) -> dict:
+    response = await client.post(
+        "/auth/jwt/login",
+        data={"username": email, "password": password},
+    )
+    response.raise_for_status()
+    return {"blog": response.cookies.get("blog")}
+
+
+async def run_scenario(
+        client,
+        scenario: Scenario,
+        cookies: dict,
+        requests: int,
+        concurrency: int,
+        warmup: int,
+) -> dict:
+    for i in range(warmup):
+        await send(client, scenario, cookies, -i - 1)
+
+    latencies = []
+    errors = 0
+    counter = count()
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            started = time.perf_counter()
+            ok = await send(client, scenario, cookies, i)
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def send(client, scenario: Scenario, cookies: dict, i: int) -> bool:
+    client.cookies = cookies
+    try:
+        response = await client.request(
+            scenario.method,
+            scenario.path(i),
+            json=scenario.body(i) if scenario.body else None,
+        )
+    except StopIteration:
+        # A disposable pool ran dry
+        return False
+    return response.status_code == scenario.expected_status
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_client(args: argparse.Namespace):
+    import httpx
+
+    from app.main import app
+
+    if args.base_url:
+        return httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://bench",
+        timeout=60,
+    )
+
+
+async def login_all(client) -> dict:
+    from benchmarks.seed import ADMIN_EMAIL, USER_EMAIL, PASSWORD
+
+    return {
+        "user": await login(client, USER_EMAIL, PASSWORD),
+        "admin": await login(client, ADMIN_EMAIL, PASSWORD),
+    }
+
+
+async def seed(args: argparse.Namespace) -> tuple[dict, dict]:
+    from app.database import engine
+    from benchmarks.seed import SeedConfig, seed_database, insert_disposable
+
+    data = await seed_database(engine, SeedConfig(
+        users=args.users,
+        posts=args.posts,
+        comments_per_post=args.comments_per_post,
+        thread_depth=args.thread_depth,
+        seed=args.seed,
+    ))
+    disposable = await insert_disposable(
+        engine, data["visible_post_ids"][0], args.requests + args.warmup)
+    return data, disposable
+
+
+def use_local_backend(args: argparse.Namespace, latency: float) -> None:
+    from app.ai.providers import LocalBackend, set_backend
+
+    set_backend(LocalBackend(
+        latency=latency,
+        error_rate=args.ai_error_rate,
+        max_rps=args.ai_max_rps,
+        seed=args.seed,
+    ))
+
+
+def report_meta(args: argparse.Namespace, data: dict) -> dict:
+    return {
+        "started_at": datetime.utcnow().isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "database": os.environ["DATABASE_URL"].split("://")[0],
+        "dataset": {
+            "users": data["users"],
+            "posts": data["posts"],
+            "comments": data["comments"],
+            "thread_depth": args.thread_depth,
+        },
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "ai_latency": args.ai_latency,
+        "ai_error_rate": args.ai_error_rate,
+        "ai_max_rps": args.ai_max_rps,
+        "target": args.base_url or "in-process",
+    }
+
+
+async def main(args: argparse.Namespace) -> dict:
+    from app.database import engine
+
+    use_local_backend(args, args.ai_latency)
+    data, disposable = await seed(args)
+
+    results = {}
+    async with make_client(args) as client:
+        cookies = await login_all(client)
+        for scenario in build_scenarios(data, disposable):
+            if args.only and args.only not in scenario.name:
+                continue
+            results[scenario.name] = await run_scenario(
+                client,
+                scenario,
+                cookies[scenario.role],
+                requests=args.requests,
+                concurrency=args.concurrency,
+                warmup=args.warmup,
+            )
+            print(f"{scenario.name:<36} {results[scenario.name]}",
+                  file=sys.stderr)
+
+    await engine.dispose()
+
+    return {"meta": report_meta(args, data), "endpoints": results}
+
+
+def build_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL,
+                        help="SQLite or Postgres URL, the schema is "
+                             "dropped and recreated")
+    parser.add_argument("--base-url",
+                        help="Benchmark a running server instead of the "
+                             "in-process app. It must use --database-url "
+                             "and be started with AI_BACKEND=local")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--comments-per-post", type=int, default=20)
+    parser.add_argument("--thread-depth", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=200,
+                        help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--ai-latency", type=float, default=0.0,
+                        help="Seconds each local model call blocks for")
+    parser.add_argument("--ai-error-rate", type=float, default=0.0,
+                        help="Share of local model calls that fail")
+    parser.add_argument("--ai-max-rps", type=float, default=0.0,
+                        help="Local model quota, 0 means unlimited")
+    parser.add_argument("--only",
+                        help="Run only endpoints whose name contains this")
+    parser.add_argument("-o", "--output",
+                        help="Write the JSON report here instead of stdout")
+    return parser
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """
+    The app reads its configuration at import time, so this has to run
+    before anything from `app` is imported.
+    """
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("DATABASE_ECHO", "false")
+    os.environ.setdefault("AI_BACKEND", "local")
+    os.environ.setdefault("JWT_SECRET", "benchmark")
+
+
+def write_report(report: dict, path: Optional[str]) -> None:
+    output = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    arguments = build_parser(__doc__.split("\n\n")[0]).parse_args()
+    configure_environment(arguments)
+    write_report(asyncio.run(main(arguments)), arguments.output)
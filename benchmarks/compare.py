@@ -0,0 +1,66 @@
+"""
+Compares two benchmark reports and flags regressions.
+
+    python -m benchmarks.compare baseline.json current.json --threshold 10
+
+Exits with status 1 if any endpoint's p95 grew, or its throughput dropped,
+by more than the threshold percentage.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "rps")
+
+
+def change(old: float, new: float) -> float:
+    if not old:
+        return 0.0
+    return (new - old) / old * 100
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    regressions = []
+    print(f"{'endpoint':<36}" + "".join(f"{m:>20}" for m in METRICS))
+
+    for name, new in current["endpoints"].items():
+        old = baseline["endpoints"].get(name)
+        if old is None:
+            print(f"{name:<36} (new)")
+            continue
+
+        cells = []
+        for metric in METRICS:
+            delta = change(old[metric], new[metric])
+            cells.append(f"{new[metric]:>10} ({delta:+6.1f}%)")
+        print(f"{name:<36}" + "".join(f"{cell:>20}" for cell in cells))
+
+        if change(old["p95_ms"], new["p95_ms"]) > threshold:
+            regressions.append(f"{name}: p95 {old['p95_ms']} -> "
+                               f"{new['p95_ms']} ms")
+        if change(old["rps"], new["rps"]) < -threshold:
+            regressions.append(f"{name}: rps {old['rps']} -> {new['rps']}")
+        if new["errors"] > old["errors"]:
+            regressions.append(f"{name}: errors {old['errors']} -> "
+                               f"{new['errors']}")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Allowed slowdown in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as file:
+        baseline_report = json.load(file)
+    with open(args.current) as file:
+        current_report = json.load(file)
+
+    found = compare(baseline_report, current_report, args.threshold)
+    for regression in found:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    sys.exit(1 if found else 0)
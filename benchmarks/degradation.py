@@ -0,0 +1,67 @@
+"""
+Shows how the AI-backed endpoints degrade as the model slows down.
+
+Runs the endpoints that call the model once per local backend latency and
+reports the same statistics as benchmarks.api for each step.
+
+    python -m benchmarks.degradation --latencies 0 0.05 0.2 0.5 -o sweep.json
+"""
+import asyncio
+import argparse
+import sys
+
+from benchmarks.api import (build_parser, build_scenarios,
+                            configure_environment, login_all, make_client,
+                            report_meta, run_scenario, seed,
+                            use_local_backend, write_report)
+
+AI_SCENARIOS = (
+    "POST /posts/",
+    "PUT /posts/{post_id}",
+    "POST /posts/{post_id}/comments/",
+    "PUT /comments/{comment_id}/",
+)
+
+
+async def main(args: argparse.Namespace) -> dict:
+    from app.database import engine
+
+    data, disposable = await seed(args)
+    scenarios = [
+        scenario for scenario in build_scenarios(data, disposable)
+        if scenario.name in AI_SCENARIOS
+    ]
+
+    steps = []
+    async with make_client(args) as client:
+        cookies = await login_all(client)
+        for latency in args.latencies:
+            use_local_backend(args, latency)
+            results = {}
+            for scenario in scenarios:
+                results[scenario.name] = await run_scenario(
+                    client,
+                    scenario,
+                    cookies[scenario.role],
+                    requests=args.requests,
+                    concurrency=args.concurrency,
+                    warmup=args.warmup,
+                )
+                print(f"{latency:>6}s {scenario.name:<36} "
+                      f"{results[scenario.name]}", file=sys.stderr)
+            steps.append({"ai_latency": latency, "endpoints": results})
+
+    await engine.dispose()
+
+    return {"meta": report_meta(args, data), "steps": steps}
+
+
+if __name__ == "__main__":
+    parser = build_parser(__doc__.split("\n\n")[0])
+    parser.add_argument("--latencies", type=float, nargs="+",
+                        default=[0.0, 0.05, 0.1, 0.25, 0.5],
+                        help="Local model latencies to step through")
+    parser.set_defaults(requests=50)
+    arguments = parser.parse_args()
+    configure_environment(arguments)
+    write_report(asyncio.run(main(arguments)), arguments.output)
@@ -0,0 +1,99 @@
+"""
+Login throughput next to read latency.
+
+Measures GET /posts/ latency on its own, then again while other clients
+log in as fast as they can, and reports the login throughput. With the
+hasher on the event loop (--hasher-pool none) a login storm stalls every
+other request, with a thread or process pool reads stay responsive.
+
+    python -m benchmarks.login --hasher-pool thread --login-concurrency 8 \\
+        --duration 10 -o login.json
+"""
+import asyncio
+import os
+import sys
+import time
+
+from benchmarks.api import (build_parser, configure_environment, login,
+                            make_client, report_meta, seed, summarize,
+                            write_report)
+
+
+async def run_for(duration: float, concurrency: int, request) -> dict:
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            if await request():
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def main(args) -> dict:
+    from app.auth.passwords import shutdown_hasher
+    from app.database import engine
+    from benchmarks.seed import PASSWORD, USER_EMAIL
+
+    data, _ = await seed(args)
+
+    async with make_client(args) as client:
+        cookies = await login(client, USER_EMAIL, PASSWORD)
+
+        async def read_posts() -> bool:
+            response = await client.get("/posts/", cookies=cookies)
+            return response.status_code == 200
+
+        async def log_in() -> bool:
+            response = await client.post(
+                "/auth/jwt/login",
+                data={"username": USER_EMAIL, "password": PASSWORD},
+            )
+            return response.status_code == 204
+
+        results = {"GET /posts/ (idle)": await run_for(
+            args.duration, args.concurrency, read_posts)}
+        reads, logins = await asyncio.gather(
+            run_for(args.duration, args.concurrency, read_posts),
+            run_for(args.duration, args.login_concurrency, log_in),
+        )
+        results["GET /posts/ (during logins)"] = reads
+        results["POST /auth/jwt/login"] = logins
+        for name, result in results.items():
+            print(f"{name:<30} {result}", file=sys.stderr)
+
+    await engine.dispose()
+    shutdown_hasher()
+
+    meta = report_meta(args, data)
+    meta.update({
+        "hasher_pool": os.environ["PASSWORD_HASHER_POOL"],
+        "login_concurrency": args.login_concurrency,
+        "duration": args.duration,
+    })
+    return {"meta": meta, "endpoints": results}
+
+
+if __name__ == "__main__":
+    parser = build_parser(__doc__.split("\n\n")[0])
+    parser.add_argument("--hasher-pool", default="thread",
+                        choices=["thread", "process", "none"])
+    parser.add_argument("--hasher-workers", type=int, default=0,
+                        help="Pool size, defaults to the CPU count")
+    parser.add_argument("--login-concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="Seconds per measurement")
+    arguments = parser.parse_args()
+
+    configure_environment(arguments)
+    os.environ["PASSWORD_HASHER_POOL"] = arguments.hasher_pool
+    os.environ["PASSWORD_HASHER_WORKERS"] = str(arguments.hasher_workers)
+    write_report(asyncio.run(main(arguments)), arguments.output)
@@ -0,0 +1,124 @@
+"""
+Latency benchmark for moderating long texts in one call versus in
+concurrent overlapping chunks.
+
+Moderates a generated post of --size-kb with the local backend, whose
+latency grows with the input size, once clean and once with an abusive
+phrase in its first paragraph. Chunked moderation of the abusive post stops
+as soon as the first chunk is flagged.
+
+    python -m benchmarks.moderation --size-kb 50 --chunk-size 4000 \\
+        --concurrency 4 -o moderation.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+FLAGGED_TERM = "hate"
+
+
+def build_text(size: int, abusive: bool, seed: int) -> str:
+    rng = random.Random(seed)
+    words = ["blog", "post", "python", "async", "model", "query", "cache",
+             "index", "comment", "reply", "latency", "server"]
+    parts = []
+    length = 0
+    while length < size:
+        word = rng.choice(words)
+        parts.append(word)
+        length += len(word) + 1
+    if abusive:
+        parts.insert(10, f"I {FLAGGED_TERM} you")
+    return " ".join(parts)[:size]
+
+
+def measure(func, text: str, runs: int) -> dict:
+    timings = []
+    verdict = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        verdict = func(text)
+        timings.append(time.perf_counter() - started)
+    return {
+        "harmful": verdict,
+        "median_ms": round(statistics.median(timings) * 1000, 1),
+        "min_ms": round(min(timings) * 1000, 1),
+        "max_ms": round(max(timings) * 1000, 1),
+    }
+
+
+def main(args: argparse.Namespace) -> dict:
+    from app.ai.moderation import (ask_model_chunked, moderation_breaker,
+                                   split_text)
+    from app.ai.providers import LocalBackend, set_backend
+
+    backend = LocalBackend(
+        latency=args.ai_latency,
+        latency_per_kb=args.ai_latency_per_kb,
+        flagged_terms=[FLAGGED_TERM],
+    )
+    set_backend(backend)
+    # A single call on the whole post may legitimately take a while here
+    moderation_breaker.call_timeout = 60.0
+
+    size = args.size_kb * 1024
+    strategies = {
+        "single": lambda text: asyncio.run(
+            ask_model_chunked(text, size=len(text))),
+        "chunked": lambda text: asyncio.run(ask_model_chunked(
+            text, args.chunk_size, args.overlap, args.concurrency)),
+    }
+
+    results = {}
+    for kind in ("clean", "abusive"):
+        text = build_text(size, kind == "abusive", args.seed)
+        for name, func in strategies.items():
+            backend.calls = 0
+            result = measure(func, text, args.runs)
+            result["model_calls_per_run"] = backend.calls / args.runs
+            results[f"{kind}/{name}"] = result
+            print(f"{kind + '/' + name:<16} {result}", file=sys.stderr)
+
+    return {
+        "meta": {
+            "size_kb": args.size_kb,
+            "chunk_size": args.chunk_size,
+            "overlap": args.overlap,
+            "chunks": len(split_text(build_text(size, False, args.seed),
+                                     args.chunk_size, args.overlap)),
+            "concurrency": args.concurrency,
+            "ai_latency": args.ai_latency,
+            "ai_latency_per_kb": args.ai_latency_per_kb,
+            "runs": args.runs,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size-kb", type=int, default=50)
+    parser.add_argument("--chunk-size", type=int, default=4000)
+    parser.add_argument("--overlap", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--ai-latency", type=float, default=0.1,
+                        help="Fixed seconds per model call")
+    parser.add_argument("--ai-latency-per-kb", type=float, default=0.02,
+                        help="Extra seconds per KB of input")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output",
+                        help="Write the JSON report here instead of stdout")
+    arguments = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench_db")
+    os.environ.setdefault("AI_BACKEND", "local")
+    os.environ.setdefault("JWT_SECRET", "benchmark")
+
+    from benchmarks.api import write_report
+
+    write_report(main(arguments), arguments.output)
@@ -0,0 +1,197 @@
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from fastapi_users.password import PasswordHelper
+from sqlalchemy import insert, text, select, func
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+ADMIN_EMAIL = "bench-admin@example.com"
+USER_EMAIL = "bench-user@example.com"
+PASSWORD = "bench-password"
+
+# Ids of the two accounts the benchmark logs in with
+ADMIN_ID = 1
+USER_ID = 2
+
+CHUNK_SIZE = 1000
+
+
+@dataclass
+class SeedConfig:
+    users: int = 50
+    posts: int = 200
+    comments_per_post: int = 20
+    thread_depth: int = 3
+    blocked_ratio: float = 0.1
+    days: int = 30
+    seed: int = 42
+
+
+async def _insert_chunked(conn, table, rows: list[dict]) -> None:
+    for start in range(0, len(rows), CHUNK_SIZE):
+        await conn.execute(insert(table), rows[start:start + CHUNK_SIZE])
+
+
+async def _reset_sequences(conn) -> None:
+    """
+    Rows are inserted with explicit ids, so Postgres sequences have to be
+    moved past them before the API inserts anything.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    for table in ("users", "posts", "comments"):
+        await conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table}), 1))"
+        ))
+
+
+async def seed_database(engine: AsyncEngine, config: SeedConfig) -> dict:
+    """
+    Recreates the schema and fills it with a deterministic dataset.
+
+    Users 1 and 2 are the admin and the regular user the benchmark logs in
+    with, the rest only own posts and comments. Comments form reply
+    threads up to `thread_depth` levels deep.
+    """
+    from app.models import Base, User, Post, Comment
+
+    rng = random.Random(config.seed)
+    now = datetime.utcnow()
+    hashed_password = PasswordHelper().hash(PASSWORD)
+
+    users = [
+        {
+            "id": user_id,
+            "email": (ADMIN_EMAIL if user_id == ADMIN_ID else
+                      USER_EMAIL if user_id == USER_ID else
+                      f"bench-{user_id}@example.com"),
+            "hashed_password": hashed_password,
+            "is_active": True,
+            "is_superuser": user_id == ADMIN_ID,
+            "is_verified": True,
+        }
+        for user_id in range(1, max(config.users, 2) + 1)
+    ]
+
+    posts = []
+    comments = []
+    comment_id = 0
+    for post_id in range(1, config.posts + 1):
+        post_created = now - timedelta(
+            seconds=rng.randint(0, config.days * 86400))
+        posts.append({
+            "id": post_id,
+            "title": f"Benchmark post {post_id}",
+            "content": f"Body of benchmark post {post_id}. " * 20,
+            "created_at": post_created,
+            "is_blocked": rng.random() < config.blocked_ratio,
+            # Every other post belongs to the benchmark user
+            "owner_id": USER_ID if post_id % 2 else rng.choice(users)["id"],
+            "auto_reply": False,
+            "auto_reply_delay": 0,
+        })
+
+        depths = {}
+        for _ in range(config.comments_per_post):
+            comment_id += 1
+            candidates = [
+                cid for cid, depth in depths.items()
+                if depth < config.thread_depth
+            ]
+            parent_id = None
+            if candidates and rng.random() < 0.5:
+                parent_id = rng.choice(candidates)
+            depths[comment_id] = depths.get(parent_id, 0) + 1
+
+            comments.append({
+                "id": comment_id,
+                "content": f"Benchmark comment {comment_id}",
+                "created_at": post_created + timedelta(
+                    seconds=rng.randint(0, 86400)),
+                "is_blocked": rng.random() < config.blocked_ratio,
+                "post_id": post_id,
+                "author_id": rng.choice(users)["id"],
+                "parent_id": parent_id,
+            })
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await _insert_chunked(conn, User.__table__, users)
+        await _insert_chunked(conn, Post.__table__, posts)
+        await _insert_chunked(conn, Comment.__table__, comments)
+        await _reset_sequences(conn)
+
+    return {
+        "users": len(users),
+        "posts": len(posts),
+        "comments": len(comments),
+        "visible_post_ids": [
+            post["id"] for post in posts if not post["is_blocked"]
+        ],
+        "own_post_ids": [
+            post["id"] for post in posts
+            if post["owner_id"] == USER_ID and not post["is_blocked"]
+        ],
+        "own_comment_ids": [
+            comment["id"] for comment in comments
+            if comment["author_id"] == USER_ID
+        ],
+        "comment_ids": [
+            comment["id"] for comment in comments
+            if not comment["is_blocked"]
+        ],
+    }
+
+
+async def insert_disposable(
+        engine: AsyncEngine,
+        post_id: int,
+        count: int
+) -> dict:
+    """
+    Inserts posts and leaf comments owned by the benchmark user that the
+    delete scenarios can consume without touching the seeded threads.
+    """
+    from app.models import Post, Comment
+
+    now = datetime.utcnow()
+    async with engine.begin() as conn:
+        first_post = (await conn.execute(
+            select(func.coalesce(func.max(Post.id), 0)))).scalar() + 1
+        first_comment = (await conn.execute(
+            select(func.coalesce(func.max(Comment.id), 0)))).scalar() + 1
+
+        post_ids = list(range(first_post, first_post + count))
+        comment_ids = list(range(first_comment, first_comment + count))
+
+        await _insert_chunked(conn, Post.__table__, [
+            {
+                "id": new_id,
+                "title": f"Disposable post {new_id}",
+                "content": "To be deleted",
+                "created_at": now,
+                "is_blocked": False,
+                "owner_id": USER_ID,
+                "auto_reply": False,
+                "auto_reply_delay": 0,
+            }
+            for new_id in post_ids
+        ])
+        await _insert_chunked(conn, Comment.__table__, [
+            {
+                "id": new_id,
+                "content": "To be deleted",
+                "created_at": now,
+                "is_blocked": False,
+                "post_id": post_id,
+                "author_id": USER_ID,
+                "parent_id": None,
+            }
+            for new_id in comment_ids
+        ])
+        await _reset_sequences(conn)
+
+    return {"post_ids": post_ids, "comment_ids": comment_ids}
@@ -0,0 +1,172 @@
+"""
+Cost of turning query results into a JSON response, per 1,000 items.
+
+Compares the two ways a list endpoint can answer, for posts, comments and
+analytics rows loaded from a seeded in-memory SQLite database:
+
+  orm:  hydrate ORM objects, validate them into the response model and
+        encode with the stdlib JSON encoder (FastAPI's response_model path)
+  rows: read Row mappings into dicts and encode them with orjson
+
+    python -m benchmarks.serialization --items 1000 --runs 20 -o json.json
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+
+async def seed(engine, items: int) -> None:
+    from sqlalchemy import insert
+
+    import app.database  # noqa: F401
+    from app.models import Base, Comment, Post, User
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User.__table__), [{
+            "id": 1, "email": "bench@example.com", "hashed_password": "-",
+            "is_active": True, "is_superuser": False, "is_verified": False,
+        }])
+        started = datetime(2024, 1, 1)
+        await conn.execute(insert(Post.__table__), [{
+            "id": i, "title": f"Post {i}", "content": "Body text. " * 50,
+            "owner_id": 1, "created_at": started + timedelta(minutes=i),
+            "is_blocked": False, "auto_reply": False, "auto_reply_delay": 0,
+        } for i in range(1, items + 1)])
+        await conn.execute(insert(Comment.__table__), [{
+            "id": i, "content": "Comment text. " * 10, "post_id": 1,
+            "author_id": 1, "created_at": started + timedelta(days=i),
+            "is_blocked": i % 10 == 0,
+        } for i in range(1, items + 1)])
+
+
+async def time_runs(func, runs: int) -> dict:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await func()
+        timings.append(time.perf_counter() - started)
+    return {
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+    }
+
+
+async def main(args: argparse.Namespace) -> dict:
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_model_field
+    from sqlalchemy import Integer, func, select
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    # app.database has to be imported before app.models
+    import app.database  # noqa: F401
+    from app import crud, models, schemas
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    await seed(engine, args.items)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    analytics = (
+        func.date(models.Comment.created_at).label("date"),
+        func.count(models.Comment.id).label("total_comments"),
+        func.sum(func.cast(models.Comment.is_blocked, Integer)).label(
+            "blocked_comments"),
+    )
+    cases = {
+        "posts": (models.Post, crud.POST_FIELDS, schemas.PostFields),
+        "comments": (models.Comment, crud.COMMENT_FIELDS,
+                     schemas.CommentFields),
+    }
+
+    def orm_path(model, schema):
+        field = create_model_field("Response", list[schema],
+                                   mode="serialization")
+
+        async def run():
+            async with session_maker() as db:
+                objects = (await db.execute(select(model))).scalars().all()
+                content = await serialize_response(
+                    field=field, response_content=objects,
+                    exclude_unset=True)
+                return JSONResponse(content).body
+        return run
+
+    def rows_path(model, fields):
+        columns = [getattr(model, name) for name in fields]
+
+        async def run():
+            async with session_maker() as db:
+                result = await db.execute(select(*columns))
+                return ORJSONResponse(
+                    [dict(row) for row in result.mappings()]).body
+        return run
+
+    async def analytics_orm():
+        field = create_model_field(
+            "Response", list[schemas.CommentAnalytics], mode="serialization")
+        async with session_maker() as db:
+            rows = (await db.execute(
+                select(*analytics).group_by("date"))).all()
+            content = await serialize_response(field=field, response_content=[
+                {"date": row.date, "total_comments": row.total_comments,
+                 "blocked_comments": row.blocked_comments or 0}
+                for row in rows
+            ])
+            return JSONResponse(content).body
+
+    async def analytics_rows():
+        async with session_maker() as db:
+            rows = (await db.execute(
+                select(*analytics).group_by("date"))).all()
+            return ORJSONResponse([
+                {"date": row.date, "total_comments": row.total_comments,
+                 "blocked_comments": row.blocked_comments or 0}
+                for row in rows
+            ]).body
+
+    paths = {}
+    for name, (model, fields, schema) in cases.items():
+        paths[f"{name}/orm"] = orm_path(model, schema)
+        paths[f"{name}/rows"] = rows_path(model, fields)
+    paths["analytics/orm"] = analytics_orm
+    paths["analytics/rows"] = analytics_rows
+
+    results = {}
+    scale = 1000 / args.items
+    for name, run in paths.items():
+        await run()  # Warm up caches
+        result = await time_runs(run, args.runs)
+        result["median_ms_per_1000"] = round(result["median_ms"] * scale, 3)
+        result["bytes"] = len(await run())
+        results[name] = result
+        print(f"{name:<16} {result}", file=sys.stderr)
+
+    await engine.dispose()
+    return {
+        "meta": {"items": args.items, "runs": args.runs},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--items", type=int, default=1000,
+                        help="Posts, comments and days of analytics, one "
+                             "comment per day")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("-o", "--output",
+                        help="Write the JSON report here instead of stdout")
+    arguments = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench_db")
+    os.environ.setdefault("DATABASE_ECHO", "false")
+    os.environ.setdefault("JWT_SECRET", "benchmark")
+
+    from benchmarks.api import write_report
+
+    write_report(asyncio.run(main(arguments)), arguments.output)
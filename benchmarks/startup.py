@@ -0,0 +1,120 @@
+"""
+Cold-start benchmark for importing app.main.
+
+Imports the app in fresh interpreters with `python -X importtime` and
+reports the median import time and the packages it is spent in. Exits with
+status 1 when the median exceeds --budget-ms or when one of the heavy SDKs
+that should only load on first use got imported.
+
+    python -m benchmarks.startup --runs 5 --budget-ms 2000 -o startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+MODULE = "app.main"
+
+# Imported lazily by the AI backend, must not load with the app
+DEFERRED_MODULES = ("google.generativeai", "grpc")
+
+
+def measure_import(module: str) -> tuple[float, dict[str, float], set[str]]:
+    """
+    Imports the module in a fresh interpreter.
+
+    Returns its cumulative import time in milliseconds, self time per
+    top-level package and the names of all imported modules.
+    """
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench_db")
+    env.setdefault("JWT_SECRET", "benchmark")
+    env["PYTHONWARNINGS"] = "ignore"
+
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+
+    total = 0.0
+    packages = defaultdict(float)
+    modules = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        modules.add(name)
+        packages[name.split(".")[0]] += int(self_us) / 1000
+        if name == module:
+            total = int(cumulative_us) / 1000
+
+    return total, dict(packages), modules
+
+
+def main(args: argparse.Namespace) -> dict:
+    totals = []
+    packages = defaultdict(list)
+    loaded = set()
+    for _ in range(args.runs):
+        total, run_packages, modules = measure_import(MODULE)
+        totals.append(total)
+        for package, elapsed in run_packages.items():
+            packages[package].append(elapsed)
+        loaded |= {
+            deferred for deferred in DEFERRED_MODULES if deferred in modules
+        }
+
+    slowest = sorted(
+        ((package, statistics.median(values))
+         for package, values in packages.items()),
+        key=lambda item: item[1], reverse=True,
+    )[:args.top]
+
+    return {
+        "module": MODULE,
+        "runs": args.runs,
+        "median_ms": round(statistics.median(totals), 1),
+        "min_ms": round(min(totals), 1),
+        "max_ms": round(max(totals), 1),
+        "budget_ms": args.budget_ms,
+        "slowest_packages_ms": {
+            package: round(elapsed, 1) for package, elapsed in slowest
+        },
+        "deferred_modules_loaded": sorted(loaded),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10,
+                        help="Number of slowest packages to report")
+    parser.add_argument("--budget-ms", type=float, default=2000.0,
+                        help="Fail if the median import takes longer")
+    parser.add_argument("-o", "--output",
+                        help="Write the JSON report here instead of stdout")
+    arguments = parser.parse_args()
+
+    report = main(arguments)
+    output = json.dumps(report, indent=2)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    failed = False
+    if report["median_ms"] > arguments.budget_ms:
+        print(f"Import of {MODULE} took {report['median_ms']} ms, "
+              f"budget is {arguments.budget_ms} ms", file=sys.stderr)
+        failed = True
+    if report["deferred_modules_loaded"]:
+        print(f"Importing {MODULE} loaded "
+              f"{', '.join(report['deferred_modules_loaded'])}",
+              file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
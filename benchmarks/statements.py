@@ -0,0 +1,173 @@
+"""
+Python-side cost of building and compiling the hot read queries.
+
+For get_posts, get_comments and get_comment_analytics compares building
+the select() chain on every request (as before the statement templates)
+with reusing the cached template, per request:
+
+  build:   constructing the statement
+  key:     building it and computing the SQL cache key SQLAlchemy looks
+           the compiled form up with
+  execute: the whole round trip against empty tables in in-memory SQLite
+
+    python -m benchmarks.statements --iterations 5000 -o statements.json
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+
+def legacy_posts(fields, sort_by, sort_order, superuser, offset, limit):
+    from sqlalchemy import asc, desc, select
+
+    from app import models
+
+    query = select(*(getattr(models.Post, field) for field in fields))
+    if not superuser:
+        query = query.where(models.Post.is_blocked == False)
+    if sort_by:
+        if sort_by == "title":
+            order = asc(models.Post.title) if sort_order == "asc" else desc(
+                models.Post.title)
+        else:
+            order = asc(
+                models.Post.created_at) if sort_order == "asc" else desc(
+                models.Post.created_at)
+        query = query.order_by(order)
+    return query.offset(offset).limit(limit)
+
+
+def legacy_comments(fields, post_id, sort_by, sort_order, superuser,
+                    offset, limit):
+    from sqlalchemy import asc, desc, select
+
+    from app import models
+
+    query = select(
+        *(getattr(models.Comment, field) for field in fields)
+    ).where(models.Comment.post_id == post_id)
+    if not superuser:
+        query = query.where(models.Comment.is_blocked == False)
+    if sort_by:
+        if sort_by == "author_id":
+            order = asc(models.Comment.author_id) if sort_order == "asc" \
+                else desc(models.Comment.author_id)
+        else:
+            order = asc(
+                models.Comment.created_at) if sort_order == "asc" else desc(
+                models.Comment.created_at)
+        query = query.order_by(order)
+    return query.offset(offset).limit(limit)
+
+
+def legacy_analytics(date_from, date_to, sort_order, offset, limit):
+    from sqlalchemy import Integer, asc, desc, func, select
+
+    from app import models
+
+    order = asc("date") if sort_order == "asc" else desc("date")
+    return (
+        select(
+            func.date(models.Comment.created_at).label("date"),
+            func.count(models.Comment.id).label("total_comments"),
+            func.sum(func.cast(models.Comment.is_blocked, Integer)).label(
+                "blocked_comments")
+        )
+        .where(
+            func.date(models.Comment.created_at).between(date_from, date_to)
+        ).group_by("date")
+        .order_by(order)
+    ).offset(offset).limit(limit)
+
+
+def per_call_us(func, iterations: int) -> float:
+    started = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    return round((time.perf_counter() - started) / iterations * 1e6, 2)
+
+
+def main(args: argparse.Namespace) -> dict:
+    from sqlalchemy import create_engine
+
+    # app.database has to be imported before app.models
+    import app.database  # noqa: F401
+    from app import crud
+    from app.models import Base
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+
+    today = str(date.today())
+    cases = {
+        "get_posts": (
+            lambda i: legacy_posts(crud.POST_FIELDS, "date", "desc", False,
+                                   i % 50, 10),
+            lambda i: (crud.posts_statement(crud.POST_FIELDS, "date", "desc",
+                                            False),
+                       {"offset": i % 50, "limit": 10}),
+        ),
+        "get_comments": (
+            lambda i: legacy_comments(crud.COMMENT_FIELDS, i % 100,
+                                      "created_at", "asc", False, 0, 10),
+            lambda i: (crud.comments_statement(crud.COMMENT_FIELDS,
+                                               "created_at", "asc", False),
+                       {"post_id": i % 100, "offset": 0, "limit": 10}),
+        ),
+        "get_comment_analytics": (
+            lambda i: legacy_analytics("2024-01-01", today, "desc", 0, 10),
+            lambda i: (crud.analytics_statement("desc"),
+                       {"date_from": date(2024, 1, 1),
+                        "date_to": date.today(), "offset": 0, "limit": 10}),
+        ),
+    }
+
+    results = {}
+    with engine.connect() as conn:
+        for name, (legacy, cached) in cases.items():
+            def legacy_execute(i):
+                conn.execute(legacy(i)).all()
+
+            def cached_execute(i):
+                conn.execute(*cached(i)).all()
+
+            result = {
+                "before": {
+                    "build_us": per_call_us(legacy, args.iterations),
+                    "key_us": per_call_us(
+                        lambda i: legacy(i)._generate_cache_key(),
+                        args.iterations),
+                    "execute_us": per_call_us(legacy_execute,
+                                              args.iterations),
+                },
+                "after": {
+                    "build_us": per_call_us(cached, args.iterations),
+                    "key_us": per_call_us(
+                        lambda i: cached(i)[0]._generate_cache_key(),
+                        args.iterations),
+                    "execute_us": per_call_us(cached_execute,
+                                              args.iterations),
+                },
+            }
+            results[name] = result
+            print(f"{name:<22} {result}", file=sys.stderr)
+
+    return {"meta": {"iterations": args.iterations}, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("-o", "--output",
+                        help="Write the JSON report here instead of stdout")
+    arguments = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench_db")
+    os.environ.setdefault("DATABASE_ECHO", "false")
+    os.environ.setdefault("JWT_SECRET", "benchmark")
+
+    from benchmarks.api import write_report
+
+    write_report(main(arguments), arguments.output)
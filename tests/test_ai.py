@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from app.ai.providers import AIBackendError, LocalBackend, create_backend
+
+
+def test_local_backend_is_deterministic():
+    backend = LocalBackend(flagged_terms=["hate"])
+
+    assert backend.is_harmful("I hate Mondays") == True
+    assert backend.is_harmful("I love Mondays") == False
+    assert backend.generate_replies("Post", ["hi", "yo"]) == [
+        backend.reply, backend.reply]
+    assert backend.calls == 3
+
+
+def test_local_backend_latency():
+    backend = LocalBackend(latency=0.05)
+
+    started = time.perf_counter()
+    backend.is_harmful("text")
+
+    assert time.perf_counter() - started >= 0.05
+
+
+def test_local_backend_error_rate():
+    failing = LocalBackend(error_rate=1.0)
+    with pytest.raises(AIBackendError):
+        failing.generate_replies("Post", ["hi"])
+
+    first = LocalBackend(error_rate=0.5, seed=1)
+    second = LocalBackend(error_rate=0.5, seed=1)
+    outcomes = []
+    for backend in (first, second):
+        failures = 0
+        for _ in range(20):
+            try:
+                backend.is_harmful("text")
+            except AIBackendError:
+                failures += 1
+        outcomes.append(failures)
+
+    assert outcomes[0] == outcomes[1]  # Same seed, same failures
+    assert 0 < outcomes[0] < 20
+
+
+def test_local_backend_max_rps():
+    backend = LocalBackend(max_rps=2)
+
+    backend.is_harmful("text")
+    backend.is_harmful("text")
+    with pytest.raises(AIBackendError):
+        backend.is_harmful("text")
+
+
+def test_create_unknown_backend():
+    with pytest.raises(ValueError):
+        create_backend("unknown")
+
+
+def test_app_import_does_not_load_gemini_sdk():
+    env = dict(os.environ, AI_BACKEND="gemini")
+    env.pop("GEMINI_API_KEY", None)  # The app must import without a key
+
+    completed = subprocess.run(
+        [sys.executable, "-c",
+         "import sys, app.main; "
+         "sys.exit('google.generativeai' in sys.modules)"],
+        env=env,
+    )
+
+    assert completed.returncode == 0
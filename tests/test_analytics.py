@@ -1,7 +1,14 @@
+from datetime import datetime, timedelta
+
 import pytest
 
 from httpx import AsyncClient
 
+from app import metrics
+from app.commenter_sketches import RELATIVE_ERROR, estimate, register_rank
+from app.models import Comment
+from tests.conftest import async_session_maker
+
 
 async def test_user_can_not_read_analytics(register_and_login_user, ac: AsyncClient):
     response = await ac.get(f"/comments-daily-breakdown/", cookies=register_and_login_user)
@@ -41,3 +48,115 @@ async def test_read_analytics_sorting(create_and_login_admin, ac: AsyncClient, s
     sorted_data = sorted(data, key=lambda x: x["date"], reverse=(sort_order == "desc"))
 
     assert data == sorted_data, f"Analytics should be sorted in {sort_order} order"
+
+
+async def test_analytics_rollups_follow_comment_writes(create_and_login_admin,
+                                                       ac: AsyncClient):
+    async def today(path: str, **filters) -> dict:
+        response = await ac.get(path, params={"limit": 1, **filters},
+                                cookies=create_and_login_admin)
+        assert response.status_code == 200
+        return response.json()[0] if response.json() else {
+            "total_comments": 0, "blocked_comments": 0}
+
+    before = await today("/comments-daily-breakdown/", post_id=2)
+
+    response = await ac.post("/posts/2/comments/",
+                             cookies=create_and_login_admin,
+                             json={"content": "Full of hate"})
+    comment = response.json()
+    author_id = comment["author_id"]
+
+    after = await today("/comments-daily-breakdown/", post_id=2)
+    assert after["total_comments"] == before["total_comments"] + 1
+    assert after["blocked_comments"] == before["blocked_comments"] + 1
+    hourly = await today("/comments-hourly-breakdown/", post_id=2,
+                         author_id=author_id)
+    assert hourly["total_comments"] >= 1
+    assert hourly["blocked_comments"] >= 1
+
+    await ac.put(f"/comments/{comment['id']}/",
+                 cookies=create_and_login_admin, json={"content": "Kind"})
+    after = await today("/comments-daily-breakdown/", post_id=2)
+    assert after["blocked_comments"] == before["blocked_comments"]
+
+    await ac.delete(f"/comments/{comment['id']}/",
+                    cookies=create_and_login_admin)
+    after = await today("/comments-daily-breakdown/", post_id=2)
+    assert after["total_comments"] == before["total_comments"]
+    assert (await today("/comments-daily-breakdown/",
+                        author_id=author_id))["total_comments"] == 0
+
+
+def test_commenter_sketch_estimates():
+    for count in (1, 100, 5000, 50000):
+        registers: dict[int, int] = {}
+        for author_id in range(count):
+            register, rank = register_rank(author_id)
+            registers[register] = max(registers.get(register, 0), rank)
+
+        assert estimate(registers.values()) == pytest.approx(
+            count, rel=4 * RELATIVE_ERROR)
+
+
+async def test_unique_commenters(create_and_login_admin,
+                                 register_and_login_user, ac: AsyncClient):
+    for cookies in (create_and_login_admin, register_and_login_user,
+                    register_and_login_user):
+        await ac.post("/posts/3/comments/", cookies=cookies,
+                      json={"content": "Counted once per author"})
+
+    response = await ac.get("/comments-unique-commenters/",
+                            params={"post_id": 3},
+                            cookies=create_and_login_admin)
+    assert response.status_code == 200
+    assert response.json()["unique_commenters"] >= 2
+    assert response.json()["relative_error"] == RELATIVE_ERROR
+
+    response = await ac.get("/comments-daily-breakdown/",
+                            params={"post_id": 3, "limit": 1},
+                            cookies=create_and_login_admin)
+    today = response.json()[0]
+    assert 2 <= today["unique_commenters"] <= today["total_comments"]
+
+    response = await ac.get("/comments-unique-commenters/",
+                            cookies=register_and_login_user)
+    assert response.status_code == 403
+
+
+async def test_closed_days_are_cached(create_and_login_admin,
+                                      register_and_login_user,
+                                      ac: AsyncClient):
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    params = {"post_id": 3, "date_from": str(yesterday.date()),
+              "date_to": str(yesterday.date())}
+
+    async def counts() -> tuple[int, int]:
+        response = await ac.get("/comments-daily-breakdown/", params=params,
+                                cookies=create_and_login_admin)
+        assert response.status_code == 200
+        if not response.json():
+            return 0, 0
+        day = response.json()[0]
+        return day["total_comments"], day["blocked_comments"]
+
+    total, blocked = await counts()
+    hits = metrics.analytics_cache_lookups.value("hit")
+    assert await counts() == (total, blocked)
+    assert metrics.analytics_cache_lookups.value("hit") == hits + 1
+
+    # Late writes to the day invalidate it
+    async with async_session_maker() as session:
+        comment = Comment(content="Late comment", post_id=3, author_id=1,
+                          created_at=yesterday)
+        session.add(comment)
+        await session.commit()
+    assert await counts() == (total + 1, blocked)
+
+    await ac.put(f"/comments/{comment.id}/", cookies=register_and_login_user,
+                 json={"content": "Late hate"})
+    assert await counts() == (total + 1, blocked + 1)
+
+    await ac.delete(f"/comments/{comment.id}/",
+                    cookies=register_and_login_user)
+    assert await counts() == (total, blocked)
@@ -0,0 +1,16 @@
+from pwdlib.hashers.bcrypt import BcryptHasher
+
+from app.auth.passwords import hash_password, verify_and_update
+
+
+async def test_hasher_pool_verifies_and_upgrades_hashes():
+    hashed = await hash_password("secret")
+
+    assert await verify_and_update("secret", hashed) == (True, None)
+    assert (await verify_and_update("wrong", hashed))[0] == False
+
+    # Legacy bcrypt hashes still work and are upgraded to argon2
+    verified, updated = await verify_and_update(
+        "secret", BcryptHasher(rounds=4).hash("secret"))
+    assert verified == True
+    assert updated.startswith("$argon2id$")
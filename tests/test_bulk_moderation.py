@@ -0,0 +1,53 @@
+from sqlalchemy import func, select
+
+from app.ai.bulk_moderation import run_job
+from app.ai.providers import LocalBackend, get_backend, set_backend
+from app.models import Comment, ModerationCheckpoint
+from tests.conftest import async_session_maker
+
+
+async def test_bulk_moderation_resumes_from_checkpoint(create_test_data):
+    job = "test-bulk-moderation"
+    backend = get_backend()
+    set_backend(LocalBackend(flagged_terms=["bulkbad"]))
+    try:
+        async with async_session_maker() as session:
+            # Start the job after the existing comments, so only the
+            # comments added below are re-moderated
+            last_id = (await session.execute(
+                select(func.max(Comment.id)))).scalar()
+            session.add(ModerationCheckpoint(
+                job=job, target_type="comment", last_id=last_id
+            ))
+            comments = [
+                Comment(post_id=3, author_id=1, content=content)
+                for content in ("fine", "bulkbad words", "fine too")
+            ]
+            session.add_all(comments)
+            await session.commit()
+
+        # Stop after the first chunk, as if the job was interrupted
+        processed = await run_job(job=job, targets=("comment",),
+                                  chunk_size=2, workers=0, max_chunks=1)
+        assert processed == {"comment": 2}
+
+        processed = await run_job(job=job, targets=("comment",),
+                                  chunk_size=2, workers=0)
+        assert processed == {"comment": 1}
+
+        async with async_session_maker() as session:
+            stored = [await session.get(Comment, comment.id)
+                      for comment in comments]
+            checkpoint = (await session.execute(
+                select(ModerationCheckpoint).where(
+                    ModerationCheckpoint.job == job)
+            )).scalar_one()
+
+        assert [comment.is_blocked for comment in stored] == [
+            False, True, False
+        ]
+        assert all(comment.moderation_version for comment in stored)
+        assert checkpoint.last_id == comments[-1].id
+        assert checkpoint.processed == 3
+    finally:
+        set_backend(backend)
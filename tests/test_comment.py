@@ -1,10 +1,16 @@
+import asyncio
 from time import sleep
 
 import pytest
 from httpx import AsyncClient
 from sqlalchemy import select
 
-from app.models import Post
+from app import metrics
+from app.ai.auto_reply import AutoReplyScheduler, reply_deferred
+from app.ai.providers import LocalBackend, get_backend, set_backend
+from app.models import AutoReplyQueue, Comment, Post
+from app.pubsub import get_broker, post_channel
+from app.routers.comment import comment_event_stream
 from tests.conftest import async_session_maker
 
 
@@ -194,3 +200,167 @@ async def test_auto_reply(register_and_login_user, ac: AsyncClient):
     reply = comments[-1]
     assert reply["parent_id"] == comment_id
     assert len(reply["content"]) >= 0
+
+
+async def test_auto_replies_are_coalesced(register_and_login_user,
+                                          ac: AsyncClient):
+    post_id = 3
+    async with async_session_maker() as session:
+        post = await session.get(Post, post_id)
+        post.auto_reply = True
+        post.auto_reply_delay = 1
+        await session.commit()
+
+    backend = get_backend()
+    model = LocalBackend(reply="Coalesced reply")
+    set_backend(model)
+    try:
+        responses = await asyncio.gather(*(
+            ac.post(
+                f"/posts/{post_id}/comments/",
+                cookies=register_and_login_user,
+                json={"content": f"Burst comment {i}"}
+            )
+            for i in range(3)
+        ))
+    finally:
+        set_backend(backend)
+        async with async_session_maker() as session:
+            post = await session.get(Post, post_id)
+            post.auto_reply = False
+            await session.commit()
+
+    comment_ids = {response.json()["id"] for response in responses}
+    # One moderation call per comment and one request for all replies
+    assert model.calls == 4
+
+    async with async_session_maker() as session:
+        replies = (await session.execute(
+            select(Comment).where(Comment.parent_id.in_(comment_ids))
+        )).scalars().all()
+    assert {reply.parent_id for reply in replies} == comment_ids
+    assert {reply.content for reply in replies} == {"Coalesced reply"}
+
+
+async def test_auto_reply_overflow_policies():
+    post_id = 3
+    async with async_session_maker() as session:
+        post = await session.get(Post, post_id)
+        post.auto_reply = True
+        comments = [Comment(post_id=post_id, author_id=1,
+                            content=f"Overflow comment {i}")
+                    for i in range(4)]
+        session.add_all(comments)
+        await session.commit()
+
+    backend = get_backend()
+    set_backend(LocalBackend(reply="Model reply"))
+    try:
+        canned = AutoReplyScheduler(max_queue_per_post=1, policy="canned")
+        await asyncio.gather(canned.submit(post, comments[0], 0.1),
+                             canned.submit(post, comments[1], 0.1))
+        assert metrics.auto_reply_overflows.value("canned", "post") == 1
+        assert canned.queued == 0
+
+        deferred = AutoReplyScheduler(max_queue_per_post=1, policy="defer")
+        await asyncio.gather(deferred.submit(post, comments[2], 0.1),
+                             deferred.submit(post, comments[3], 0.1))
+        async with async_session_maker() as session:
+            queue = (await session.execute(
+                select(AutoReplyQueue.comment_id))).scalars().all()
+        assert queue == [comments[3].id]
+
+        assert await reply_deferred() == 1
+    finally:
+        set_backend(backend)
+        async with async_session_maker() as session:
+            post = await session.get(Post, post_id)
+            post.auto_reply = False
+            await session.commit()
+
+    async with async_session_maker() as session:
+        replies = (await session.execute(
+            select(Comment.parent_id, Comment.content)
+            .where(Comment.parent_id.in_([c.id for c in comments]))
+            .order_by(Comment.parent_id)
+        )).all()
+    assert [content for _, content in replies] == [
+        "Model reply", "Thanks for your comment!", "Model reply", "Model reply"
+    ]
+
+
+async def test_read_comments_sparse_fields(register_and_login_user,
+                                           ac: AsyncClient):
+    response = await ac.get(
+        "/posts/2/comments/",
+        params={"fields": "id,content_preview"},
+        cookies=register_and_login_user,
+    )
+
+    assert response.status_code == 200
+    assert response.json()
+    assert all(set(comment) == {"id", "content_preview"}
+               for comment in response.json())
+
+
+async def test_comment_event_stream(register_and_login_user, ac: AsyncClient):
+    # The test client buffers streaming responses, read the stream directly
+    events = comment_event_stream(
+        get_broker().subscribe(post_channel(2)), show_blocked=False,
+        keepalive=0.05
+    )
+    assert await anext(events) == ": keepalive\n\n"
+
+    response = await ac.post("/posts/2/comments/",
+                             cookies=register_and_login_user,
+                             json={"content": "Streamed comment"})
+    comment_id = response.json()["id"]
+    created = await asyncio.wait_for(anext(events), 1)
+    assert created.startswith("event: comment_created\n")
+    assert '"content":"Streamed comment"' in created
+
+    # Blocked by the edit, so it disappears for regular readers
+    await ac.put(f"/comments/{comment_id}/", cookies=register_and_login_user,
+                 json={"content": "Full of hate"})
+    assert await asyncio.wait_for(anext(events), 1) == (
+        "event: comment_deleted\n"
+        f'data: {{"id":{comment_id},"post_id":2}}\n\n'
+    )
+
+    await ac.delete(f"/comments/{comment_id}/",
+                    cookies=register_and_login_user)
+    deleted = await asyncio.wait_for(anext(events), 1)
+    assert deleted.startswith("event: comment_deleted\n")
+
+    await events.aclose()
+    assert metrics.pubsub_subscribers.value() == 0
+
+
+async def test_stream_comments_of_missing_post(register_and_login_user,
+                                               ac: AsyncClient):
+    response = await ac.get("/posts/999/comments/stream",
+                            cookies=register_and_login_user)
+
+    assert response.status_code == 404
+
+
+async def test_read_comments_by_ids(register_and_login_user,
+                                    ac: AsyncClient):
+    ids = []
+    for content in ("Parent", "Parent with hate"):
+        response = await ac.post("/posts/2/comments/",
+                                 cookies=register_and_login_user,
+                                 json={"content": content})
+        ids.append(response.json()["id"])
+
+    response = await ac.get(
+        "/comments/",
+        params={"ids": f"{ids[1]},{ids[0]},999999", "fields": "id,content"},
+        cookies=register_and_login_user,
+    )
+
+    assert response.status_code == 200
+    assert response.json() == [{"id": ids[0], "content": "Parent"}]
+
+    response = await ac.get("/comments/", cookies=register_and_login_user)
+    assert response.status_code == 400
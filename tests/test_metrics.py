@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import metrics
+from app.ai.providers import LocalBackend, get_backend, set_backend
+from app.database import engine
+from app.loop_monitor import LoopLagMonitor
+
+
+async def test_server_timing_header(register_and_login_user, ac: AsyncClient):
+    response = await ac.get("/posts/", cookies=register_and_login_user)
+
+    assert response.status_code == 200
+    server_timing = response.headers["server-timing"]
+    assert "total;dur=" in server_timing
+    assert "db;dur=" in server_timing
+    assert "ai;dur=" in server_timing
+
+
+async def test_metrics_endpoint(register_and_login_user, ac: AsyncClient):
+    await ac.get("/posts/1", cookies=register_and_login_user)
+    await ac.post(
+        "/posts/1/comments/",
+        cookies=register_and_login_user,
+        json={"content": "Comment for the metrics"}
+    )
+
+    response = await ac.get("/metrics")
+
+    assert response.status_code == 200
+    metrics = response.text
+    assert 'http_requests_total{method="GET",route="/posts/{post_id}",status="200"}' in metrics
+    assert 'db_statements_total{route="/posts/{post_id}"}' in metrics
+    assert 'ai_calls_total{kind="moderation"}' in metrics
+    assert "http_request_duration_seconds_bucket" in metrics
+
+
+async def test_background_tasks_are_not_timed_with_the_request(
+        register_and_login_user, ac: AsyncClient):
+    response = await ac.post("/posts/", cookies=register_and_login_user,
+                             json={"title": "Slow replies", "content": "Body",
+                                   "auto_reply": True, "auto_reply_delay": 1})
+    post_id = response.json()["id"]
+    labels = ("POST", "/posts/{post_id}/comments/")
+    duration = metrics.http_request_duration.sum(*labels)
+    background = metrics.db_statements.value("background")
+
+    backend = get_backend()
+    set_backend(LocalBackend(reply="Thanks"))
+    try:
+        # The auto-reply runs after the response, a second later
+        await ac.post(f"/posts/{post_id}/comments/",
+                      cookies=register_and_login_user,
+                      json={"content": "Nice"})
+    finally:
+        set_backend(backend)
+        await ac.delete(f"/posts/{post_id}", cookies=register_and_login_user)
+
+    assert metrics.http_request_duration.sum(*labels) - duration < 0.5
+    # The reply's statements aren't counted against the request
+    assert metrics.db_statements.value("background") > background
+
+
+async def test_failed_statements_leave_no_timing_behind():
+    async with engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            await connection.execute(text("SELECT * FROM missing_table"))
+        await connection.execute(text("SELECT 1"))
+
+        assert connection.info.get("query_started") == []
+
+
+def block_the_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+async def test_loop_lag_monitor_reports_blocking_calls():
+    monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+    stalls = metrics.event_loop_stalls.value()
+    lags = metrics.event_loop_lag.count()
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        block_the_loop(0.3)
+        await asyncio.sleep(0.05)
+    finally:
+        monitor.stop()
+
+    assert metrics.event_loop_stalls.value() == stalls + 1
+    assert "block_the_loop" in monitor.last_stack
+    assert metrics.event_loop_lag.count() > lags
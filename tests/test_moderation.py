@@ -0,0 +1,240 @@
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.ai.circuit_breaker import (CLOSED, OPEN, CircuitBreaker,
+                                    CircuitOpenError)
+from app.ai.moderation import (ask_model_chunked, moderation_breaker,
+                               split_text)
+from app.ai import providers
+from app.ai.providers import LocalBackend, get_backend, set_backend
+from app.ai.remoderation import remoderate_pending
+from app.models import Comment, ModerationQueue
+from tests.conftest import async_session_maker
+
+
+def fail():
+    raise RuntimeError("Model is down")
+
+
+async def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(lambda: True)
+
+
+async def test_breaker_half_open_trial_closes_it():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    with pytest.raises(RuntimeError):
+        await breaker.call(fail)
+
+    await asyncio.sleep(0.06)
+
+    assert await breaker.call(lambda: True) == True
+    assert breaker.state == CLOSED
+
+
+async def test_breaker_counts_timeouts_as_failures():
+    breaker = CircuitBreaker("test", failure_threshold=1, call_timeout=0.05)
+
+    with pytest.raises(TimeoutError):
+        await breaker.call(time.sleep, 0.2)
+
+    assert breaker.state == OPEN
+
+
+async def test_breaker_calls_do_not_block_the_loop():
+    breaker = CircuitBreaker("test", call_timeout=1.0)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    try:
+        await breaker.call(time.sleep, 0.2)
+    finally:
+        ticker.cancel()
+
+    assert ticks >= 5
+
+
+async def test_breaker_doesnt_time_out_calls_waiting_for_a_worker():
+    breaker = CircuitBreaker("test", failure_threshold=1, call_timeout=0.3,
+                             max_workers=1)
+
+    # Each call is quick, the third only starts after 0.4s in the queue
+    assert await asyncio.gather(*(
+        breaker.call(lambda: time.sleep(0.2) or True) for _ in range(3)
+    )) == [True] * 3
+    assert breaker.state == CLOSED
+
+
+async def test_breaker_batch_has_one_deadline():
+    breaker = CircuitBreaker("test", failure_threshold=1, call_timeout=0.3)
+
+    # Each call is within the timeout, the batch as a whole is not
+    with pytest.raises(TimeoutError):
+        await breaker.call_any(lambda delay: time.sleep(delay) or False,
+                               [0.2] * 3, concurrency=1)
+
+    assert breaker.state == OPEN
+
+
+async def test_breaker_batch_is_capped_at_the_pool_size():
+    breaker = CircuitBreaker("test", max_workers=2)
+    running = peak = 0
+
+    def check(_):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        time.sleep(0.05)
+        running -= 1
+        return False
+
+    assert not await breaker.call_any(check, range(6), concurrency=10)
+    assert peak <= 2
+
+
+def test_split_text_overlaps_chunks():
+    text = "".join(str(i % 10) for i in range(100))
+
+    chunks = split_text(text, size=40, overlap=10)
+
+    assert [len(chunk) for chunk in chunks] == [40, 40, 40]
+    assert all(previous[-10:] == chunk[:10]
+               for previous, chunk in zip(chunks, chunks[1:]))
+    assert split_text("short", size=40, overlap=10) == ["short"]
+
+
+async def test_chunked_moderation_stops_at_first_harmful_chunk():
+    backend = get_backend()
+    model = LocalBackend(flagged_terms=["hate"])
+    set_backend(model)
+    moderation_breaker.reset()
+    try:
+        text = "I hate you. " + "All good here. " * 100
+
+        assert await ask_model_chunked(text, size=100, overlap=20,
+                                       concurrency=2)
+        # The flagged chunk is the first, the rest are never sent
+        assert model.calls < len(split_text(text, size=100, overlap=20)) / 2
+        assert not await ask_model_chunked("All good here. " * 100,
+                                           size=100, overlap=20,
+                                           concurrency=2)
+    finally:
+        set_backend(backend)
+
+
+@pytest.fixture
+def failing_model():
+    backend = get_backend()
+    set_backend(LocalBackend(error_rate=1.0))
+    moderation_breaker.reset()
+    yield
+    set_backend(backend)
+    moderation_breaker.reset()
+
+
+async def test_outage_comment_is_queued_and_remoderated(
+        failing_model, register_and_login_user, ac: AsyncClient
+):
+    post_id = 2
+    content = "Written during the outage"
+
+    response = await ac.post(
+        f"/posts/{post_id}/comments/",
+        cookies=register_and_login_user,
+        json={"content": content}
+    )
+
+    assert response.status_code == 201
+    assert response.json()["is_blocked"] == False  # Fail-open by default
+    comment_id = response.json()["id"]
+
+    async with async_session_maker() as session:
+        queued = (await session.execute(
+            select(ModerationQueue).where(
+                ModerationQueue.target_type == "comment",
+                ModerationQueue.target_id == comment_id
+            )
+        )).scalar_one_or_none()
+    assert queued is not None
+
+    # The model is back and considers the comment harmful
+    set_backend(LocalBackend(flagged_terms=["outage"]))
+    moderation_breaker.reset()
+
+    assert await remoderate_pending() >= 1
+
+    async with async_session_maker() as session:
+        comment = await session.get(Comment, comment_id)
+        queue = (await session.execute(select(ModerationQueue))).all()
+    assert comment.is_blocked == True
+    assert queue == []
+
+
+async def test_open_breaker_skips_the_model(
+        failing_model, register_and_login_user, ac: AsyncClient
+):
+    moderation_breaker.record_failure()
+    moderation_breaker.state = OPEN
+    moderation_breaker.opened_at = time.monotonic()
+    backend = LocalBackend(latency=1.0)
+    set_backend(backend)
+
+    started = time.perf_counter()
+    response = await ac.post(
+        "/posts/2/comments/",
+        cookies=register_and_login_user,
+        json={"content": "Fuck this shit"}
+    )
+
+    assert time.perf_counter() - started < 1.0
+    assert backend.calls == 0
+    assert response.json()["is_blocked"] == True  # Local profanity verdict
+
+
+async def test_backend_that_fails_to_build_falls_back(
+        monkeypatch, register_and_login_user, ac: AsyncClient
+):
+    def create_backend():
+        raise RuntimeError("GEMINI_API_KEY is not set")
+
+    monkeypatch.setattr(providers, "create_backend", create_backend)
+    monkeypatch.setattr(providers, "_backend", None)
+    moderation_breaker.reset()
+    try:
+        response = await ac.post(
+            "/posts/2/comments/",
+            cookies=register_and_login_user,
+            json={"content": "Written without a model"}
+        )
+    finally:
+        moderation_breaker.reset()
+
+    assert response.status_code == 201
+    assert response.json()["is_blocked"] == False
+    async with async_session_maker() as session:
+        comment = await session.get(Comment, response.json()["id"])
+        queued = (await session.execute(
+            select(ModerationQueue).where(
+                ModerationQueue.target_type == "comment",
+                ModerationQueue.target_id == comment.id
+            )
+        )).scalar_one_or_none()
+    assert comment.moderation_version is None
+    assert queued is not None
@@ -1,5 +1,17 @@
+from datetime import datetime, timedelta
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.ai.providers import LocalBackend, get_backend, set_backend
+from app import archive
+from app.archive import run as archive_comments
+from app.models import Comment, PostScore
+from app.post_cache import post_cache
+from app.trending import renormalize
+from app.view_counter import view_counter
+from tests.conftest import async_session_maker
 
 
 async def test_user_read_posts_default_params(register_and_login_user, ac: AsyncClient):
@@ -156,3 +168,355 @@ async def test_post_with_hate(register_and_login_user, ac: AsyncClient):
     assert response.json()["title"] == title
     assert response.json()["content"] == content
     assert response.json()["is_blocked"] == True, "Hateful post could not be blocked, if you don`t have access to Gemini"
+
+
+async def test_settings_only_update_skips_moderation(register_and_login_user, ac: AsyncClient):
+    title = "Post with stable text"
+    content = "Only the auto reply settings of this post change"
+
+    backend = get_backend()
+    counting_backend = LocalBackend()
+    set_backend(counting_backend)
+    try:
+        response = await ac.post(
+            "/posts/",
+            cookies=register_and_login_user,
+            json={"title": title, "content": content}
+        )
+        post_id = response.json()["id"]
+        assert counting_backend.calls == 1
+
+        response = await ac.put(
+            f"/posts/{post_id}",
+            cookies=register_and_login_user,
+            json={"title": title, "content": content,
+                  "auto_reply": True, "auto_reply_delay": 5}
+        )
+        assert response.status_code == 200
+        assert response.json()["auto_reply"] == True
+        assert counting_backend.calls == 1  # Text unchanged, no model call
+
+        response = await ac.put(
+            f"/posts/{post_id}",
+            cookies=register_and_login_user,
+            json={"title": title, "content": "New text"}
+        )
+        assert response.status_code == 200
+        assert counting_backend.calls == 2
+    finally:
+        set_backend(backend)
+
+
+async def test_read_posts_sparse_fields(register_and_login_user,
+                                        ac: AsyncClient):
+    content = "Long body " * 100
+    response = await ac.post(
+        "/posts/",
+        cookies=register_and_login_user,
+        json={"title": "Long post", "content": content}
+    )
+    post_id = response.json()["id"]
+    assert response.json()["content_preview"] == content[:199] + "…"
+
+    response = await ac.get(
+        "/posts/",
+        params={"fields": "id,title,content_preview",
+                "sort_by": "date", "sort_order": "desc", "limit": 1},
+        cookies=register_and_login_user,
+    )
+    assert response.status_code == 200
+    assert response.json() == [{"id": post_id, "title": "Long post",
+                                "content_preview": content[:199] + "…"}]
+
+    response = await ac.get("/posts/", params={"fields": "id,password"},
+                            cookies=register_and_login_user)
+    assert response.status_code == 400
+
+
+async def test_list_rows_match_the_response_model(register_and_login_user,
+                                                  ac: AsyncClient):
+    response = await ac.get("/posts/", params={"limit": 3},
+                            cookies=register_and_login_user)
+
+    for post in response.json():
+        single = await ac.get(f"/posts/{post['id']}",
+                              cookies=register_and_login_user)
+        assert post == single.json()
+
+
+async def test_post_metadata_cache(register_and_login_user, ac: AsyncClient):
+    response = await ac.post(
+        "/posts/",
+        cookies=register_and_login_user,
+        json={"title": "Cached post", "content": "Cached content"}
+    )
+    post_id = response.json()["id"]
+
+    for _ in range(2):
+        response = await ac.post(
+            f"/posts/{post_id}/comments/",
+            cookies=register_and_login_user,
+            json={"content": "Comment on a cached post"}
+        )
+        assert response.status_code == 201
+    assert post_cache.get(post_id).auto_reply == False
+
+    response = await ac.put(
+        f"/posts/{post_id}",
+        cookies=register_and_login_user,
+        json={"title": "Cached post", "content": "Cached content",
+              "auto_reply": True}
+    )
+    assert response.status_code == 200
+    assert post_cache.get(post_id) is None  # Invalidated by the update
+
+    response = await ac.get(f"/posts/{post_id}/comments/",
+                            cookies=register_and_login_user)
+    assert response.status_code == 200
+    assert post_cache.get(post_id).auto_reply == True
+
+    response = await ac.delete(f"/posts/{post_id}",
+                               cookies=register_and_login_user)
+    assert response.status_code == 204
+    assert post_cache.get(post_id) is None
+    response = await ac.post(
+        f"/posts/{post_id}/comments/",
+        cookies=register_and_login_user,
+        json={"content": "Comment on a deleted post"}
+    )
+    assert response.status_code == 404
+
+
+async def test_read_posts_by_ids_with_comments(register_and_login_user,
+                                               ac: AsyncClient):
+    response = await ac.post("/posts/", cookies=register_and_login_user,
+                             json={"title": "Batched", "content": "Body"})
+    post_id = response.json()["id"]
+    comment_ids = []
+    for content in ("First", "Full of hate", "Second", "Third"):
+        response = await ac.post(f"/posts/{post_id}/comments/",
+                                 cookies=register_and_login_user,
+                                 json={"content": content})
+        comment_ids.append(response.json()["id"])
+
+    response = await ac.get(
+        "/posts/",
+        params={"ids": f"{post_id},1,999999", "include": "comments",
+                "comments_limit": 2},
+        cookies=register_and_login_user,
+    )
+    assert response.status_code == 200
+    posts = {post["id"]: post for post in response.json()}
+    assert set(posts) == {1, post_id}
+    # Blocked comments don't count towards the limit
+    assert [comment["content"] for comment in posts[post_id]["comments"]] \
+        == ["First", "Second"]
+    assert all(comment["post_id"] == 1 for comment in posts[1]["comments"])
+
+    response = await ac.get(
+        "/posts/",
+        params={"ids": str(post_id), "fields": "title",
+                "include": "comments", "comments_limit": 1},
+        cookies=register_and_login_user,
+    )
+    assert response.json() == [{"title": "Batched", "comments": [
+        (await ac.get(f"/comments/{comment_ids[0]}/",
+                      cookies=register_and_login_user)).json()
+    ]}]
+
+    response = await ac.get("/posts/", params={"ids": "1,x"},
+                            cookies=register_and_login_user)
+    assert response.status_code == 400
+
+
+async def test_trending_posts(register_and_login_user, ac: AsyncClient):
+    post_ids = []
+    for title, comments in (("Quiet", 1), ("Busy", 3)):
+        response = await ac.post("/posts/", cookies=register_and_login_user,
+                                 json={"title": title, "content": "Body"})
+        post_ids.append(response.json()["id"])
+        for _ in range(comments):
+            await ac.post(f"/posts/{post_ids[-1]}/comments/",
+                          cookies=register_and_login_user,
+                          json={"content": "Nice"})
+
+    async def scores() -> list[float]:
+        response = await ac.get("/posts/trending", params={"limit": 100},
+                                cookies=register_and_login_user)
+        assert response.status_code == 200
+        trending = {post["id"]: post for post in response.json()}
+        return [trending[post_id]["score"] for post_id in post_ids]
+
+    quiet, busy = await scores()
+    assert busy > quiet
+    assert quiet == pytest.approx(1, rel=1e-3)
+    assert busy == pytest.approx(3, rel=1e-3)
+
+    # Moving the epoch forward rescales the stored scores only
+    await renormalize(datetime.utcnow() + timedelta(hours=1))
+    assert await scores() == pytest.approx([quiet, busy], rel=1e-3)
+    await renormalize()
+
+
+async def test_trending_drops_deleted_and_blocked_comments(
+        register_and_login_user, ac: AsyncClient):
+    response = await ac.post("/posts/", cookies=register_and_login_user,
+                             json={"title": "Fading", "content": "Body"})
+    post_id = response.json()["id"]
+    comment_ids = []
+    for _ in range(3):
+        response = await ac.post(f"/posts/{post_id}/comments/",
+                                 cookies=register_and_login_user,
+                                 json={"content": "Nice"})
+        comment_ids.append(response.json()["id"])
+
+    async def score() -> float:
+        response = await ac.get("/posts/trending", params={"limit": 100},
+                                cookies=register_and_login_user)
+        return {post["id"]: post["score"]
+                for post in response.json()}[post_id]
+
+    backend = get_backend()
+    set_backend(LocalBackend(flagged_terms=["hate"]))
+    try:
+        response = await ac.delete(f"/comments/{comment_ids[0]}/",
+                                   cookies=register_and_login_user)
+        assert response.status_code == 204
+        response = await ac.put(f"/comments/{comment_ids[1]}/",
+                                cookies=register_and_login_user,
+                                json={"content": "I hate this"})
+        assert response.json()["is_blocked"] == True
+        assert await score() == pytest.approx(1, rel=1e-3)
+
+        response = await ac.put(f"/comments/{comment_ids[1]}/",
+                                cookies=register_and_login_user,
+                                json={"content": "Nice again"})
+        assert response.json()["is_blocked"] == False
+        assert await score() == pytest.approx(2, rel=1e-3)
+    finally:
+        set_backend(backend)
+
+    await ac.delete(f"/posts/{post_id}", cookies=register_and_login_user)
+    async with async_session_maker() as session:
+        assert await session.get(PostScore, post_id) is None
+
+
+async def test_deleting_an_auto_reply_keeps_the_comment_score(
+        register_and_login_user, ac: AsyncClient):
+    response = await ac.post("/posts/", cookies=register_and_login_user,
+                             json={"title": "Answered", "content": "Body",
+                                   "auto_reply": True})
+    post_id = response.json()["id"]
+
+    backend = get_backend()
+    set_backend(LocalBackend(reply="Thanks"))
+    try:
+        response = await ac.post(f"/posts/{post_id}/comments/",
+                                 cookies=register_and_login_user,
+                                 json={"content": "Nice"})
+    finally:
+        set_backend(backend)
+    async with async_session_maker() as session:
+        reply = (await session.execute(
+            select(Comment).where(Comment.parent_id == response.json()["id"])
+        )).scalar_one()
+
+    response = await ac.delete(f"/comments/{reply.id}/",
+                               cookies=register_and_login_user)
+    assert response.status_code == 204
+    response = await ac.get("/posts/trending", params={"limit": 100},
+                            cookies=register_and_login_user)
+    scores = {post["id"]: post["score"] for post in response.json()}
+    assert scores[post_id] == pytest.approx(1, rel=1e-3)
+
+
+async def test_post_views_are_flushed_in_batches(register_and_login_user,
+                                                 ac: AsyncClient):
+    response = await ac.post("/posts/", cookies=register_and_login_user,
+                             json={"title": "Viewed", "content": "Body"})
+    post_id = response.json()["id"]
+    assert response.json()["view_count"] == 0
+
+    for _ in range(3):
+        response = await ac.get(f"/posts/{post_id}",
+                                cookies=register_and_login_user)
+    # Not written until the next flush
+    assert response.json()["view_count"] == 0
+    assert view_counter.pending(post_id) == 3
+
+    assert await view_counter.flush() >= 1
+    assert view_counter.pending(post_id) == 0
+    response = await ac.get(f"/posts/{post_id}",
+                            cookies=register_and_login_user)
+    assert response.json()["view_count"] == 3
+
+
+async def test_archived_comments_are_still_read(register_and_login_user,
+                                                ac: AsyncClient):
+    response = await ac.post("/posts/", cookies=register_and_login_user,
+                             json={"title": "Old news", "content": "Body"})
+    post_id = response.json()["id"]
+
+    last_year = datetime.utcnow() - timedelta(days=365)
+    async with async_session_maker() as session:
+        comment = Comment(content="First", post_id=post_id, author_id=1,
+                          created_at=last_year)
+        session.add(comment)
+        await session.flush()
+        reply = Comment(content="Reply", post_id=post_id, author_id=1,
+                        parent_id=comment.id, created_at=last_year)
+        session.add(reply)
+        await session.commit()
+
+    assert await archive_comments(after_days=30, chunk_size=1,
+                                  flag_delay=0) == 2
+    async with async_session_maker() as session:
+        assert await session.get(Comment, comment.id) is None
+
+    response = await ac.get(f"/posts/{post_id}/comments/",
+                            params={"sort_by": "created_at",
+                                    "fields": "id,content"},
+                            cookies=register_and_login_user)
+    assert response.status_code == 200
+    assert sorted(row["content"] for row in response.json()) == [
+        "First", "Reply"]
+
+    response = await ac.get(f"/comments/{reply.id}/",
+                            cookies=register_and_login_user)
+    assert response.status_code == 200
+    assert response.json()["parent_id"] == comment.id
+
+    # Archived comments are read-only
+    response = await ac.delete(f"/comments/{reply.id}/",
+                               cookies=register_and_login_user)
+    assert response.status_code == 404
+
+
+async def test_reply_racing_the_archive_keeps_its_parent(
+        monkeypatch, register_and_login_user, ac: AsyncClient):
+    response = await ac.post("/posts/", cookies=register_and_login_user,
+                             json={"title": "Old thread", "content": "Body"})
+    post_id = response.json()["id"]
+
+    last_year = datetime.utcnow() - timedelta(days=365)
+    async with async_session_maker() as session:
+        comment = Comment(content="First", post_id=post_id, author_id=1,
+                          created_at=last_year)
+        session.add(comment)
+        await session.commit()
+
+    # The reply commits after the chunk was selected, before it is locked
+    lock_posts = archive.lock_posts
+
+    async def reply_first(db, post_ids):
+        response = await ac.post(f"/posts/{post_id}/comments/",
+                                 params={"parent_id": comment.id},
+                                 cookies=register_and_login_user,
+                                 json={"content": "Reply"})
+        assert response.status_code == 201
+        await lock_posts(db, post_ids)
+
+    monkeypatch.setattr(archive, "lock_posts", reply_first)
+    assert await archive_comments(after_days=30, flag_delay=0) == 0
+    async with async_session_maker() as session:
+        assert await session.get(Comment, comment.id) is not None
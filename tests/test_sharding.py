@@ -0,0 +1,103 @@
+import os
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
+                                    create_async_engine)
+from sqlalchemy.pool import NullPool
+
+from app import database
+from app.analytics_cache import utc_today
+from app.models import Comment, PostCommenterSketch
+from tests.conftest import async_session_maker
+
+SHARD_FILES = ("test_shard_0", "test_shard_1")
+
+
+@pytest.fixture
+async def comment_shards(monkeypatch):
+    engines = [create_async_engine(f"sqlite+aiosqlite:///./{path}",
+                                   poolclass=NullPool)
+               for path in SHARD_FILES]
+    shards = [async_sessionmaker(bind=engine, class_=AsyncSession,
+                                 expire_on_commit=False)
+              for engine in engines]
+    monkeypatch.setattr(database, "shard_engines", engines)
+    monkeypatch.setattr(database, "comment_shards", shards)
+    await database.create_comment_shards()
+    yield shards
+    for engine, path in zip(engines, SHARD_FILES):
+        await engine.dispose()
+        os.remove(path)
+
+
+async def test_comments_are_routed_to_their_post_shard(
+        comment_shards, register_and_login_user, create_and_login_admin,
+        ac: AsyncClient):
+    # One post on each shard
+    posts = {}
+    while len(posts) < 2:
+        response = await ac.post("/posts/", cookies=register_and_login_user,
+                                 json={"title": "Sharded", "content": "Body"})
+        post_id = response.json()["id"]
+        posts.setdefault(database.comment_shard(post_id), post_id)
+
+    comments = {}
+    for shard, post_id in posts.items():
+        response = await ac.post(f"/posts/{post_id}/comments/",
+                                 cookies=register_and_login_user,
+                                 json={"content": "Nice"})
+        assert response.status_code == 201
+        comment_id = response.json()["id"]
+        first, last = database.comment_id_range(shard)
+        assert first <= comment_id <= last
+        comments[shard] = comment_id
+
+    for shard, post_id in posts.items():
+        async with comment_shards[shard]() as session:
+            assert await session.get(Comment, comments[shard]) is not None
+        async with async_session_maker() as session:
+            assert (await session.execute(
+                select(Comment).where(Comment.post_id == post_id)
+            )).first() is None
+
+        response = await ac.get(f"/posts/{post_id}/comments/",
+                                cookies=register_and_login_user)
+        assert [comment["id"] for comment in response.json()] == [
+            comments[shard]]
+        response = await ac.get(f"/comments/{comments[shard]}/",
+                                cookies=register_and_login_user)
+        assert response.json()["post_id"] == post_id
+
+    response = await ac.get("/comments/", cookies=register_and_login_user,
+                            params={"ids": f"{comments[1]},{comments[0]}"})
+    assert [comment["id"] for comment in response.json()] == [
+        comments[0], comments[1]]
+
+    # Analytics are summed over the shards
+    today = str(utc_today())
+    response = await ac.get("/comments-daily-breakdown/",
+                            cookies=create_and_login_admin,
+                            params={"date_from": today, "date_to": today})
+    assert response.json()[0]["total_comments"] == 2
+    assert response.json()[0]["unique_commenters"] == 1
+    response = await ac.get("/comments-daily-breakdown/",
+                            cookies=create_and_login_admin,
+                            params={"date_from": today, "date_to": today,
+                                    "post_id": posts[1]})
+    assert response.json()[0]["total_comments"] == 1
+
+    response = await ac.delete(f"/comments/{comments[1]}/",
+                               cookies=register_and_login_user)
+    assert response.status_code == 204
+    sketch = select(PostCommenterSketch).where(
+        PostCommenterSketch.post_id == posts[0])
+    async with comment_shards[0]() as session:
+        assert (await session.execute(sketch)).first() is not None
+    response = await ac.delete(f"/posts/{posts[0]}",
+                               cookies=register_and_login_user)
+    assert response.status_code == 204
+    async with comment_shards[0]() as session:
+        assert await session.get(Comment, comments[0]) is None
+        assert (await session.execute(sketch)).first() is None